@@ -13,12 +13,12 @@ except ImportError:
 import json
 import threading
 import queue
-from imapclient import IMAPClient
 import smtplib
 import poplib
 import ssl
 from exchangelib import Credentials, Account, Configuration, DELEGATE
 from tools.logger import log
+from gui.mail_search_components.imap_pool import get_imap_pool
 
 CONFIG_FILE = "mail_config.json"
 
@@ -644,16 +644,9 @@ class MailConfigWidget(ttk.Frame):
                 self.result_queue.put({'type': 'test_cancelled'})
                 return
             
-            # Create IMAPClient connection
-            imap = IMAPClient(
-                account["imap_server"], 
-                port=account["imap_port"],
-                ssl=account["imap_ssl"]
-            )
-            
-            imap.login(account["username"], account["password"])
-            imap.select_folder("INBOX")
-            imap.logout()
+            # Lease a session from the account's connection pool (logs in unless one is already open)
+            with get_imap_pool(account).lease() as imap:
+                imap.select_folder("INBOX", readonly=True)
             
             if self.testing_cancelled:
                 self.result_queue.put({'type': 'test_cancelled'})
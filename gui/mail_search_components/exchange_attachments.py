@@ -0,0 +1,120 @@
+"""
+Batched download of Exchange PDF attachments for the PDF content search
+FileAttachment.content issues one GetAttachment call per attachment; here the PDF attachments
+of many candidate messages are requested with one GetAttachment call per batch, backing off
+when the server answers ErrorServerBusy (EWS throttling).
+"""
+import time
+from exchangelib.attachments import FileAttachment, ItemAttachment
+from exchangelib.errors import ErrorServerBusy
+from exchangelib.services import GetAttachment
+from tools.logger import log
+
+
+# Attachments requested per GetAttachment call (can be overridden with "exchange_attachment_batch_size")
+DEFAULT_ATTACHMENT_BATCH_SIZE = 20
+
+# ErrorServerBusy handling - wait the back-off requested by the server (or the default), halve the batch
+MAX_BUSY_RETRIES = 4
+DEFAULT_BUSY_BACKOFF = 5
+MAX_BUSY_BACKOFF = 60
+
+
+def is_pdf_attachment(attachment):
+    """True for PDF file attachments (*.pdf or application/pdf); item attachments and inline images are skipped"""
+    if isinstance(attachment, ItemAttachment):
+        return False
+    content_type = (getattr(attachment, 'content_type', None) or '').lower()
+    if getattr(attachment, 'is_inline', False) and content_type.startswith('image/'):
+        return False
+    name = (getattr(attachment, 'name', '') or '').lower()
+    return name.endswith('.pdf') or content_type == 'application/pdf'
+
+
+def _get_attachments(account, attachment_ids):
+    service = GetAttachment(account=account, chunk_size=len(attachment_ids))
+    return list(service.call(items=attachment_ids, include_mime_content=False, body_type=None,
+                             filter_html_content=None, additional_fields=None))
+
+
+class ExchangeAttachmentPrefetcher:
+    """Loads the content of PDF FileAttachments of messages with batched GetAttachment calls"""
+
+    def __init__(self, account, batch_size=DEFAULT_ATTACHMENT_BATCH_SIZE, is_cancelled=None, fetch=None,
+                 sleep=time.sleep):
+        self.account = account
+        self.batch_size = max(1, int(batch_size or DEFAULT_ATTACHMENT_BATCH_SIZE))
+        self.is_cancelled = is_cancelled or (lambda: False)
+        self._fetch = fetch or _get_attachments
+        self._sleep = sleep
+        self.stats = {'attachments': 0, 'calls': 0, 'busy': 0}
+
+    def pending_attachments(self, message):
+        """PDF FileAttachments of a message whose content has not been downloaded yet"""
+        return [attachment for attachment in getattr(message, 'attachments', None) or []
+                if isinstance(attachment, FileAttachment) and attachment.attachment_id is not None
+                and attachment._content is None and is_pdf_attachment(attachment)]
+
+    def iter_prefetched(self, messages):
+        """Yield messages after the PDF attachments of them (and up to a batch of following ones) were loaded"""
+        chunk = []
+        pending = []
+        for message in messages:
+            chunk.append(message)
+            pending.extend(self.pending_attachments(message))
+            if len(pending) >= self.batch_size:
+                self.prefetch(pending)
+                yield from chunk
+                chunk, pending = [], []
+        if pending:
+            self.prefetch(pending)
+        yield from chunk
+
+    def prefetch(self, attachments):
+        """Download attachment contents; attachments that fail keep loading lazily on access"""
+        batch_size = self.batch_size
+        start = 0
+        retries = 0
+        while start < len(attachments) and not self.is_cancelled():
+            batch = attachments[start:start + batch_size]
+            try:
+                self.stats['calls'] += 1
+                results = self._fetch(self.account, [attachment.attachment_id for attachment in batch])
+                busy = next((result for result in results if isinstance(result, ErrorServerBusy)), None)
+                if busy is not None:
+                    raise busy
+            except ErrorServerBusy as e:
+                self.stats['busy'] += 1
+                retries += 1
+                if retries > MAX_BUSY_RETRIES:
+                    log("Serwer Exchange przeciążony - pozostałe załączniki PDF będą pobierane pojedynczo")
+                    return
+                back_off = min(e.back_off or DEFAULT_BUSY_BACKOFF, MAX_BUSY_BACKOFF)
+                batch_size = max(1, batch_size // 2)
+                log(f"Serwer Exchange przeciążony (ErrorServerBusy) - ponowienie za {back_off}s, "
+                    f"paczka {batch_size} załączników")
+                self._wait(back_off)
+                continue
+            except Exception as e:
+                log(f"BŁĄD pobierania paczki załączników PDF ({len(batch)}): {str(e)}")
+                start += len(batch)
+                continue
+
+            for attachment, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    log(f"Błąd pobierania załącznika {attachment.name}: {str(result)}")
+                    continue
+                content = getattr(result, '_content', None)
+                if content is not None:
+                    # Not the content setter - EWSElement.__setattr__ reads the property first (another GetAttachment)
+                    attachment._content = content
+                    self.stats['attachments'] += 1
+            start += len(batch)
+
+    def _wait(self, seconds):
+        # Short steps, so cancelling the search does not wait for the whole back-off
+        remaining = seconds
+        while remaining > 0 and not self.is_cancelled():
+            step = min(0.5, remaining)
+            self._sleep(step)
+            remaining -= step
@@ -0,0 +1,151 @@
+"""
+Exchange folder tree of an account, loaded with one deep FindFolder traversal and cached with a TTL
+Search (folder with subfolders), folder discovery for exclusions and result folder paths are
+resolved from the cached tree instead of walking folder.children level by level.
+"""
+import threading
+import time
+from exchangelib.folders import DEEP, FolderCollection, Inbox
+from tools.logger import log
+
+
+# Seconds a loaded folder tree is used before it is loaded again ("Wykryj foldery" reloads it at once)
+EXCHANGE_FOLDER_TREE_TTL = 10 * 60
+
+# Display path of the inbox and prefix of its subfolders (same as EmailSearchEngine._get_folder_path)
+INBOX_DISPLAY_PATH = 'Skrzynka odbiorcza'
+INBOX_CHILD_PREFIX = '/Odebrane/'
+
+
+class FolderNode:
+    """Folder in the tree - path is relative to the inbox ('' for the inbox itself)"""
+
+    def __init__(self, folder, path):
+        self.folder = folder
+        self.id = folder.id
+        self.name = folder.name
+        self.path = path
+        self.total_count = getattr(folder, 'total_count', None)
+        self.unread_count = getattr(folder, 'unread_count', None)
+        self.children = []
+
+    @property
+    def display_path(self):
+        return INBOX_CHILD_PREFIX + self.path if self.path else INBOX_DISPLAY_PATH
+
+
+class ExchangeFolderTree:
+    """Inbox and all its subfolders with IDs, paths and item counts"""
+
+    def __init__(self, inbox, folders):
+        self.root = FolderNode(inbox, "")
+        self.nodes = {self.root.id: self.root}
+        self.loaded_at = time.monotonic()
+
+        # FindFolder returns parents before their children; leftovers are attached in later passes
+        pending = [folder for folder in folders if getattr(folder, 'id', None)]
+        while pending:
+            remaining = []
+            for folder in pending:
+                parent_id = folder.parent_folder_id.id if folder.parent_folder_id else None
+                parent = self.nodes.get(parent_id)
+                if parent is None:
+                    remaining.append(folder)
+                    continue
+                node = FolderNode(folder, f"{parent.path}/{folder.name}" if parent.path else folder.name)
+                parent.children.append(node)
+                self.nodes[node.id] = node
+            if len(remaining) == len(pending):
+                log(f"Pominięto {len(remaining)} folderów bez znanego folderu nadrzędnego")
+                break
+            pending = remaining
+
+    @classmethod
+    def load(cls, account):
+        """Load the tree: GetFolder for the inbox and one deep FindFolder below it (paged by exchangelib)"""
+        inbox = Inbox.get_distinguished(root=account.root)
+        folders = []
+        for folder in FolderCollection(account=account, folders=[inbox]).find_folders(depth=DEEP):
+            if isinstance(folder, Exception):
+                log(f"Błąd pobierania folderu: {str(folder)}")
+                continue
+            folders.append(folder)
+        return cls(inbox, folders)
+
+    def find(self, path_parts):
+        """Node of a path below the inbox, e.g. ['Faktury', '2024'] (case-insensitive), None when missing"""
+        node = self.root
+        for part in path_parts:
+            if not part:
+                continue
+            node = next((child for child in node.children if child.name.lower() == part.lower()), None)
+            if node is None:
+                return None
+        return node
+
+    def subfolders(self, node, excluded_names=(), base=None):
+        """All subfolders of a node depth-first; an excluded folder also excludes its subfolders
+
+        Exclusions match the folder name or its path relative to the searched node, e.g. 'Faktury/2024'
+        as offered by the folder discovery list.
+        """
+        base = node if base is None else base
+        result = []
+        for child in node.children:
+            relative_path = child.path[len(base.path) + 1:] if base.path else child.path
+            if child.name in excluded_names or relative_path in excluded_names:
+                log(f"Wykluczono folder: {relative_path}")
+                continue
+            result.append(child)
+            result.extend(self.subfolders(child, excluded_names, base))
+        return result
+
+    def is_expired(self, ttl=EXCHANGE_FOLDER_TREE_TTL):
+        return time.monotonic() - self.loaded_at > ttl
+
+
+_trees = {}
+_trees_lock = threading.Lock()
+
+
+def _tree_key(account_config):
+    return (account_config.get("exchange_server", ""), account_config.get("username", ""),
+            account_config.get("email", ""))
+
+
+def get_folder_tree(account_config, account, refresh=False):
+    """Cached folder tree of an Exchange account, loaded again after the TTL or when refresh is set"""
+    key = _tree_key(account_config)
+    with _trees_lock:
+        entry = _trees.get(key)
+        if (entry is not None and not refresh and not entry[1].is_expired()
+                and entry[0] == account_config.get("password")):
+            return entry[1]
+        started = time.monotonic()
+        tree = ExchangeFolderTree.load(account)
+        _trees[key] = (account_config.get("password"), tree)
+    log(f"Wczytano drzewo {len(tree.nodes)} folderów Exchange w {time.monotonic() - started:.1f}s")
+    return tree
+
+
+def invalidate_folder_tree(account_config=None):
+    """Forget the cached tree of an account (all accounts when account_config is None)"""
+    with _trees_lock:
+        if account_config is None:
+            _trees.clear()
+        else:
+            _trees.pop(_tree_key(account_config), None)
+
+
+def folder_display_path(folder):
+    """Display path of a folder from the cached trees, None when it is not in any of them"""
+    folder_id = getattr(folder, 'id', None)
+    if not folder_id:
+        return None
+    with _trees_lock:
+        trees = [tree for _, tree in _trees.values()]
+    for tree in trees:
+        node = tree.nodes.get(folder_id)
+        if node is not None:
+            return node.display_path
+    return None
@@ -0,0 +1,237 @@
+"""
+Compiled local filter pipeline for mail search
+Search criteria are compiled once into predicates grouped in stages ordered by cost,
+so cheap header checks reject messages before attachments or PDFs are downloaded.
+"""
+import re
+import time
+from tools.logger import log
+from .needle_search import build_pdf_search
+
+
+# Stages in evaluation order (cheapest first)
+STAGE_HEADER = 'header'
+STAGE_METADATA = 'metadata'
+STAGE_BODY = 'body'
+STAGE_ATTACHMENTS = 'attachments'
+STAGE_PDF = 'pdf'
+STAGE_ORDER = (STAGE_HEADER, STAGE_METADATA, STAGE_BODY, STAGE_ATTACHMENTS, STAGE_PDF)
+
+STAGE_LABELS = {
+    STAGE_HEADER: 'nagłówki (temat/nadawca)',
+    STAGE_METADATA: 'metadane (załączniki/data)',
+    STAGE_BODY: 'treść wiadomości',
+    STAGE_ATTACHMENTS: 'nazwy załączników',
+    STAGE_PDF: 'treść PDF'
+}
+
+EMAIL_ADDRESS_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+
+def is_email_address(text):
+    """Check if text looks like a complete email address"""
+    if not text or not isinstance(text, str):
+        return False
+    return EMAIL_ADDRESS_PATTERN.match(text.strip()) is not None
+
+
+class FilterStage:
+    """Group of predicates of the same cost with selectivity and timing counters"""
+
+    def __init__(self, name, predicates):
+        self.name = name
+        self.predicates = predicates
+        self.evaluated = 0
+        self.rejected = 0
+        self.elapsed = 0.0
+
+    def run(self, message):
+        """Return the last predicate value when all predicates pass, otherwise None"""
+        value = True
+        for predicate in self.predicates:
+            value = predicate(message)
+            if not value:
+                return None
+        return value
+
+
+class FilterPipeline:
+    """Cost-ordered chain of filter stages compiled from search criteria"""
+
+    def __init__(self, stages):
+        self.stages = [stage for stage in stages if stage.predicates]
+        self.errors = 0
+
+    def has_stage(self, name):
+        return any(stage.name == name for stage in self.stages)
+
+    def evaluate(self, message, stop_before=None):
+        """Run stages (all, or those cheaper than stop_before), returns (passed, {stage name: predicate value})"""
+        outputs = {}
+        limit = STAGE_ORDER.index(stop_before) if stop_before else len(STAGE_ORDER)
+        for stage in self.stages:
+            if STAGE_ORDER.index(stage.name) >= limit:
+                break
+            started = time.perf_counter()
+            try:
+                value = stage.run(message)
+            finally:
+                stage.evaluated += 1
+                stage.elapsed += time.perf_counter() - started
+            if value is None:
+                stage.rejected += 1
+                return False, outputs
+            outputs[stage.name] = value
+        return True, outputs
+
+    def prefilter(self, message, before_stage):
+        """Run only stages cheaper than before_stage without counting statistics"""
+        limit = STAGE_ORDER.index(before_stage)
+        for stage in self.stages:
+            if STAGE_ORDER.index(stage.name) >= limit:
+                break
+            if stage.run(message) is None:
+                return False
+        return True
+
+    def record(self, name, passed, elapsed):
+        """Count a stage evaluated outside the pipeline (e.g. PDF stage run by PDFSearchPipeline)"""
+        for stage in self.stages:
+            if stage.name == name:
+                stage.evaluated += 1
+                stage.rejected += 0 if passed else 1
+                stage.elapsed += elapsed
+                return
+
+    def record_time(self, name, elapsed):
+        for stage in self.stages:
+            if stage.name == name:
+                stage.elapsed += elapsed
+
+    def rejected(self, name):
+        return sum(stage.rejected for stage in self.stages if stage.name == name)
+
+    def log_statistics(self):
+        """Log per-stage selectivity and time"""
+        log("=== STATYSTYKI ETAPÓW FILTROWANIA ===")
+        if not self.stages:
+            log("  Brak lokalnych filtrów")
+            return
+        for stage in self.stages:
+            passed = stage.evaluated - stage.rejected
+            pass_ratio = (passed / stage.evaluated * 100) if stage.evaluated else 0.0
+            log(f"  {STAGE_LABELS[stage.name]}: sprawdzono {stage.evaluated}, odrzucono {stage.rejected}, "
+                f"przepuszczono {pass_ratio:.1f}%, czas {stage.elapsed * 1000:.1f} ms")
+        if self.errors:
+            log(f"  Błędy przetwarzania: {self.errors}")
+
+
+def compile_filter_pipeline(criteria, search_engine, account_type):
+    """Compile search criteria into a FilterPipeline
+
+    Args:
+        criteria: Search criteria dictionary from the UI
+        search_engine: EmailSearchEngine providing PDF search and period helpers
+        account_type: 'exchange', 'imap_smtp' or 'pop3_smtp' - POP3 has no server-side
+            filtering, so date and body criteria are checked locally for it
+    """
+    header = []
+    metadata = []
+    body = []
+    attachments = []
+    pdf = []
+
+    # Header stage - subject and sender fragment (full addresses are filtered by the server)
+    subject_search = (criteria.get('subject_search') or '').lower()
+    if subject_search:
+        header.append(lambda message: subject_search in (message.subject or '').lower())
+
+    sender_value = criteria.get('sender')
+    if sender_value and (account_type == "pop3_smtp" or not is_email_address(sender_value)):
+        sender_fragment = sender_value.lower()
+        header.append(lambda message: _sender_matches(message, sender_fragment))
+
+    # Metadata stage - attachment flag and (POP3 only) date period
+    if criteria.get('attachments_required'):
+        metadata.append(lambda message: bool(message.has_attachments))
+    elif criteria.get('no_attachments_only'):
+        # "Only with attachments" has priority when both are selected
+        metadata.append(lambda message: not message.has_attachments)
+
+    if account_type == "pop3_smtp" and criteria.get('selected_period') and criteria['selected_period'] != 'wszystkie':
+        start_date = search_engine._get_period_start_date(criteria['selected_period'])
+        if start_date:
+            metadata.append(lambda message: message.datetime_received is not None and message.datetime_received >= start_date)
+
+    # Body stage - Exchange and IMAP filter bodies on the server
+    body_search = (criteria.get('body_search') or '').lower()
+    if body_search and account_type == "pop3_smtp":
+        body.append(lambda message: body_search in (getattr(message, 'body', None) or '').lower())
+
+    # Attachment stage - needs the attachment list of each message
+    attachment_name_filter = (criteria.get('attachment_name') or '').lower()
+    attachment_ext_filter = (criteria.get('attachment_extension') or '').lower()
+    if attachment_name_filter or attachment_ext_filter:
+        attachments.append(lambda message: _attachment_matches(message, attachment_name_filter, attachment_ext_filter))
+
+    # PDF stage - the most expensive check (download, text extraction, OCR)
+    pdf_search_text = build_pdf_search(criteria)
+    if pdf_search_text:
+        skip_searched_pdfs = criteria.get('skip_searched_pdfs', False)
+
+        def pdf_predicate(message):
+            result = search_engine._check_pdf_content(message, pdf_search_text, skip_searched_pdfs)
+            return result if result['found'] else None
+        pdf.append(pdf_predicate)
+
+    return FilterPipeline([
+        FilterStage(STAGE_HEADER, header),
+        FilterStage(STAGE_METADATA, metadata),
+        FilterStage(STAGE_BODY, body),
+        FilterStage(STAGE_ATTACHMENTS, attachments),
+        FilterStage(STAGE_PDF, pdf)
+    ])
+
+
+def _sender_matches(message, sender_fragment):
+    """Case-insensitive sender fragment check on address, name and string form"""
+    sender = message.sender
+    if not sender:
+        return False
+
+    # For Exchange messages
+    sender_email = getattr(sender, 'email_address', None)
+    if sender_email and sender_fragment in sender_email.lower():
+        return True
+
+    # Check sender name if available
+    sender_name = getattr(sender, 'name', None)
+    if sender_name and sender_fragment in sender_name.lower():
+        return True
+
+    # For IMAP messages or fallback
+    return sender_fragment in str(sender).lower()
+
+
+def _attachment_matches(message, name_filter, ext_filter):
+    """Check if any attachment matches the name and extension filters
+
+    Uses the attachment manifest (IMAP BODYSTRUCTURE, POP3 TOP) when the message has one,
+    so no attachment is downloaded just to compare its name.
+    """
+    manifest = getattr(message, 'attachment_manifest', None)
+    if manifest is not None:
+        names = [part.filename for part in manifest]
+    else:
+        names = [getattr(attachment, 'name', None) for attachment in message.attachments or []]
+
+    for attachment_name in names:
+        attachment_name = (attachment_name or '').lower()
+        if not attachment_name:
+            continue
+        if name_filter and name_filter not in attachment_name:
+            continue
+        if ext_filter and not attachment_name.endswith(f'.{ext_filter}'):
+            continue
+        return True
+    return False
@@ -0,0 +1,80 @@
+"""
+Lazy per-folder message streams for the date-ordered folder merge
+A folder query returns only its newest messages; older ones are loaded in batches
+when the merge (and so the requested page) actually reaches them
+"""
+from collections import deque
+from tools.logger import log
+
+
+class FolderCursor:
+    """Iterator over the messages of one folder query, newest first
+
+    The first batch comes with the folder query. load_next() returns the next batch (an empty
+    list at the end) and is only called once the buffered messages are used up, so a folder
+    holds at most one loaded batch that the merge has not taken yet.
+    """
+
+    def __init__(self, first_batch, load_next=None, label='', is_cancelled=None):
+        self._buffer = deque(first_batch)
+        self._load_next = load_next
+        self.label = label
+        self.is_cancelled = is_cancelled or (lambda: False)
+        self.loaded = len(self._buffer)
+        self.batches = 1
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while not self._buffer:
+            if self._load_next is None or self.is_cancelled():
+                raise StopIteration
+            try:
+                batch = self._load_next()
+            except Exception as e:
+                log(f"BŁĄD pobierania kolejnych wiadomości folderu '{self.label}': {str(e)}")
+                batch = []
+            if not batch:
+                self._load_next = None
+                raise StopIteration
+            self._buffer.extend(batch)
+            self.loaded += len(batch)
+            self.batches += 1
+        return self._buffer.popleft()
+
+    @property
+    def buffered(self):
+        """Loaded messages the merge has not taken yet"""
+        return list(self._buffer)
+
+    @property
+    def exhausted(self):
+        return not self._buffer and self._load_next is None
+
+
+class IdBatchLoader:
+    """load_next() for a folder whose matching IDs are known up front (IMAP UIDs, POP3 message numbers)
+
+    fetch(ids) loads the messages of a batch of IDs ordered newest first; batches that come back
+    empty (e.g. messages deleted since the listing) are skipped.
+    """
+
+    def __init__(self, ids, fetch, batch_size):
+        self.ids = list(ids)
+        self.fetch = fetch
+        self.batch_size = max(1, batch_size)
+        self.position = 0
+
+    def __call__(self):
+        while self.position < len(self.ids):
+            batch = self.ids[self.position:self.position + self.batch_size]
+            self.position += len(batch)
+            messages = self.fetch(batch)
+            if messages:
+                return messages
+        return []
+
+    @property
+    def remaining(self):
+        return len(self.ids) - self.position
@@ -0,0 +1,102 @@
+"""
+IMAP COMPRESS=DEFLATE (RFC 4978) for IMAPClient sessions with transfer counters
+"""
+import io
+import threading
+import zlib
+from tools.logger import log
+
+
+# zlib level used for commands sent to the server (they are tiny, speed matters more)
+DEFAULT_COMPRESSION_LEVEL = 6
+
+# Bytes read from the socket at once
+COMPRESSED_READ_SIZE = 64 * 1024
+
+
+class TransferStats:
+    """Bytes on the wire versus decompressed bytes, shared by the sessions of one account"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.wire_in = 0
+        self.data_in = 0
+        self.wire_out = 0
+        self.data_out = 0
+
+    def add(self, wire_in=0, data_in=0, wire_out=0, data_out=0):
+        with self._lock:
+            self.wire_in += wire_in
+            self.data_in += data_in
+            self.wire_out += wire_out
+            self.data_out += data_out
+
+    def snapshot(self):
+        with self._lock:
+            return {'wire_in': self.wire_in, 'data_in': self.data_in,
+                    'wire_out': self.wire_out, 'data_out': self.data_out}
+
+    @staticmethod
+    def difference(after, before):
+        return {key: after[key] - before.get(key, 0) for key in after}
+
+    @staticmethod
+    def saving(counters):
+        """(bytes on the wire, decompressed bytes, percent saved) of a counter snapshot"""
+        wire = counters['wire_in'] + counters['wire_out']
+        data = counters['data_in'] + counters['data_out']
+        return wire, data, ((1 - wire / data) * 100 if data else 0.0)
+
+
+class DeflateStream(io.RawIOBase):
+    """Raw stream over a socket inflating what is received and deflating what is sent"""
+
+    def __init__(self, sock, stats, level=DEFAULT_COMPRESSION_LEVEL):
+        super().__init__()
+        self.sock = sock
+        self.stats = stats
+        self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self._pending = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending:
+            raw = self.sock.recv(COMPRESSED_READ_SIZE)
+            if not raw:
+                return 0
+            self._pending = self._decompressor.decompress(raw)
+            self.stats.add(wire_in=len(raw), data_in=len(self._pending))
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+    def sendall(self, data):
+        # Sync flush - every command must reach the server in full
+        compressed = self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        self.stats.add(wire_out=len(compressed), data_out=len(data))
+        self.sock.sendall(compressed)
+
+
+def enable_compression(imap, stats):
+    """Negotiate COMPRESS=DEFLATE on a logged-in IMAPClient session, returns True when active"""
+    try:
+        if not imap.has_capability('COMPRESS=DEFLATE'):
+            return False
+        connection = imap._imap
+        typ, data = connection.xatom('COMPRESS', 'DEFLATE')
+        if typ != 'OK':
+            log(f"[IMAP] COMPRESS=DEFLATE refused: {data}")
+            return False
+        # From the server's OK on both directions are deflate streams
+        stream = DeflateStream(connection.sock, stats)
+        connection.file = io.BufferedReader(stream, COMPRESSED_READ_SIZE)
+        connection.send = stream.sendall
+        log("[IMAP] COMPRESS=DEFLATE enabled")
+        return True
+    except Exception as e:
+        log(f"[IMAP] Could not enable COMPRESS=DEFLATE: {str(e)}")
+        return False
@@ -0,0 +1,107 @@
+"""
+Cache of IMAP header FETCH data per folder, kept current with CONDSTORE mod-sequences (RFC 7162)
+Repeated searches only fetch headers of UIDs not seen before and the flags changed since the
+last search, instead of refetching ENVELOPE/BODYSTRUCTURE of every message in the window.
+"""
+import threading
+import weakref
+from collections import OrderedDict
+from imapclient.exceptions import IllegalStateError
+from tools.logger import log
+from .imap_utils import compress_uid_set
+
+
+# Folders kept in the cache (least recently searched dropped first)
+HEADER_CACHE_MAX_FOLDERS = 50
+
+# Messages kept per folder (lowest UIDs dropped first)
+HEADER_CACHE_MAX_MESSAGES = 5000
+
+
+class FolderHeaders:
+    """Cached FETCH data of one folder, valid for its UIDVALIDITY up to HIGHESTMODSEQ"""
+
+    def __init__(self, uidvalidity, highestmodseq):
+        self.uidvalidity = uidvalidity
+        self.highestmodseq = highestmodseq
+        self.messages = {}  # uid -> FETCH data (ENVELOPE, FLAGS, RFC822.SIZE, BODYSTRUCTURE)
+
+    def lookup(self, uids):
+        return {uid: self.messages[uid] for uid in uids if uid in self.messages}
+
+    def store(self, response):
+        self.messages.update(response)
+        if len(self.messages) > HEADER_CACHE_MAX_MESSAGES:
+            for uid in sorted(self.messages)[:len(self.messages) - HEADER_CACHE_MAX_MESSAGES]:
+                del self.messages[uid]
+
+
+class IMAPHeaderCache:
+    """Header cache shared by searches; folders are keyed by (account, folder name)
+
+    ENVELOPE, RFC822.SIZE and BODYSTRUCTURE never change for a UID, so only FLAGS have to be
+    refreshed - with FETCH ... (CHANGEDSINCE modseq) that returns just the changed messages.
+    A new UIDVALIDITY invalidates the folder; expunged UIDs simply stop appearing in search results.
+    """
+
+    def __init__(self, max_folders=HEADER_CACHE_MAX_FOLDERS):
+        self.max_folders = max_folders
+        self._folders = OrderedDict()
+        self._lock = threading.Lock()
+        self._condstore_sessions = weakref.WeakSet()
+
+    def enable_condstore(self, imap):
+        """Ask the server to report mod-sequences (ENABLE is only allowed before a folder is selected)"""
+        if imap in self._condstore_sessions:
+            return
+        self._condstore_sessions.add(imap)
+        try:
+            if imap.has_capability('CONDSTORE') and imap.has_capability('ENABLE'):
+                imap.enable('CONDSTORE')
+        except IllegalStateError:
+            # Session already has a folder selected - servers with persistent mod-sequences
+            # report HIGHESTMODSEQ on SELECT/EXAMINE anyway
+            pass
+        except Exception as e:
+            log(f"[IMAP] Could not enable CONDSTORE: {str(e)}")
+
+    def refresh(self, imap, key, folder_info):
+        """Bring the cached folder up to date after EXAMINE, returns its FolderHeaders
+
+        Returns None when the server does not report HIGHESTMODSEQ - cached flags could not be
+        validated, so the folder is fetched in full as before.
+        """
+        uidvalidity = folder_info.get(b'UIDVALIDITY')
+        highestmodseq = folder_info.get(b'HIGHESTMODSEQ')
+        with self._lock:
+            entry = self._folders.pop(key, None)
+            if highestmodseq is None or uidvalidity is None:
+                return None
+            if entry is None or entry.uidvalidity != uidvalidity:
+                if entry is not None:
+                    log(f"[IMAP] UIDVALIDITY of '{key[-1]}' changed - header cache cleared")
+                entry = FolderHeaders(uidvalidity, highestmodseq)
+            self._folders[key] = entry
+            while len(self._folders) > self.max_folders:
+                self._folders.popitem(last=False)
+
+        if entry.highestmodseq != highestmodseq and entry.messages:
+            changed = imap.fetch(compress_uid_set(entry.messages), ['FLAGS'],
+                                 modifiers=[f'CHANGEDSINCE {entry.highestmodseq}'])
+            updated = 0
+            for uid, data in changed.items():
+                if uid in entry.messages and b'FLAGS' in data:
+                    entry.messages[uid] = dict(entry.messages[uid], **{b'FLAGS': data[b'FLAGS']})
+                    updated += 1
+            log(f"[IMAP] '{key[-1]}': MODSEQ {entry.highestmodseq} -> {highestmodseq}, "
+                f"flags updated for {updated} cached messages")
+        entry.highestmodseq = highestmodseq
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._folders.clear()
+
+
+# Shared by all search engines (multi-account searches use separate account keys)
+header_cache = IMAPHeaderCache()
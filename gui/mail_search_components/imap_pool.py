@@ -0,0 +1,250 @@
+"""
+Pool of authenticated IMAP sessions per account, shared by searches, folder discovery,
+attachment downloads and the connection test
+"""
+import threading
+import time
+import imaplib
+from contextlib import contextmanager
+from imapclient import IMAPClient
+from tools.logger import log
+from .imap_compression import TransferStats, enable_compression
+
+
+# Sessions kept open per account (can be overridden with "imap_pool_size" in the account config).
+# New sessions negotiate COMPRESS=DEFLATE unless the account config sets "imap_compress": false.
+DEFAULT_IMAP_POOL_SIZE = 3
+
+# Idle sessions get a NOOP this often so the server does not log them out (autologout is >= 30 min)
+IMAP_KEEPALIVE_INTERVAL = 240
+
+# Sessions idle for longer than this are checked with NOOP before they are leased
+IMAP_HEALTH_CHECK_AFTER = 30
+
+# How long a lease waits for a free session when all of them are in use
+IMAP_LEASE_TIMEOUT = 120
+
+# Errors after which a session is not reused
+CONNECTION_ERRORS = (OSError, imaplib.IMAP4.abort, IMAPClient.AbortError)
+
+
+class IMAPConnectionPool:
+    """Keeps up to max_size logged-in IMAP sessions of one account alive and lends them out
+
+    Sessions are returned to the pool instead of being logged out, idle ones are kept alive
+    with NOOP and a session dropped by the server is replaced by a new one when leased.
+    """
+
+    def __init__(self, account_config, max_size=None, connect=None, keepalive_interval=IMAP_KEEPALIVE_INTERVAL):
+        self.account_config = account_config
+        self.max_size = max(1, int(max_size or account_config.get("imap_pool_size") or DEFAULT_IMAP_POOL_SIZE))
+        self.keepalive_interval = keepalive_interval
+        self._connect = connect or self._open_connection
+        self._condition = threading.Condition()
+        self._idle = []         # [(client, last used)] - most recently used last
+        self._leased = set()    # id() of leased clients
+        self._broken = set()    # id() of leased clients that must not be reused
+        self._selected = {}     # id(client) -> folder selected read-only in that session
+        self._size = 0          # Open sessions, idle and leased
+        self._closed = False
+        self._stopped = threading.Event()
+        self._keepalive_thread = None
+        self.stats = {'opened': 0, 'reused': 0, 'reconnected': 0}
+        # Wire/decompressed byte counters of the sessions using COMPRESS=DEFLATE
+        self.transfer_stats = TransferStats()
+
+    def _open_connection(self):
+        imap = IMAPClient(
+            self.account_config.get("imap_server", ""),
+            port=self.account_config.get("imap_port", 993),
+            ssl=self.account_config.get("imap_ssl", True)
+        )
+        imap.login(
+            self.account_config.get("username", ""),
+            self.account_config.get("password", "")
+        )
+        if self.account_config.get("imap_compress", True):
+            enable_compression(imap, self.transfer_stats)
+        return imap
+
+    def acquire(self, timeout=IMAP_LEASE_TIMEOUT):
+        """Lease a logged-in session, opening a new one when none is idle and the pool is not full"""
+        deadline = time.monotonic() + timeout
+        imap = None
+        last_used = 0
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError("IMAP connection pool is closed")
+                if self._idle:
+                    imap, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No free IMAP connection within {timeout}s")
+                self._condition.wait(remaining)
+
+        try:
+            if imap is not None and time.monotonic() - last_used > IMAP_HEALTH_CHECK_AFTER and not self._is_alive(imap):
+                log("[IMAP POOL] Idle connection was dropped by the server, reconnecting")
+                self._forget(imap)
+                self._logout(imap)
+                imap = None
+                self.stats['reconnected'] += 1
+            if imap is None:
+                imap = self._connect()
+                self.stats['opened'] += 1
+                log(f"[IMAP POOL] Opened connection to {self.account_config.get('imap_server', '')} "
+                    f"({self._size}/{self.max_size})")
+            else:
+                self.stats['reused'] += 1
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+
+        with self._condition:
+            self._leased.add(id(imap))
+        return imap
+
+    def release(self, imap, selected_folder=None):
+        """Return a leased session; selected_folder is the folder it has selected read-only (None - unknown)"""
+        with self._condition:
+            self._leased.discard(id(imap))
+            discard = self._closed or id(imap) in self._broken
+            if discard:
+                self._size -= 1
+                self._forget(imap)
+            else:
+                self._selected[id(imap)] = selected_folder
+                self._idle.append((imap, time.monotonic()))
+                self._start_keepalive()
+            self._condition.notify()
+        if discard:
+            self._logout(imap)
+
+    def mark_broken(self, imap):
+        """Do not reuse a leased session (e.g. its socket was shut down to abort a fetch)"""
+        with self._condition:
+            if id(imap) in self._leased:
+                self._broken.add(id(imap))
+
+    @contextmanager
+    def lease(self, folder=None):
+        """Context manager lending a session, with `folder` selected read-only when given"""
+        imap = self.acquire()
+        selected = None
+        try:
+            if folder is not None:
+                if self._selected.get(id(imap)) != folder:
+                    imap.select_folder(folder, readonly=True)
+                selected = folder
+            yield imap
+        except CONNECTION_ERRORS:
+            self.mark_broken(imap)
+            raise
+        finally:
+            self.release(imap, selected)
+
+    def close(self):
+        """Log out idle sessions; leased ones are logged out when released"""
+        with self._condition:
+            self._closed = True
+            idle = [imap for imap, _ in self._idle]
+            self._idle = []
+            self._size -= len(idle)
+            self._condition.notify_all()
+        self._stopped.set()
+        for imap in idle:
+            self._forget(imap)
+            self._logout(imap)
+        if idle:
+            log(f"[IMAP POOL] Closed {len(idle)} idle connections")
+
+    def _forget(self, imap):
+        self._selected.pop(id(imap), None)
+        self._broken.discard(id(imap))
+
+    def _start_keepalive(self):
+        # Called with the condition held
+        if self._keepalive_thread is None and self.keepalive_interval:
+            self._keepalive_thread = threading.Thread(target=self._keepalive_loop, name="imap-pool-keepalive",
+                                                      daemon=True)
+            self._keepalive_thread.start()
+
+    def _keepalive_loop(self):
+        while not self._stopped.wait(self.keepalive_interval):
+            now = time.monotonic()
+            with self._condition:
+                due = [(imap, last) for imap, last in self._idle if now - last >= self.keepalive_interval]
+                self._idle = [entry for entry in self._idle if entry not in due]
+                for imap, _ in due:
+                    self._leased.add(id(imap))
+            for imap, _ in due:
+                if self._is_alive(imap):
+                    self.release(imap, self._selected.get(id(imap)))
+                else:
+                    log("[IMAP POOL] Keepalive failed, dropping idle connection")
+                    self.mark_broken(imap)
+                    self.release(imap)
+
+    @staticmethod
+    def _is_alive(imap):
+        try:
+            imap.noop()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _logout(imap):
+        try:
+            imap.logout()
+        except Exception:
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _pool_key(account_config):
+    return (account_config.get("imap_server", ""), account_config.get("imap_port", 993),
+            account_config.get("imap_ssl", True), account_config.get("username", ""))
+
+
+def get_imap_pool(account_config):
+    """Shared pool for an IMAP account; a pool with outdated settings is closed and replaced"""
+    key = _pool_key(account_config)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is not None and (pool.account_config.get("password") != account_config.get("password")
+                                 or pool.account_config.get("imap_pool_size") != account_config.get("imap_pool_size")):
+            log("[IMAP POOL] Account settings changed, replacing connection pool")
+            pool.close()
+            pool = None
+        if pool is None:
+            pool = IMAPConnectionPool(dict(account_config))
+            _pools[key] = pool
+        return pool
+
+
+def mark_connection_broken(imap):
+    """Tell the pool that leased `imap` not to reuse it"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.mark_broken(imap)
+
+
+def close_all_pools():
+    """Log out all pooled IMAP sessions (application shutdown)"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
@@ -0,0 +1,406 @@
+"""
+IMAP helpers for mail search - UID sequence sets, adaptive FETCH batch sizing,
+server side SORT/ESEARCH, BODYSTRUCTURE parsing, attachment manifests and header decoding
+"""
+import base64
+import email.header
+import email.utils
+import quopri
+from functools import lru_cache
+from imapclient.imapclient import _normalise_search_criteria
+from imapclient.response_parser import parse_response
+from tools.logger import log
+
+
+# FETCH batch limits (messages per UID FETCH command)
+DEFAULT_FETCH_BATCH_SIZE = 50
+MIN_FETCH_BATCH_SIZE = 25
+MAX_FETCH_BATCH_SIZE = 1000
+
+# Batch size is grown while a round trip stays under the target time and response size
+TARGET_FETCH_SECONDS = 1.0
+TARGET_FETCH_BYTES = 2 * 1024 * 1024
+
+# Decoded header values kept in memory - sender names and recurring subjects repeat a lot
+HEADER_DECODE_CACHE_SIZE = 4096
+
+
+def compress_uid_set(uids):
+    """Build an IMAP sequence set from UIDs, e.g. [1, 2, 3, 7, 9, 10] -> '1:3,7,9:10'"""
+    ranges = []
+    start = previous = None
+    for uid in sorted(set(int(uid) for uid in uids)):
+        if previous is not None and uid == previous + 1:
+            previous = uid
+            continue
+        if start is not None:
+            ranges.append(f"{start}:{previous}" if previous != start else str(start))
+        start = previous = uid
+    if start is not None:
+        ranges.append(f"{start}:{previous}" if previous != start else str(start))
+    return ",".join(ranges)
+
+
+def expand_sequence_set(sequence_set):
+    """Expand an IMAP sequence set, keeping its order, e.g. '9,1:3' -> [9, 1, 2, 3] and '5:3' -> [5, 4, 3]"""
+    if sequence_set is None:
+        return []
+    if isinstance(sequence_set, int):
+        return [sequence_set]
+    if isinstance(sequence_set, bytes):
+        sequence_set = sequence_set.decode('ascii')
+    uids = []
+    for part in str(sequence_set).split(","):
+        first, _, last = part.partition(":")
+        first, last = int(first), int(last or first)
+        step = 1 if last >= first else -1
+        uids.extend(range(first, last + step, step))
+    return uids
+
+
+def estimate_fetch_response_size(response):
+    """Approximate size in bytes of a parsed FETCH response"""
+    total = 0
+    for data in response.values():
+        for value in data.values():
+            total += len(value) if isinstance(value, (bytes, str)) else len(repr(value))
+    return total
+
+
+class AdaptiveBatchSizer:
+    """Choose the next FETCH batch size from the measured round trip time and response size
+
+    Small batches waste round trips on high-latency servers, very large ones make a single
+    response slow and memory hungry. The size doubles while a batch stays under both targets
+    and is scaled down proportionally when a target is exceeded.
+    """
+
+    def __init__(self, initial=DEFAULT_FETCH_BATCH_SIZE, minimum=MIN_FETCH_BATCH_SIZE,
+                 maximum=MAX_FETCH_BATCH_SIZE, target_seconds=TARGET_FETCH_SECONDS,
+                 target_bytes=TARGET_FETCH_BYTES):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_seconds = target_seconds
+        self.target_bytes = target_bytes
+        self.size = max(minimum, min(initial, maximum))
+
+    def record(self, count, elapsed, response_bytes):
+        """Update the batch size after fetching `count` messages"""
+        if count <= 0:
+            return self.size
+        # How far over (>1) or under (<1) the targets this batch was
+        load = max(elapsed / self.target_seconds if self.target_seconds else 0,
+                   response_bytes / self.target_bytes if self.target_bytes else 0)
+        if count < self.size:
+            # Last, partial batch - nothing learned about larger batches
+            new_size = self.size
+        elif load < 0.5:
+            new_size = self.size * 2
+        elif load > 1.0:
+            new_size = int(self.size / load)
+        else:
+            new_size = self.size
+        new_size = max(self.minimum, min(new_size, self.maximum))
+        if new_size != self.size:
+            log(f"[IMAP] Fetch batch size {self.size} -> {new_size} "
+                f"({count} messages in {elapsed:.2f}s, {response_bytes // 1024} KB)")
+        self.size = new_size
+        return self.size
+
+    def batches(self, uids):
+        """Yield consecutive UID slices, each sized from the latest measurements"""
+        position = 0
+        while position < len(uids):
+            batch = uids[position:position + self.size]
+            position += len(batch)
+            yield batch
+
+
+# Search extensions used when the server advertises them: SORT (RFC 5256), ESEARCH (RFC 4731),
+# ESORT and CONTEXT=SEARCH/SORT with PARTIAL result windows (RFC 5267)
+SEARCH_EXTENSIONS = ('SORT', 'ESEARCH', 'ESORT', 'CONTEXT=SEARCH', 'CONTEXT=SORT')
+
+
+def get_search_extensions(imap):
+    """Search extensions advertised by the server"""
+    try:
+        return {name for name in SEARCH_EXTENSIONS if imap.has_capability(name)}
+    except Exception as e:
+        log(f"[IMAP] Could not read capabilities: {str(e)}")
+        return set()
+
+
+def parse_esearch_response(data):
+    """Parse an ESEARCH response, e.g. '(TAG "A1") UID COUNT 3 ALL 1:2,9' -> {'COUNT': 3, 'ALL': [1, 2, 9]}"""
+    result = {}
+    if not data:
+        return result
+    tokens = list(parse_response([data]))
+    index = 0
+    while index < len(tokens):
+        token = tokens[index]
+        name = token.decode('ascii').upper() if isinstance(token, bytes) else None
+        if name in ('COUNT', 'MIN', 'MAX') and index + 1 < len(tokens):
+            result[name] = int(tokens[index + 1])
+            index += 2
+        elif name == 'ALL' and index + 1 < len(tokens):
+            result['ALL'] = expand_sequence_set(tokens[index + 1])
+            index += 2
+        elif name == 'PARTIAL' and index + 1 < len(tokens):
+            # (requested range, matching UIDs or NIL)
+            result['PARTIAL'] = expand_sequence_set(tokens[index + 1][1])
+            index += 2
+        else:
+            # Correlator (TAG "...") and the UID marker
+            index += 1
+    return result
+
+
+def _extended_command(imap, command, return_options, criteria, sort_criteria=None):
+    args = [b"RETURN", f"({return_options})".encode('ascii')]
+    if sort_criteria:
+        args.append(f"({sort_criteria})".encode('ascii'))
+        args.append(b"UTF-8")
+    else:
+        args.extend([b"CHARSET", b"UTF-8"])
+    args.extend(_normalise_search_criteria(criteria, "UTF-8"))
+    data = imap._raw_command_untagged(command, args, response_name=b"ESEARCH", unpack=True)
+    return parse_esearch_response(data)
+
+
+def search_newest(imap, criteria, limit, extensions=None):
+    """Find the newest `limit` messages matching criteria with the best extension the server has
+
+    Returns (uids, total, method). `total` is the exact number of matches; `uids` is newest first
+    when the server sorted by date, otherwise in UID order (the last UIDs taken as the newest).
+    Raises when the server rejects the command so the caller can fall back to plain SEARCH.
+    """
+    if extensions is None:
+        extensions = get_search_extensions(imap)
+
+    if 'ESORT' in extensions and 'CONTEXT=SORT' in extensions:
+        # Only the date ordered window and the total count are transferred
+        result = _extended_command(imap, b"SORT", f"COUNT PARTIAL 1:{limit}", criteria, "REVERSE DATE")
+        return result.get('PARTIAL', []), result.get('COUNT', 0), 'ESORT'
+
+    if 'SORT' in extensions:
+        uids = imap.sort(['REVERSE DATE'], criteria)
+        return uids[:limit], len(uids), 'SORT'
+
+    if 'ESEARCH' in extensions:
+        if 'CONTEXT=SEARCH' in extensions:
+            result = _extended_command(imap, b"SEARCH", "COUNT MIN MAX", criteria)
+            total = result.get('COUNT', 0)
+            if total <= 0:
+                return [], 0, 'ESEARCH'
+            first = max(1, total - limit + 1)
+            window = _extended_command(imap, b"SEARCH", f"PARTIAL {first}:{total}", criteria)
+            return window.get('PARTIAL', []), total, 'ESEARCH'
+        # ALL comes back as a compact sequence set instead of one number per message
+        result = _extended_command(imap, b"SEARCH", "COUNT ALL", criteria)
+        uids = result.get('ALL', [])
+        return uids[-limit:], result.get('COUNT', len(uids)), 'ESEARCH'
+
+    uids = imap.search(criteria)
+    return uids[-limit:], len(uids), 'SEARCH'
+
+
+class BodyPart:
+    """Leaf MIME part described by a BODYSTRUCTURE response"""
+
+    def __init__(self, section, content_type, params, encoding, size, disposition, filename):
+        self.section = section              # IMAP section number, e.g. '2' or '1.3'
+        self.content_type = content_type    # e.g. 'application/pdf'
+        self.params = params
+        self.encoding = encoding            # Content-Transfer-Encoding, lower case
+        self.size = size                    # Encoded size in bytes
+        self.disposition = disposition      # 'attachment', 'inline' or None
+        self.filename = filename
+
+    @property
+    def is_attachment(self):
+        if not self.filename:
+            return False
+        # Named application/* parts (e.g. inline PDFs) are documents, not message bodies
+        return self.disposition == 'attachment' or self.content_type.startswith('application/')
+
+    @property
+    def is_pdf(self):
+        return self.content_type == 'application/pdf' or (self.filename or '').lower().endswith('.pdf')
+
+    def __repr__(self):
+        return f"BodyPart({self.section}, {self.content_type}, {self.filename!r}, {self.size})"
+
+
+def parse_bodystructure(bodystructure):
+    """Return the leaf BodyParts of a BODYSTRUCTURE (parts of attached messages included)"""
+    parts = []
+    if bodystructure:
+        try:
+            _collect_body_parts(bodystructure, "", parts)
+        except Exception as e:
+            log(f"[IMAP] Error parsing BODYSTRUCTURE: {str(e)}")
+            return []
+    return parts
+
+
+def attachment_manifest(bodystructure):
+    """Attachments (name, MIME type, size, section) of a message, known without downloading it"""
+    return [part for part in parse_bodystructure(bodystructure) if part.is_attachment]
+
+
+def mime_attachment_manifest(email_msg, raw_message):
+    """Attachment manifest of a possibly truncated message (POP3 TOP with body lines)
+
+    Returns None when the message was cut before its closing MIME boundary - later parts
+    could still hold attachments, so the manifest would be incomplete.
+    """
+    if email_msg.is_multipart():
+        boundary = email_msg.get_boundary()
+        if not boundary or f"--{boundary}--".encode() not in raw_message:
+            return None
+    parts = []
+    try:
+        _collect_mime_parts(email_msg, "", parts)
+    except Exception as e:
+        log(f"[POP3] Error building attachment manifest: {str(e)}")
+        return None
+    return [part for part in parts if part.is_attachment]
+
+
+def _collect_mime_parts(message, prefix, parts):
+    if message.is_multipart():
+        for index, child in enumerate(message.get_payload(), 1):
+            _collect_mime_parts(child, f"{prefix}.{index}" if prefix else str(index), parts)
+        return
+    payload = message.get_payload(decode=False)
+    parts.append(BodyPart(prefix or "1", message.get_content_type(), dict(message.get_params() or []),
+                          (message.get('Content-Transfer-Encoding') or '').strip().lower(),
+                          len(payload) if isinstance(payload, str) else 0,
+                          message.get_content_disposition(), _decode_words(message.get_filename())))
+
+
+def _collect_body_parts(structure, prefix, parts):
+    if isinstance(structure[0], (list, tuple)):
+        # Multipart: (sub-parts, subtype, ...) - sub-parts are numbered from 1
+        if isinstance(structure[0], list):
+            children = structure[0]
+        else:
+            # Raw nested multipart (inside message/rfc822): leading part tuples, then the subtype
+            children = []
+            for part in structure:
+                if not isinstance(part, tuple):
+                    break
+                children.append(part)
+        for index, child in enumerate(children, 1):
+            _collect_body_parts(child, f"{prefix}.{index}" if prefix else str(index), parts)
+        return
+
+    section = prefix or "1"
+    main_type = _text(structure[0]).lower()
+    sub_type = _text(structure[1]).lower()
+    params = _pairs(structure[2])
+    encoding = _text(structure[5]).lower()
+    size = structure[6] if isinstance(structure[6], int) else 0
+
+    if main_type == 'message' and sub_type == 'rfc822' and len(structure) > 8 and structure[8]:
+        # Attached message: its body parts are numbered below this section
+        inner = structure[8]
+        if isinstance(inner[0], (list, tuple)):
+            _collect_body_parts(inner, section, parts)
+        else:
+            _collect_body_parts(inner, f"{section}.1", parts)
+        return
+
+    # Extension data starts after the type specific fields (lines for text/*, then MD5)
+    disposition_index = 9 if main_type == 'text' else 8
+    disposition = None
+    disposition_params = {}
+    if len(structure) > disposition_index and isinstance(structure[disposition_index], tuple):
+        disposition = _text(structure[disposition_index][0]).lower() or None
+        if len(structure[disposition_index]) > 1:
+            disposition_params = _pairs(structure[disposition_index][1])
+
+    filename = (_decode_param(disposition_params, 'filename') or _decode_param(params, 'name'))
+    parts.append(BodyPart(section, f"{main_type}/{sub_type}", params, encoding, size, disposition, filename))
+
+
+def _text(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='ignore')
+    return value or ''
+
+
+def _pairs(values):
+    """(b'NAME', b'x.pdf', ...) -> {'name': 'x.pdf'}"""
+    if not isinstance(values, (list, tuple)):
+        return {}
+    return {_text(values[i]).lower(): values[i + 1] for i in range(0, len(values) - 1, 2)}
+
+
+def _decode_param(params, name):
+    """Decode a filename/name parameter (plain, RFC 2231 'name*' or RFC 2047 encoded words)"""
+    value = params.get(name)
+    if value is None and f"{name}*" in params:
+        # RFC 2231: charset'language'percent-encoded
+        raw = _text(params[f"{name}*"])
+        return email.utils.collapse_rfc2231_value(email.utils.decode_rfc2231(raw))
+    if value is None:
+        return None
+    return _decode_words(_text(value))
+
+
+def _decode_words(text):
+    """Decode RFC 2047 encoded words, e.g. '=?utf-8?q?faktura_=C5=9B.pdf?='"""
+    if not text:
+        return text
+    try:
+        return str(email.header.make_header(email.header.decode_header(text)))
+    except Exception:
+        return text
+
+
+def decode_header_value(value):
+    """Decode an RFC 2047 header value (str or bytes) to stripped text
+
+    Plain ASCII values without encoded words are returned as they are, others go through
+    a bounded LRU cache because the same senders and subjects appear in most envelopes.
+    """
+    if not value:
+        return ""
+    if isinstance(value, bytes):
+        if value.isascii() and b"=?" not in value:
+            return value.decode('ascii').strip()
+        value = value.decode('utf-8', errors='ignore')
+    else:
+        value = str(value)
+    if value.isascii() and "=?" not in value:
+        return value.strip()
+    return _decode_header_text(value)
+
+
+@lru_cache(maxsize=HEADER_DECODE_CACHE_SIZE)
+def _decode_header_text(text):
+    decoded = ""
+    for part, encoding in email.header.decode_header(text):
+        if isinstance(part, bytes):
+            if encoding:
+                try:
+                    part = part.decode(encoding)
+                except (LookupError, UnicodeDecodeError):
+                    part = part.decode('utf-8', errors='ignore')
+            else:
+                part = part.decode('utf-8', errors='ignore')
+        decoded += part
+    return decoded.strip()
+
+
+def decode_part_content(data, encoding):
+    """Decode a fetched BODY[section] according to its Content-Transfer-Encoding"""
+    if data is None:
+        return None
+    if encoding == 'base64':
+        return base64.b64decode(data)
+    if encoding == 'quoted-printable':
+        return quopri.decodestring(data)
+    return data
@@ -2,11 +2,12 @@
 Multi-account mail connection manager supporting both Exchange and IMAP/SMTP
 """
 import json
-from imapclient import IMAPClient
 import poplib
 import email
 from exchangelib import Credentials, Account, Configuration, DELEGATE
 from tools.logger import log
+from .imap_pool import get_imap_pool
+from .exchange_folder_tree import get_folder_tree, invalidate_folder_tree
 
 # Handle optional tkinter import
 try:
@@ -144,14 +145,27 @@ class FolderNameMapper:
         return False
 
 
+def parse_excluded_folders(excluded_folders):
+    """Excluded folder names from the comma separated criteria value (or a list) as a set"""
+    if not excluded_folders:
+        return set()
+    if isinstance(excluded_folders, str):
+        excluded_folders = excluded_folders.split(',')
+    return {name.strip() for name in excluded_folders if name and name.strip()}
+
+
 class MailConnection:
     """Manages mail server connections for both Exchange and IMAP/SMTP"""
     
-    def __init__(self):
+    def __init__(self, account_index=None):
         self.account = None
         self.imap_connection = None
+        # Pool the current IMAP session was leased from (returned to it on close)
+        self.imap_pool = None
         self.pop3_connection = None
         self.current_account_config = None
+        # Bind get_main_account() to a specific account (multi-account search uses one MailConnection per account)
+        self.account_index = account_index
     
     def load_mail_config(self):
         """Load mail configuration from config file with fallback to legacy"""
@@ -200,6 +214,9 @@ class MailConnection:
     
     def get_main_account(self):
         """Get main account connection"""
+        if self.account_index is not None:
+            return self.get_account_by_index(self.account_index)
+        
         config = self.load_mail_config()
         if not config or not config.get("accounts"):
             return None
@@ -213,6 +230,13 @@ class MailConnection:
         account_config = accounts[main_index]
         return self._get_account_connection(account_config)
     
+    def get_account_configs(self):
+        """Get configurations of all configured accounts"""
+        config = self.load_mail_config()
+        if not config:
+            return []
+        return config.get("accounts", [])
+    
     def get_account_by_index(self, index):
         """Get account connection by index"""
         config = self.load_mail_config()
@@ -289,17 +313,14 @@ class MailConnection:
         return account
     
     def _get_imap_connection(self, account_config):
-        """Get IMAP connection"""
-        imap = IMAPClient(
-            account_config.get("imap_server", ""),
-            port=account_config.get("imap_port", 993),
-            ssl=account_config.get("imap_ssl", True)
-        )
-        
-        imap.login(
-            account_config.get("username", ""),
-            account_config.get("password", "")
-        )
+        """Get IMAP connection (a logged-in session leased from the account's connection pool)
+        
+        New sessions negotiate COMPRESS=DEFLATE when the server offers it; the pool's
+        transfer_stats count bytes on the wire against decompressed bytes.
+        """
+        pool = get_imap_pool(account_config)
+        imap = pool.acquire()
+        self.imap_pool = pool
         self.imap_connection = imap
         return imap
     
@@ -343,31 +364,33 @@ class MailConnection:
     def _get_exchange_folder_by_path(self, account, folder_path):
         """Get Exchange folder by path"""
         try:
-            path_parts = folder_path.split("/")
-            current_folder = account.inbox
-            
-            # Check if the first part is a known Polish inbox name
-            first_part_mapped = FolderNameMapper.polish_to_server(path_parts[0] if path_parts else "")
-            if first_part_mapped == "INBOX" or path_parts[0].lower() in ["inbox", "skrzynka odbiorcza"]:
-                path_parts = path_parts[1:]  # Skip inbox part
-            
-            for part in path_parts:
-                if part:
-                    found = False
-                    for child in current_folder.children:
-                        if child.name.lower() == part.lower():
-                            current_folder = child
-                            found = True
-                            break
-                    if not found:
-                        log(f"Nie znaleziono folderu: {part} w ścieżce {folder_path}")
-                        return account.inbox
-            
-            return current_folder
+            node = self._get_exchange_folder_node(account, folder_path)
+            return node.folder
         except Exception as e:
             messagebox.showerror("Błąd folderu", f"Błąd dostępu do folderu: {str(e)}")
             return account.inbox
     
+    def _get_exchange_folder_node(self, account, folder_path):
+        """Node of an Exchange folder path in the cached folder tree (the inbox when the path is not found)"""
+        tree = get_folder_tree(self.current_account_config or {}, account)
+        path_parts = (folder_path or "").split("/")
+        
+        # Check if the first part is a known Polish inbox name
+        first_part_mapped = FolderNameMapper.polish_to_server(path_parts[0] if path_parts else "")
+        if first_part_mapped == "INBOX" or path_parts[0].lower() in ["inbox", "skrzynka odbiorcza"]:
+            path_parts = path_parts[1:]  # Skip inbox part
+        
+        node = tree.find(path_parts)
+        if node is None:
+            log(f"Nie znaleziono folderu w ścieżce {folder_path}")
+            return tree.root
+        return node
+    
+    def refresh_folder_tree(self):
+        """Drop the cached Exchange folder tree, the next folder lookup loads it from the server"""
+        if self.current_account_config:
+            invalidate_folder_tree(self.current_account_config)
+    
     def _get_imap_folder_by_path(self, imap, folder_path):
         """Get IMAP folder by path"""
         try:
@@ -411,27 +434,20 @@ class MailConnection:
             # For POP3, this is simplified as POP3 only has one mailbox
             return ["INBOX"]
         elif account_type == "imap_smtp":
-            log("[MAIL CONNECTION] IMAP simplified folder handling")
-            # For IMAP, this is simplified as most IMAP operations work on single folders
-            folder = self.get_folder_by_path(account, folder_path)
-            return [folder] if folder else []
+            return self._get_imap_folder_with_subfolders(account, folder_path, excluded_folders)
         else:
             log(f"[MAIL CONNECTION] WARNING: Unknown account type '{account_type}', defaulting to IMAP behavior")
             folder = self.get_folder_by_path(account, folder_path)
             return [folder] if folder else []
     
     def _get_exchange_folder_with_subfolders(self, account, folder_path, excluded_folders=None):
-        """Get Exchange folder and all its subfolders recursively"""
+        """Get Exchange folder and all its subfolders from the cached folder tree"""
         try:
-            folder = self.get_folder_by_path(account, folder_path)
-            if not folder:
-                return []
+            node = self._get_exchange_folder_node(account, folder_path)
+            excluded_names = parse_excluded_folders(excluded_folders)
             
-            all_folders = [folder]
-            excluded_names = set(excluded_folders or [])
-            
-            subfolders = self._get_all_subfolders_recursive(folder, excluded_names)
-            all_folders.extend(subfolders)
+            subfolders = get_folder_tree(self.current_account_config or {}, account).subfolders(node, excluded_names)
+            all_folders = [node.folder] + [subfolder.folder for subfolder in subfolders]
             
             log(f"Znaleziono łącznie {len(all_folders)} folderów do przeszukania")
             return all_folders
@@ -441,25 +457,52 @@ class MailConnection:
             messagebox.showerror("Błąd folderów", f"Błąd pobierania listy folderów: {str(e)}")
             return []
     
-    def _get_all_subfolders_recursive(self, folder, excluded_folder_names=None):
-        """Recursively get all subfolders of a given folder"""
-        if excluded_folder_names is None:
-            excluded_folder_names = set()
-        
-        subfolders = []
+    def _get_imap_folder_with_subfolders(self, imap, folder_path, excluded_folders=None):
+        """Get IMAP folder and its whole subtree with two LIST commands
+        
+        A folder is skipped when its full name or the name of any of its levels below the
+        base folder is excluded - like Exchange, excluding a folder excludes its subfolders.
+        """
+        folder_name = FolderNameMapper.polish_to_server(folder_path)
+        excluded_names = parse_excluded_folders(excluded_folders)
         try:
-            for child in folder.children:
-                if child.name not in excluded_folder_names:
-                    subfolders.append(child)
-                    # Recursively get subfolders
-                    nested_subfolders = self._get_all_subfolders_recursive(child, excluded_folder_names)
-                    subfolders.extend(nested_subfolders)
-                else:
-                    log(f"Wykluczono folder: {child.name}")
+            base = imap.list_folders("", folder_name)
+            if not base:
+                log(f"[MAIL CONNECTION] IMAP folder '{folder_name}' not found, falling back to INBOX")
+                return ["INBOX"]
+            flags, delimiter, base_name = base[0]
+            if isinstance(delimiter, bytes):
+                delimiter = delimiter.decode()
+            # A \Noselect base only groups its subfolders
+            folders = [] if self._is_noselect(flags) else [base_name]
+            if not delimiter:
+                # Flat namespace - no subfolders
+                return folders
+            
+            subfolders = []
+            for flags, _, name in imap.list_folders("", f"{base_name}{delimiter}*"):
+                if self._is_noselect(flags):
+                    continue
+                levels = name[len(base_name) + 1:].split(delimiter)
+                ancestors = [delimiter.join([base_name] + levels[:i]) for i in range(1, len(levels) + 1)]
+                if excluded_names & (set(levels) | set(ancestors)):
+                    log(f"[MAIL CONNECTION] Excluded IMAP folder: {name}")
+                    continue
+                subfolders.append(name)
+            
+            subfolders.sort()
+            log(f"[MAIL CONNECTION] IMAP folder '{base_name}' with {len(subfolders)} subfolders: {subfolders}")
+            return folders + subfolders
+            
         except Exception as e:
-            log(f"Błąd pobierania podfolderów dla {folder.name}: {str(e)}")
-        
-        return subfolders
+            log(f"[MAIL CONNECTION] ERROR listing IMAP subfolders of '{folder_name}': {str(e)}")
+            folder = self._get_imap_folder_by_path(imap, folder_path)
+            return [folder] if folder else []
+    
+    @staticmethod
+    def _is_noselect(flags):
+        """True for LIST entries that cannot be selected (\\Noselect, \\NonExistent)"""
+        return any(flag.lower() in (b'\\noselect', b'\\nonexistent') for flag in flags or ())
     
     def _validate_account_config_for_folder_discovery(self, account_type):
         """Validate that account configuration is complete for folder discovery"""
@@ -548,24 +591,12 @@ class MailConnection:
     def _get_exchange_available_folders(self, account, folder_path):
         """Get available Exchange folders for exclusion"""
         try:
-            folder = self.get_folder_by_path(account, folder_path)
-            if not folder:
-                log("[MAIL CONNECTION] ERROR: Could not access Exchange folder for discovery")
-                return self._get_fallback_folders()
+            node = self._get_exchange_folder_node(account, folder_path)
+            tree = get_folder_tree(self.current_account_config or {}, account)
             
-            folder_names = []
-            
-            def collect_folder_names(f, prefix=""):
-                try:
-                    for child in f.children:
-                        full_name = f"{prefix}{child.name}" if prefix else child.name
-                        folder_names.append(full_name)
-                        # Recursively collect subfolders
-                        collect_folder_names(child, f"{full_name}/")
-                except Exception as e:
-                    log(f"[MAIL CONNECTION] ERROR collecting folder names from {f.name if hasattr(f, 'name') else 'Unknown'}: {str(e)}")
-            
-            collect_folder_names(folder)
+            # Names relative to the searched folder, e.g. 'Faktury/2024'
+            prefix_length = len(node.path) + 1 if node.path else 0
+            folder_names = [subfolder.path[prefix_length:] for subfolder in tree.subfolders(node)]
             
             # Add common Exchange folders if not found
             exchange_common = ["Sent Items", "Drafts", "Deleted Items", "Junk Email", "Outbox"]
@@ -584,21 +615,15 @@ class MailConnection:
             return self._get_fallback_folders()
     
     def _get_imap_available_folders(self, folder_path):
-        """Get available IMAP folders for exclusion by connecting to server"""
-        imap = None
+        """Get available IMAP folders for exclusion using a pooled connection"""
         try:
             if not self.current_account_config:
                 log("[MAIL CONNECTION] ERROR: No account configuration available for IMAP folder discovery")
                 return self._get_fallback_folders()
             
-            # Get IMAP connection
-            imap = self._get_imap_connection(self.current_account_config)
-            if not imap:
-                log("[MAIL CONNECTION] ERROR: Could not establish IMAP connection for folder discovery")
-                return self._get_fallback_folders()
-            
             # List all folders on the server
-            folders = imap.list_folders()
+            with get_imap_pool(self.current_account_config).lease() as imap:
+                folders = imap.list_folders()
             
             folder_names = []
             for folder_info in folders:
@@ -645,14 +670,6 @@ class MailConnection:
             log(f"[MAIL CONNECTION] ERROR getting IMAP folders: {str(e)}")
             # Return fallback list
             return self._get_fallback_folders()
-        finally:
-            # Always clean up the temporary IMAP connection used for folder discovery
-            if imap and imap != self.imap_connection:
-                try:
-                    imap.logout()
-                    log("[MAIL CONNECTION] Closed temporary IMAP connection for folder discovery")
-                except:
-                    pass
     
     def _get_fallback_folders(self):
         """Get fallback folder list when discovery fails"""
@@ -664,11 +681,17 @@ class MailConnection:
         
         if self.imap_connection:
             try:
-                self.imap_connection.logout()
-                log("[MAIL CONNECTION] IMAP connection closed")
+                if self.imap_pool:
+                    # Keep the session logged in for the next search
+                    self.imap_pool.release(self.imap_connection)
+                    log("[MAIL CONNECTION] IMAP connection returned to pool")
+                else:
+                    self.imap_connection.logout()
+                    log("[MAIL CONNECTION] IMAP connection closed")
             except:
                 pass
             self.imap_connection = None
+            self.imap_pool = None
         
         if self.pop3_connection:
             try:
@@ -0,0 +1,707 @@
+"""
+Local mail index (SQLite + FTS5) for mail search
+Stores headers, plain-text bodies and extracted PDF text of indexed folders so
+EmailSearchEngine can answer searches without querying the mail server.
+Synchronisation is incremental: IMAP UIDVALIDITY/UIDNEXT, Exchange SyncFolderItems
+state and POP3 UIDL lists are kept per folder.
+"""
+import email
+import email.utils
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from tools.logger import log
+from .pop3_pipeline import fetch_messages
+
+
+MAIL_INDEX_FILE = "mail_index.db"
+
+# Index older than this (seconds) is considered stale and live search is used instead
+DEFAULT_INDEX_MAX_AGE = 15 * 60
+
+# Plain-text body stored per message (characters)
+INDEX_BODY_MAX_CHARS = 20000
+
+# Messages larger than this are indexed by headers only (IMAP/POP3 bodies are downloaded in full)
+INDEX_MAX_MESSAGE_SIZE = 10 * 1024 * 1024
+
+# Items fetched per request while syncing
+INDEX_SYNC_BATCH_SIZE = 50
+
+# Trigram tokenizer gives case-insensitive substring matching like the live search
+FTS_MIN_TERM_LENGTH = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    account TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    folder_path TEXT,
+    message_key TEXT NOT NULL,
+    subject TEXT,
+    sender_name TEXT,
+    sender_email TEXT,
+    datetime_received TEXT,
+    is_read INTEGER DEFAULT 1,
+    has_attachments INTEGER DEFAULT 0,
+    attachment_names TEXT DEFAULT '[]',
+    UNIQUE (account, folder, message_key)
+);
+CREATE INDEX IF NOT EXISTS idx_messages_folder_date ON messages (account, folder, datetime_received);
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(subject, sender, body, tokenize='trigram');
+CREATE VIRTUAL TABLE IF NOT EXISTS pdf_fts USING fts5(message_id UNINDEXED, attachment_name UNINDEXED, text, tokenize='trigram');
+CREATE TABLE IF NOT EXISTS folder_state (
+    account TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    state TEXT,
+    includes_pdf_text INTEGER DEFAULT 0,
+    synced_at REAL,
+    PRIMARY KEY (account, folder)
+);
+CREATE TABLE IF NOT EXISTS sync_roots (
+    account TEXT NOT NULL,
+    search_root TEXT NOT NULL,
+    excluded TEXT NOT NULL,
+    folders TEXT,
+    includes_pdf_text INTEGER DEFAULT 0,
+    synced_at REAL,
+    PRIMARY KEY (account, search_root, excluded)
+);
+"""
+
+
+class IndexedSender:
+    """Sender of an indexed message (same attributes as Exchange Mailbox / IMAPSender)"""
+
+    def __init__(self, name, email_address):
+        self.name = name
+        self.email_address = email_address
+
+    def __str__(self):
+        return self.name or self.email_address or ""
+
+
+class IndexedAttachment:
+    """Attachment known only by name - content stays on the server"""
+
+    def __init__(self, name):
+        self.name = name
+        self.content = None
+
+    def __str__(self):
+        return self.name
+
+
+class IndexedMessage:
+    """Message-like object built from an index row"""
+
+    def __init__(self, message_key, subject, sender, datetime_received, is_read, has_attachments,
+                 attachment_names, folder_path):
+        self.id = message_key
+        self.subject = subject
+        self.sender = sender
+        self.datetime_received = datetime_received
+        self.is_read = is_read
+        self.has_attachments = has_attachments
+        self.attachments = [IndexedAttachment(name) for name in attachment_names]
+        self.folder_path = folder_path
+
+
+def get_account_key(account_config):
+    """Stable key of an account in the index"""
+    if not account_config:
+        return "default"
+    return f"{account_config.get('type', 'unknown')}:{account_config.get('email') or account_config.get('name', '')}"
+
+
+def normalize_excluded(excluded_folders):
+    """Normalize the comma-separated excluded folder list used as part of a sync root key"""
+    if not excluded_folders:
+        return ""
+    if isinstance(excluded_folders, str):
+        excluded_folders = excluded_folders.split(',')
+    return ','.join(sorted(name.strip() for name in excluded_folders if name and name.strip()))
+
+
+class MailIndex:
+    """SQLite FTS5 store of indexed messages and per-folder sync state"""
+
+    def __init__(self, db_path=MAIL_INDEX_FILE):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # --- sync state -------------------------------------------------------
+
+    def get_folder_state(self, account, folder):
+        """Return stored sync state dict of a folder or None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT state FROM folder_state WHERE account = ? AND folder = ?", (account, folder)
+            ).fetchone()
+        if not row or not row[0]:
+            return None
+        try:
+            return json.loads(row[0])
+        except ValueError:
+            return None
+
+    def set_folder_state(self, account, folder, state, includes_pdf_text=False):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO folder_state (account, folder, state, includes_pdf_text, synced_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (account, folder, json.dumps(state), int(bool(includes_pdf_text)), time.time())
+            )
+            self._db.commit()
+
+    def set_root(self, account, search_root, excluded_folders, folders, includes_pdf_text=False):
+        """Record which folders make up a searched root folder and when it was synced"""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sync_roots (account, search_root, excluded, folders, includes_pdf_text, synced_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (account, search_root, normalize_excluded(excluded_folders), json.dumps(list(folders)),
+                 int(bool(includes_pdf_text)), time.time())
+            )
+            self._db.commit()
+
+    def get_fresh_folders(self, account, search_root, excluded_folders, max_age=DEFAULT_INDEX_MAX_AGE,
+                          needs_pdf_text=False):
+        """Return folder keys of a root if its index is fresh enough to answer a search, otherwise None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT folders, includes_pdf_text, synced_at FROM sync_roots "
+                "WHERE account = ? AND search_root = ? AND excluded = ?",
+                (account, search_root, normalize_excluded(excluded_folders))
+            ).fetchone()
+        if not row:
+            return None
+        folders, includes_pdf_text, synced_at = row
+        if synced_at is None or time.time() - synced_at > max_age:
+            return None
+        if needs_pdf_text and not includes_pdf_text:
+            return None
+        return json.loads(folders or "[]")
+
+    # --- messages ---------------------------------------------------------
+
+    def clear_folder(self, account, folder):
+        """Remove all indexed messages of a folder (e.g. after UIDVALIDITY change)"""
+        with self._lock:
+            ids = [row[0] for row in self._db.execute(
+                "SELECT id FROM messages WHERE account = ? AND folder = ?", (account, folder))]
+            self._delete_ids(ids)
+            self._db.execute("DELETE FROM folder_state WHERE account = ? AND folder = ?", (account, folder))
+            self._db.commit()
+        if ids:
+            log(f"[MAIL INDEX] Wyczyszczono {len(ids)} wiadomości folderu '{folder}'")
+
+    def message_keys(self, account, folder):
+        with self._lock:
+            return {row[0] for row in self._db.execute(
+                "SELECT message_key FROM messages WHERE account = ? AND folder = ?", (account, folder))}
+
+    def upsert_message(self, account, folder, folder_path, record, commit=True):
+        """Insert or replace a message
+
+        record keys: message_key, subject, sender_name, sender_email, datetime_received,
+        is_read, has_attachments, attachment_names, body, pdf_texts ({attachment_name: text})
+        """
+        datetime_received = record.get('datetime_received')
+        if isinstance(datetime_received, datetime):
+            if datetime_received.tzinfo is None:
+                datetime_received = datetime_received.replace(tzinfo=timezone.utc)
+            datetime_received = datetime_received.astimezone(timezone.utc).isoformat()
+
+        with self._lock:
+            existing = self._db.execute(
+                "SELECT id FROM messages WHERE account = ? AND folder = ? AND message_key = ?",
+                (account, folder, str(record['message_key']))
+            ).fetchone()
+            if existing:
+                self._delete_ids([existing[0]])
+
+            cursor = self._db.execute(
+                "INSERT INTO messages (account, folder, folder_path, message_key, subject, sender_name, sender_email, "
+                "datetime_received, is_read, has_attachments, attachment_names) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (account, folder, folder_path, str(record['message_key']), record.get('subject') or '',
+                 record.get('sender_name') or '', record.get('sender_email') or '', datetime_received,
+                 int(bool(record.get('is_read', True))), int(bool(record.get('has_attachments'))),
+                 json.dumps(list(record.get('attachment_names') or [])))
+            )
+            row_id = cursor.lastrowid
+            sender_text = f"{record.get('sender_name') or ''} {record.get('sender_email') or ''}".strip()
+            self._db.execute(
+                "INSERT INTO messages_fts (rowid, subject, sender, body) VALUES (?, ?, ?, ?)",
+                (row_id, record.get('subject') or '', sender_text, (record.get('body') or '')[:INDEX_BODY_MAX_CHARS])
+            )
+            for attachment_name, text in (record.get('pdf_texts') or {}).items():
+                if text:
+                    self._db.execute(
+                        "INSERT INTO pdf_fts (message_id, attachment_name, text) VALUES (?, ?, ?)",
+                        (row_id, attachment_name, text)
+                    )
+            if commit:
+                self._db.commit()
+
+    def update_read_flag(self, account, folder, message_key, is_read):
+        with self._lock:
+            self._db.execute(
+                "UPDATE messages SET is_read = ? WHERE account = ? AND folder = ? AND message_key = ?",
+                (int(bool(is_read)), account, folder, str(message_key))
+            )
+            self._db.commit()
+
+    def remove_message(self, account, folder, message_key, commit=True):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id FROM messages WHERE account = ? AND folder = ? AND message_key = ?",
+                (account, folder, str(message_key))
+            ).fetchone()
+            if row:
+                self._delete_ids([row[0]])
+            if commit:
+                self._db.commit()
+
+    def commit(self):
+        with self._lock:
+            self._db.commit()
+
+    def _delete_ids(self, ids):
+        for row_id in ids:
+            self._db.execute("DELETE FROM messages WHERE id = ?", (row_id,))
+            self._db.execute("DELETE FROM messages_fts WHERE rowid = ?", (row_id,))
+            self._db.execute("DELETE FROM pdf_fts WHERE message_id = ?", (row_id,))
+
+    # --- search -----------------------------------------------------------
+
+    def search(self, account, folders, criteria, start_date=None, limit=None):
+        """Search indexed messages of the given folders
+
+        Returns a list of (IndexedMessage, pdf_match_info) newest first. pdf_match_info is None
+        unless criteria contain pdf_search_text.
+        """
+        where = ["m.account = ?"]
+        params = [account]
+
+        if folders:
+            where.append(f"m.folder IN ({','.join('?' * len(folders))})")
+            params.extend(folders)
+
+        fts_columns = []
+        for criteria_key, column in (('subject_search', 'subject'), ('sender', 'sender'), ('body_search', 'body')):
+            value = (criteria.get(criteria_key) or '').strip()
+            if value:
+                fts_columns.append((column, value))
+        for column, value in fts_columns:
+            if len(value) >= FTS_MIN_TERM_LENGTH:
+                where.append(f"m.id IN (SELECT rowid FROM messages_fts WHERE {column} MATCH ?)")
+                params.append(self._fts_phrase(value))
+            else:
+                where.append(f"m.id IN (SELECT rowid FROM messages_fts WHERE {column} LIKE ?)")
+                params.append(f"%{value}%")
+
+        if criteria.get('unread_only'):
+            where.append("m.is_read = 0")
+        if criteria.get('attachments_required'):
+            where.append("m.has_attachments = 1")
+        elif criteria.get('no_attachments_only'):
+            where.append("m.has_attachments = 0")
+        if start_date:
+            if start_date.tzinfo is None:
+                start_date = start_date.replace(tzinfo=timezone.utc)
+            where.append("m.datetime_received >= ?")
+            params.append(start_date.astimezone(timezone.utc).isoformat())
+
+        pdf_matches = None
+        pdf_search_text = (criteria.get('pdf_search_text') or '').strip()
+        if pdf_search_text:
+            pdf_matches = self._search_pdf_text(pdf_search_text)
+            if not pdf_matches:
+                return []
+            where.append(f"m.id IN ({','.join('?' * len(pdf_matches))})")
+            params.extend(pdf_matches.keys())
+
+        sql = ("SELECT m.id, m.message_key, m.subject, m.sender_name, m.sender_email, m.datetime_received, "
+               "m.is_read, m.has_attachments, m.attachment_names, m.folder_path FROM messages m "
+               f"WHERE {' AND '.join(where)} ORDER BY m.datetime_received DESC")
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+
+        attachment_name_filter = (criteria.get('attachment_name') or '').lower()
+        attachment_ext_filter = (criteria.get('attachment_extension') or '').lower()
+        results = []
+        for row_id, message_key, subject, sender_name, sender_email, received, is_read, has_attachments, names, folder_path in rows:
+            attachment_names = json.loads(names or "[]")
+            if attachment_name_filter or attachment_ext_filter:
+                if not any(self._attachment_matches(name, attachment_name_filter, attachment_ext_filter)
+                           for name in attachment_names):
+                    continue
+            message = IndexedMessage(
+                message_key, subject, IndexedSender(sender_name, sender_email),
+                datetime.fromisoformat(received) if received else None,
+                bool(is_read), bool(has_attachments), attachment_names, folder_path
+            )
+            results.append((message, pdf_matches.get(row_id) if pdf_matches else None))
+        return results
+
+    def _search_pdf_text(self, search_text):
+        """Return {message row id: pdf_match_info} for indexed PDF text containing search_text"""
+        if len(search_text) >= FTS_MIN_TERM_LENGTH:
+            sql, param = "SELECT message_id, attachment_name, text FROM pdf_fts WHERE text MATCH ?", self._fts_phrase(search_text)
+        else:
+            sql, param = "SELECT message_id, attachment_name, text FROM pdf_fts WHERE text LIKE ?", f"%{search_text}%"
+        with self._lock:
+            rows = self._db.execute(sql, (param,)).fetchall()
+
+        matches = {}
+        for message_id, attachment_name, text in rows:
+            snippets = self._snippets(text, search_text.lower())
+            info = matches.setdefault(message_id, {'found': True, 'attachments': [], 'all_matches': [], 'skipped_count': 0})
+            info['attachments'].append({'name': attachment_name, 'method': 'index', 'matches': snippets})
+            info['all_matches'].extend(snippets)
+        return matches
+
+    @staticmethod
+    def _fts_phrase(value):
+        return '"' + value.replace('"', '""') + '"'
+
+    @staticmethod
+    def _attachment_matches(name, name_filter, ext_filter):
+        name = (name or '').lower()
+        if name_filter and name_filter not in name:
+            return False
+        if ext_filter and not name.endswith(f'.{ext_filter}'):
+            return False
+        return True
+
+    @staticmethod
+    def _snippets(text, search_text_lower):
+        """Text around matches (50 characters each side, max 5) - same format as PDFProcessor"""
+        snippets = []
+        text_lower = text.lower()
+        start = 0
+        while len(snippets) < 5:
+            pos = text_lower.find(search_text_lower, start)
+            if pos == -1:
+                break
+            snippet = text[max(0, pos - 50):pos + len(search_text_lower) + 50].strip()
+            if snippet not in snippets:
+                snippets.append(snippet)
+            start = pos + 1
+        return snippets
+
+
+class MailIndexSyncer:
+    """Incrementally synchronises folders of the current account into a MailIndex"""
+
+    # Fields requested from SyncFolderItems (bodies and attachment names are fetched per batch)
+    EXCHANGE_SYNC_FIELDS = ['subject', 'sender', 'datetime_received', 'is_read', 'has_attachments']
+
+    def __init__(self, index, connection, search_engine, index_pdf_text=False):
+        """
+        Args:
+            index: MailIndex to update
+            connection: MailConnection used only by this syncer
+            search_engine: EmailSearchEngine providing folder path and header decoding helpers
+            index_pdf_text: Also extract and index text of PDF attachments (no OCR)
+        """
+        self.index = index
+        self.connection = connection
+        self.search_engine = search_engine
+        self.index_pdf_text = index_pdf_text
+        self.cancelled = False
+
+    def sync(self, criteria):
+        """Sync all folders of the searched root folder, returns number of indexed folders"""
+        account = self.connection.get_main_account()
+        if not account:
+            log("[MAIL INDEX] Brak połączenia z kontem - pominięto synchronizację")
+            return 0
+
+        account_config = self.connection.current_account_config or {}
+        account_type = account_config.get("type", "exchange")
+        account_key = get_account_key(account_config)
+        folder_path = criteria.get('folder_path', 'Skrzynka odbiorcza')
+        excluded_folders = criteria.get('excluded_folders', '')
+
+        folders = self.connection.get_folder_with_subfolders(account, folder_path, excluded_folders)
+        log(f"[MAIL INDEX] Synchronizacja {len(folders)} folderów ({account_key}, '{folder_path}')")
+
+        folder_keys = []
+        started = time.time()
+        for folder in folders:
+            if self.cancelled:
+                log("[MAIL INDEX] Synchronizacja przerwana")
+                return len(folder_keys)
+            folder_key = self.search_engine._get_folder_path(folder) if account_type == "exchange" else str(folder)
+            try:
+                if account_type == "exchange":
+                    self._sync_exchange_folder(account, account_key, folder, folder_key)
+                elif account_type == "pop3_smtp":
+                    self._sync_pop3_mailbox(account_key, folder_key)
+                else:
+                    self._sync_imap_folder(account_key, folder, folder_key)
+                folder_keys.append(folder_key)
+            except Exception as e:
+                log(f"[MAIL INDEX] BŁĄD synchronizacji folderu '{folder_key}': {str(e)}")
+                # An incomplete root must not be reported as fresh
+                return len(folder_keys)
+
+        self.index.set_root(account_key, folder_path, excluded_folders, folder_keys, self.index_pdf_text)
+        log(f"[MAIL INDEX] Zsynchronizowano {len(folder_keys)} folderów w {time.time() - started:.1f}s")
+        return len(folder_keys)
+
+    # --- Exchange ---------------------------------------------------------
+
+    def _sync_exchange_folder(self, account, account_key, folder, folder_key):
+        state = self.index.get_folder_state(account_key, folder_key) or {}
+        if state.get('includes_pdf_text', False) != self.index_pdf_text:
+            # PDF text setting changed - rebuild the folder
+            self.index.clear_folder(account_key, folder_key)
+            state = {}
+
+        changed_items = []
+        for change_type, item in folder.sync_items(sync_state=state.get('sync_state'),
+                                                    only_fields=self.EXCHANGE_SYNC_FIELDS):
+            if self.cancelled:
+                return
+            if change_type in ('create', 'update'):
+                changed_items.append(item)
+            elif change_type == 'delete':
+                self.index.remove_message(account_key, folder_key, item.id)
+            elif change_type == 'read_flag_change':
+                item_id, is_read = item
+                self.index.update_read_flag(account_key, folder_key, item_id.id, is_read)
+
+        for batch_start in range(0, len(changed_items), INDEX_SYNC_BATCH_SIZE):
+            if self.cancelled:
+                return
+            batch = changed_items[batch_start:batch_start + INDEX_SYNC_BATCH_SIZE]
+            for item in account.fetch(ids=batch):
+                if isinstance(item, Exception):
+                    log(f"[MAIL INDEX] Błąd pobierania wiadomości: {str(item)}")
+                    continue
+                self.index.upsert_message(account_key, folder_key, folder_key,
+                                          self._exchange_record(item), commit=False)
+            self.index.commit()
+
+        self.index.set_folder_state(account_key, folder_key, {
+            'sync_state': folder.item_sync_state,
+            'includes_pdf_text': self.index_pdf_text
+        }, self.index_pdf_text)
+        log(f"[MAIL INDEX] Folder '{folder_key}': {len(changed_items)} nowych/zmienionych wiadomości")
+
+    def _exchange_record(self, item):
+        attachments = list(getattr(item, 'attachments', None) or [])
+        pdf_texts = {}
+        if self.index_pdf_text:
+            for attachment in attachments:
+                name = getattr(attachment, 'name', '') or ''
+                if name.lower().endswith('.pdf') and hasattr(attachment, 'content'):
+                    pdf_texts[name] = self.search_engine.pdf_processor.extract_text(attachment.content, name)
+        sender = getattr(item, 'sender', None)
+        return {
+            'message_key': item.id,
+            'subject': item.subject,
+            'sender_name': getattr(sender, 'name', None),
+            'sender_email': getattr(sender, 'email_address', None),
+            'datetime_received': item.datetime_received,
+            'is_read': item.is_read,
+            'has_attachments': item.has_attachments,
+            'attachment_names': [getattr(a, 'name', '') or '' for a in attachments],
+            'body': getattr(item, 'text_body', None) or '',
+            'pdf_texts': pdf_texts
+        }
+
+    # --- IMAP -------------------------------------------------------------
+
+    def _sync_imap_folder(self, account_key, folder, folder_key):
+        imap = self.connection.imap_connection
+        if not imap:
+            raise Exception("No IMAP connection available")
+
+        folder_info = imap.select_folder(folder, readonly=True)
+        uidvalidity = folder_info.get(b'UIDVALIDITY')
+        uidnext = folder_info.get(b'UIDNEXT')
+
+        state = self.index.get_folder_state(account_key, folder_key) or {}
+        if state.get('uidvalidity') != uidvalidity or state.get('includes_pdf_text', False) != self.index_pdf_text:
+            if state:
+                log(f"[MAIL INDEX] [IMAP] UIDVALIDITY changed for '{folder}' - rebuilding folder index")
+            self.index.clear_folder(account_key, folder_key)
+            state = {}
+        last_uidnext = state.get('uidnext', 1)
+
+        # Messages removed on the server
+        current_uids = set(imap.search(['ALL']))
+        indexed_keys = self.index.message_keys(account_key, folder_key)
+        for removed_key in indexed_keys - {str(uid) for uid in current_uids}:
+            self.index.remove_message(account_key, folder_key, removed_key, commit=False)
+        self.index.commit()
+
+        new_uids = sorted(uid for uid in current_uids if uid >= last_uidnext)
+        for batch_start in range(0, len(new_uids), INDEX_SYNC_BATCH_SIZE):
+            if self.cancelled:
+                return
+            batch = new_uids[batch_start:batch_start + INDEX_SYNC_BATCH_SIZE]
+            response = imap.fetch(batch, ['ENVELOPE', 'FLAGS', 'RFC822.SIZE', 'BODYSTRUCTURE'])
+            small_uids = [uid for uid in batch if uid in response
+                          and response[uid].get(b'RFC822.SIZE', 0) <= INDEX_MAX_MESSAGE_SIZE]
+            bodies = imap.fetch(small_uids, ['BODY.PEEK[]']) if small_uids else {}
+            for uid in batch:
+                if uid not in response:
+                    continue
+                record = self._imap_record(uid, response[uid], bodies.get(uid, {}).get(b'BODY[]'))
+                if record:
+                    self.index.upsert_message(account_key, folder_key, folder_key, record, commit=False)
+            self.index.commit()
+
+        if uidnext is None:
+            uidnext = (max(current_uids) + 1) if current_uids else last_uidnext
+        self.index.set_folder_state(account_key, folder_key, {
+            'uidvalidity': uidvalidity,
+            'uidnext': uidnext,
+            'includes_pdf_text': self.index_pdf_text
+        }, self.index_pdf_text)
+        log(f"[MAIL INDEX] [IMAP] Folder '{folder}': indexed {len(new_uids)} new messages")
+
+    def _imap_record(self, uid, message_data, raw_message):
+        envelope = message_data.get(b'ENVELOPE')
+        if not envelope:
+            return None
+        decode = self.search_engine._decode_imap_header
+        address = None
+        if envelope.sender:
+            address = envelope.sender[0]
+        elif envelope.from_:
+            address = envelope.from_[0]
+        sender_email = None
+        sender_name = None
+        if address:
+            sender_email = decode(address.mailbox) + "@" + decode(address.host)
+            sender_name = decode(address.name) if address.name else None
+
+        body, attachment_names, pdf_texts = self._parse_raw_message(raw_message)
+        return {
+            'message_key': uid,
+            'subject': decode(envelope.subject) if envelope.subject else "",
+            'sender_name': sender_name,
+            'sender_email': sender_email,
+            'datetime_received': envelope.date,
+            'is_read': b'\\Seen' in message_data.get(b'FLAGS', []),
+            'has_attachments': bool(attachment_names) or self.search_engine._check_imap_attachments(message_data.get(b'BODYSTRUCTURE')),
+            'attachment_names': attachment_names,
+            'body': body,
+            'pdf_texts': pdf_texts
+        }
+
+    # --- POP3 -------------------------------------------------------------
+
+    def _sync_pop3_mailbox(self, account_key, folder_key):
+        pop3 = self.connection.pop3_connection
+        if not pop3:
+            raise Exception("No POP3 connection available")
+
+        uidl_map = {}
+        for line in pop3.uidl()[1]:
+            message_num, uidl = line.decode('utf-8', errors='ignore').split(' ', 1)
+            uidl_map[uidl.strip()] = int(message_num)
+
+        indexed_keys = self.index.message_keys(account_key, folder_key)
+        for removed_key in indexed_keys - set(uidl_map):
+            self.index.remove_message(account_key, folder_key, removed_key, commit=False)
+        self.index.commit()
+
+        new_uidls = [uidl for uidl in uidl_map if uidl not in indexed_keys]
+        # RETR commands are pipelined when the server supports it
+        retrieved = fetch_messages(pop3, [uidl_map[uidl] for uidl in new_uidls])
+        try:
+            self._index_pop3_messages(account_key, folder_key, new_uidls, retrieved)
+        finally:
+            retrieved.close()
+        if self.cancelled:
+            return
+
+        self.index.set_folder_state(account_key, folder_key, {
+            'uidl_count': len(uidl_map),
+            'includes_pdf_text': self.index_pdf_text
+        }, self.index_pdf_text)
+        log(f"[MAIL INDEX] [POP3] Indexed {len(new_uidls)} new messages")
+
+    def _index_pop3_messages(self, account_key, folder_key, new_uidls, retrieved):
+        for position, (uidl, (_, response)) in enumerate(zip(new_uidls, retrieved), 1):
+            if self.cancelled:
+                return
+            if response is None:
+                continue
+            raw_message = b'\r\n'.join(response)
+            email_message = email.message_from_bytes(raw_message)
+            body, attachment_names, pdf_texts = self._parse_raw_message(raw_message)
+            sender_name, sender_email = email.utils.parseaddr(
+                self.search_engine._decode_imap_header(email_message.get('From', '')))
+            self.index.upsert_message(account_key, folder_key, folder_key, {
+                'message_key': uidl,
+                'subject': self.search_engine._decode_imap_header(email_message.get('Subject', '')),
+                'sender_name': sender_name,
+                'sender_email': sender_email,
+                'datetime_received': self._parse_date(email_message.get('Date')),
+                'is_read': True,
+                'has_attachments': bool(attachment_names),
+                'attachment_names': attachment_names,
+                'body': body,
+                'pdf_texts': pdf_texts
+            }, commit=False)
+            if position % INDEX_SYNC_BATCH_SIZE == 0:
+                self.index.commit()
+        self.index.commit()
+
+    # --- helpers ----------------------------------------------------------
+
+    def _parse_raw_message(self, raw_message):
+        """Return (plain-text body, attachment names, {pdf name: text}) of a raw RFC822 message"""
+        if not raw_message:
+            return "", [], {}
+        email_message = email.message_from_bytes(raw_message)
+        body_parts = []
+        attachment_names = []
+        pdf_texts = {}
+        for part in email_message.walk():
+            if part.is_multipart():
+                continue
+            filename = part.get_filename()
+            if filename:
+                filename = self.search_engine._decode_imap_header(filename)
+                attachment_names.append(filename)
+                if self.index_pdf_text and filename.lower().endswith('.pdf'):
+                    content = part.get_payload(decode=True)
+                    if content:
+                        pdf_texts[filename] = self.search_engine.pdf_processor.extract_text(content, filename)
+            elif part.get_content_type() == 'text/plain':
+                payload = part.get_payload(decode=True) or b''
+                charset = part.get_content_charset() or 'utf-8'
+                try:
+                    body_parts.append(payload.decode(charset, errors='ignore'))
+                except LookupError:
+                    body_parts.append(payload.decode('utf-8', errors='ignore'))
+        return "\n".join(body_parts)[:INDEX_BODY_MAX_CHARS], attachment_names, pdf_texts
+
+    @staticmethod
+    def _parse_date(date_header):
+        try:
+            return email.utils.parsedate_to_datetime(date_header) if date_header else None
+        except (TypeError, ValueError):
+            return None
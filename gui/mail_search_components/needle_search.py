@@ -0,0 +1,138 @@
+"""
+Multi-needle PDF search for mail search
+Many search texts (e.g. invoice numbers exported by ZakupiTab to odczyty/zakupy.csv)
+are matched in a single pass over each PDF's text with an Aho-Corasick automaton.
+"""
+import csv
+import hashlib
+import os
+from collections import deque
+from tools.logger import log
+
+
+# CSV written by ZakupiTab.save_invoice_numbers_to_csv (one invoice number per row, column A)
+DEFAULT_NEEDLES_CSV = os.path.join("odczyty", "zakupy.csv")
+
+
+class NeedleMatcher:
+    """Case-insensitive Aho-Corasick matcher for a list of search texts"""
+
+    def __init__(self, needles):
+        self.needles = []
+        seen = set()
+        for needle in needles:
+            needle = (needle or '').strip()
+            if needle and needle.lower() not in seen:
+                seen.add(needle.lower())
+                self.needles.append(needle)
+
+        # Trie: goto transitions, failure links and needle indices ending in each state
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for index, needle in enumerate(self.needles):
+            state = 0
+            for char in needle.lower():
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append(index)
+        self._build_failure_links()
+
+        digest = hashlib.sha1("\n".join(sorted(seen)).encode('utf-8')).hexdigest()[:12]
+        self.label = f"{len(self.needles)} numerów (#{digest})"
+
+    def _build_failure_links(self):
+        pending = deque(self._goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for char, next_state in self._goto[state].items():
+                pending.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                if self._fail[next_state] == next_state:
+                    self._fail[next_state] = 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def __len__(self):
+        return len(self.needles)
+
+    def __str__(self):
+        # Used in logs and as the PDF history key of a needle search
+        return self.label
+
+    def find_all(self, text):
+        """Return {needle: [start positions]} of all needles found in text"""
+        found = {}
+        if not text:
+            return found
+        state = 0
+        for position, char in enumerate(text.lower()):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for index in self._output[state]:
+                needle = self.needles[index]
+                found.setdefault(needle, []).append(position - len(needle) + 1)
+        return found
+
+
+def load_needles_from_csv(csv_path=DEFAULT_NEEDLES_CSV):
+    """Read search texts from the first column of a CSV file"""
+    needles = []
+    with open(csv_path, newline='', encoding='utf-8-sig') as csvfile:
+        for row in csv.reader(csvfile):
+            if row and row[0].strip():
+                needles.append(row[0].strip())
+    log(f"Wczytano {len(needles)} numerów do wyszukiwania w PDF z pliku: {csv_path}")
+    return needles
+
+
+def build_pdf_search(criteria):
+    """Return the PDF search of criteria: NeedleMatcher for a needle list/CSV, text, or None"""
+    needles = criteria.get('pdf_search_needles')
+    needles_file = criteria.get('pdf_needles_file')
+    if needles_file:
+        try:
+            needles = list(needles or []) + load_needles_from_csv(needles_file)
+        except Exception as e:
+            log(f"BŁĄD wczytywania numerów z pliku {needles_file}: {str(e)}")
+    if needles:
+        matcher = NeedleMatcher(needles)
+        if matcher.needles:
+            return matcher
+
+    pdf_search_text = (criteria.get('pdf_search_text') or '').strip()
+    return pdf_search_text or None
+
+
+def build_needle_matches(matcher, messages, folder_map, pdf_matches):
+    """Map each needle to the messages and PDF attachments containing it
+
+    Returns:
+        dict: needle -> [{'message_id', 'subject', 'folder_path', 'datetime_received', 'attachment'}]
+            (needles without any match map to an empty list)
+    """
+    needle_matches = {needle: [] for needle in matcher.needles}
+    for message in messages:
+        message_key = getattr(message, 'id', id(message))
+        pdf_match_info = pdf_matches.get(message_key)
+        if not pdf_match_info:
+            continue
+        for attachment in pdf_match_info.get('attachments', []):
+            for needle in attachment.get('needles', []):
+                needle_matches.setdefault(needle, []).append({
+                    'message_id': message_key,
+                    'subject': getattr(message, 'subject', None) or 'Brak tematu',
+                    'folder_path': folder_map.get(message_key, 'Skrzynka odbiorcza'),
+                    'datetime_received': getattr(message, 'datetime_received', None),
+                    'attachment': attachment['name']
+                })
+    return needle_matches
@@ -0,0 +1,227 @@
+"""
+Pipelined PDF content search for mail search
+Attachment download, text-layer extraction and OCR run as separate stages connected
+by bounded queues, so network, text extraction and OCR work overlap across messages.
+Results are handed back in input (date) order.
+"""
+import queue
+import threading
+from tools.logger import log
+
+
+# Default worker counts per stage
+DEFAULT_PDF_DOWNLOAD_WORKERS = 2
+DEFAULT_PDF_EXTRACT_WORKERS = 2
+DEFAULT_PDF_OCR_WORKERS = 1
+
+# Messages allowed between the download stage and the consumer (bounds memory held by PDF contents)
+DEFAULT_PDF_MAX_IN_FLIGHT = 8
+
+_STOP = object()
+
+
+class PDFSearchJob:
+    """PDF search state of a single message moving through the pipeline"""
+
+    def __init__(self, seq, message):
+        self.seq = seq
+        self.message = message
+        self.pdfs = []          # [attachment_name, attachment, content, result]
+        self.skipped = []       # [(attachment_name, attachment)] skipped by PDF history
+        self.error = None
+
+    @property
+    def searched(self):
+        """(attachment_name, attachment, result) of every searched PDF"""
+        return [(name, attachment, result) for name, attachment, _, result in self.pdfs]
+
+    def pending_ocr(self):
+        return [pdf for pdf in self.pdfs if pdf[3] is None]
+
+
+class _StageWorkers:
+    """Worker threads of one stage; the last finishing worker stops the next stage"""
+
+    def __init__(self, name, count, target, next_queue, next_count):
+        self.remaining = count
+        self.lock = threading.Lock()
+        self.next_queue = next_queue
+        self.next_count = next_count
+        self.threads = [
+            threading.Thread(target=target, name=f"pdf-{name}-{i}", daemon=True) for i in range(count)
+        ]
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def finished(self):
+        with self.lock:
+            self.remaining -= 1
+            last = self.remaining == 0
+        if last and self.next_queue is not None:
+            for _ in range(self.next_count):
+                self.next_queue.put(_STOP)
+
+
+class PDFSearchPipeline:
+    """download → extract → OCR stages with their own worker counts and bounded queues"""
+
+    def __init__(self, pdf_processor, search_text, prepare_message, is_cancelled=None,
+                 download_workers=DEFAULT_PDF_DOWNLOAD_WORKERS, extract_workers=DEFAULT_PDF_EXTRACT_WORKERS,
+                 ocr_workers=DEFAULT_PDF_OCR_WORKERS, max_in_flight=DEFAULT_PDF_MAX_IN_FLIGHT):
+        """
+        Args:
+            pdf_processor: PDFProcessor providing extract_text, ocr_text and match_text
+            search_text: Text searched in PDFs
+            prepare_message: Callable(message) -> (pdfs, skipped) with pdfs as [(name, attachment)]
+            is_cancelled: Callable returning True when the search was cancelled
+        """
+        self.pdf_processor = pdf_processor
+        self.search_text = search_text
+        self.prepare_message = prepare_message
+        self.is_cancelled = is_cancelled or (lambda: False)
+        self.download_workers = max(1, download_workers)
+        self.extract_workers = max(1, extract_workers)
+        self.ocr_workers = max(1, ocr_workers)
+        self.max_in_flight = max(1, max_in_flight)
+
+        self._download_queue = queue.Queue(maxsize=self.max_in_flight)
+        self._extract_queue = queue.Queue(maxsize=self.max_in_flight)
+        self._ocr_queue = queue.Queue(maxsize=self.max_in_flight)
+        self._in_flight = threading.Semaphore(self.max_in_flight)
+        self._done = {}
+        self._done_condition = threading.Condition()
+        self._fed_count = None
+        self._closed = False
+
+    def run(self, messages):
+        """Search PDFs of messages, yields finished PDFSearchJob objects in input order"""
+        ocr_stage = _StageWorkers("ocr", self.ocr_workers, self._ocr_worker, None, 0)
+        extract_stage = _StageWorkers("extract", self.extract_workers, self._extract_worker,
+                                      self._ocr_queue, self.ocr_workers)
+        download_stage = _StageWorkers("download", self.download_workers, self._download_worker,
+                                       self._extract_queue, self.extract_workers)
+        self._stages = {'download': download_stage, 'extract': extract_stage, 'ocr': ocr_stage}
+        for stage in (ocr_stage, extract_stage, download_stage):
+            stage.start()
+
+        feeder = threading.Thread(target=self._feed, args=(messages,), name="pdf-feed", daemon=True)
+        feeder.start()
+
+        # Reorder buffer - jobs finish out of order, hand them back by sequence number
+        next_seq = 0
+        try:
+            while True:
+                with self._done_condition:
+                    while next_seq not in self._done:
+                        if self._fed_count is not None and next_seq >= self._fed_count:
+                            return
+                        if self.is_cancelled():
+                            return
+                        self._done_condition.wait(timeout=0.2)
+                    job = self._done.pop(next_seq)
+                self._in_flight.release()
+                next_seq += 1
+                yield job
+        finally:
+            # Consumer stopped (finished, cancelled or abandoned the generator) - let workers drain
+            self._closed = True
+
+    def _should_stop(self):
+        return self._closed or self.is_cancelled()
+
+    def _feed(self, messages):
+        count = 0
+        for message in messages:
+            while not self._in_flight.acquire(timeout=0.2):
+                if self._should_stop():
+                    break
+            if self._should_stop():
+                break
+            self._download_queue.put(PDFSearchJob(count, message))
+            count += 1
+        for _ in range(self.download_workers):
+            self._download_queue.put(_STOP)
+        with self._done_condition:
+            self._fed_count = count
+            self._done_condition.notify_all()
+
+    def _deliver(self, job):
+        with self._done_condition:
+            self._done[job.seq] = job
+            self._done_condition.notify_all()
+
+    def _download_worker(self):
+        """Stage 1: list PDF attachments and download their content (network)"""
+        while True:
+            job = self._download_queue.get()
+            if job is _STOP:
+                self._stages['download'].finished()
+                return
+            if self._should_stop():
+                self._deliver(job)
+                continue
+            try:
+                pdfs, job.skipped = self.prepare_message(job.message)
+                for attachment_name, attachment in pdfs:
+                    content = getattr(attachment, 'content', None)
+                    if content:
+                        job.pdfs.append([attachment_name, attachment, content, None])
+            except Exception as e:
+                job.error = str(e)
+                log(f"Błąd pobierania załączników PDF: {str(e)}")
+            if job.pdfs:
+                self._extract_queue.put(job)
+            else:
+                self._deliver(job)
+
+    def _extract_worker(self):
+        """Stage 2: search the text layer, PDFs without a match go to OCR"""
+        while True:
+            job = self._extract_queue.get()
+            if job is _STOP:
+                self._stages['extract'].finished()
+                return
+            try:
+                for pdf in job.pdfs:
+                    if self._should_stop():
+                        break
+                    attachment_name, _, content, _ = pdf
+                    text = self.pdf_processor.extract_text(content, attachment_name)
+                    result = self.pdf_processor.match_text(text, self.search_text, 'text_extraction')
+                    if result['found'] or not self.pdf_processor.ocr_available:
+                        pdf[3] = result
+            except Exception as e:
+                job.error = str(e)
+                log(f"Błąd ekstrakcji tekstu z PDF: {str(e)}")
+            if job.pending_ocr() and not job.error and not self._should_stop():
+                self._ocr_queue.put(job)
+            else:
+                self._finish(job)
+
+    def _ocr_worker(self):
+        """Stage 3: OCR PDFs without a matching text layer"""
+        while True:
+            job = self._ocr_queue.get()
+            if job is _STOP:
+                self._stages['ocr'].finished()
+                return
+            try:
+                for pdf in job.pending_ocr():
+                    if self._should_stop():
+                        break
+                    attachment_name, _, content, _ = pdf
+                    log(f"Próba OCR z PDF: {attachment_name}")
+                    text = self.pdf_processor.ocr_text(content, attachment_name)
+                    pdf[3] = self.pdf_processor.match_text(text, self.search_text, 'ocr')
+            except Exception as e:
+                job.error = str(e)
+                log(f"Błąd OCR PDF: {str(e)}")
+            self._finish(job)
+
+    def _finish(self, job):
+        for pdf in job.pdfs:
+            if pdf[3] is None:
+                pdf[3] = {'found': False, 'matches': [], 'method': 'error' if job.error else 'cancelled'}
+        self._deliver(job)
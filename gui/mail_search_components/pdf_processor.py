@@ -5,6 +5,8 @@ import io
 import os
 import tempfile
 from tools.logger import log
+from tools.cancellation import CancellationToken, OperationCancelled
+from .needle_search import NeedleMatcher
 
 # Import poppler utilities for automatic path detection
 try:
@@ -64,12 +66,17 @@ except ImportError as e:
 class PDFProcessor:
     """Handles PDF text extraction and search operations"""
     
-    def __init__(self):
-        self.search_cancelled = False
+    def __init__(self, cancellation_token=None):
+        # Shared with EmailSearchEngine so cancelling the search also stops PDF/OCR work
+        self.cancellation_token = cancellation_token or CancellationToken()
+    
+    @property
+    def search_cancelled(self):
+        return self.cancellation_token.cancelled
     
     def cancel_search(self):
         """Cancel ongoing PDF processing"""
-        self.search_cancelled = True
+        self.cancellation_token.cancel()
     
     def search_in_pdf_attachment(self, attachment, search_text, attachment_name=""):
         """
@@ -98,7 +105,8 @@ class PDFProcessor:
             log("PDF search not available: missing dependencies (pdfplumber, pytesseract)")
             return {'found': False, 'matches': [], 'method': 'missing_dependencies'}
         
-        search_text_lower = search_text.lower().strip()
+        # NeedleMatcher searches for many texts at once, plain text is matched case-insensitively
+        search_text_lower = search_text if isinstance(search_text, NeedleMatcher) else search_text.lower().strip()
         if not search_text_lower:
             return {'found': False, 'matches': [], 'method': 'empty_search'}
         
@@ -122,51 +130,41 @@ class PDFProcessor:
         
         return {'found': False, 'matches': [], 'method': 'not_found'}
     
-    def _search_with_text_extraction(self, pdf_content, search_text_lower, attachment_name):
-        """Try to extract text directly from PDF and search"""
-        if not HAVE_PDFPLUMBER:
-            return {'found': False, 'matches': [], 'method': 'pdfplumber_not_available'}
-            
+    @property
+    def text_extraction_available(self):
+        return HAVE_PDFPLUMBER
+    
+    @property
+    def ocr_available(self):
+        return HAVE_OCR
+    
+    def extract_text(self, pdf_content, attachment_name=""):
+        """Extract embedded text from a PDF without OCR"""
+        if not HAVE_PDFPLUMBER or not pdf_content:
+            return ""
+        
         try:
-            log(f"Próba ekstrakcji tekstu z PDF: {attachment_name}")
-            
-            # Use pdfplumber to extract text
             with io.BytesIO(pdf_content) as pdf_stream:
                 with pdfplumber.open(pdf_stream) as pdf:
                     all_text = ""
-                    for page_num, page in enumerate(pdf.pages):
+                    for page in pdf.pages:
                         if self.search_cancelled:
                             break
                         
                         page_text = page.extract_text()
                         if page_text:
                             all_text += page_text + "\n"
-                    
-                    if all_text.strip():
-                        # Search for the text (case-insensitive)
-                        all_text_lower = all_text.lower()
-                        if search_text_lower in all_text_lower:
-                            matches = self._extract_matches(all_text, search_text_lower)
-                            log(f"Tekst znaleziony w PDF {attachment_name} przez ekstrakcję tekstu")
-                            return {'found': True, 'matches': matches, 'method': 'text_extraction'}
-                        else:
-                            log(f"Tekst nie znaleziony w PDF {attachment_name} przez ekstrakcję tekstu")
-                    else:
-                        log(f"Brak tekstu do ekstrakcji z PDF {attachment_name}")
-                        
+                    return all_text
         except Exception as e:
             log(f"Error during text extraction from {attachment_name}: {str(e)}")
-        
-        return {'found': False, 'matches': [], 'method': 'text_extraction_failed'}
+            return ""
     
-    def _search_with_ocr(self, pdf_content, search_text_lower, attachment_name):
-        """Use OCR to extract text from PDF and search"""
-        if not HAVE_OCR:
-            return {'found': False, 'matches': [], 'method': 'ocr_not_available'}
-            
+    def ocr_text(self, pdf_content, attachment_name=""):
+        """Extract text from a PDF with OCR (slow - used when the PDF has no text layer)"""
+        if not HAVE_OCR or not pdf_content:
+            return ""
+        
         try:
-            log(f"Próba OCR z PDF: {attachment_name}")
-            
             # Convert PDF to images
             images = convert_from_bytes(pdf_content, dpi=200, poppler_path=POPPLER_PATH)
             
@@ -186,51 +184,92 @@ class PDFProcessor:
                     ocr_results = ocr_manager.perform_ocr_batch(
                         images, 
                         language='pol+eng',
-                        progress_callback=progress_callback
+                        progress_callback=progress_callback,
+                        cancellation_token=self.cancellation_token
                     )
                     
                     # Combine all results
-                    all_ocr_text = "\n".join(filter(None, ocr_results))
+                    return "\n".join(filter(None, ocr_results))
                     
+                except OperationCancelled:
+                    log(f"OCR PDF {attachment_name} anulowany")
+                    return ""
                 except Exception as e:
                     log(f"Błąd zaawansowanego OCR, fallback do pytesseract: {e}")
-                    # Fallback to original method
-                    for page_num, image in enumerate(images):
-                        if self.search_cancelled:
-                            break
-                        
-                        log(f"OCR (fallback) strona {page_num + 1}/{len(images)} z PDF {attachment_name}")
-                        page_text = pytesseract.image_to_string(image, lang='pol+eng')
-                        if page_text:
-                            all_ocr_text += page_text + "\n"
-            else:
-                # Original single-threaded processing
-                for page_num, image in enumerate(images):
-                    if self.search_cancelled:
-                        break
-                    
-                    log(f"OCR strona {page_num + 1}/{len(images)} z PDF {attachment_name}")
-                    
-                    # Perform OCR
-                    page_text = pytesseract.image_to_string(image, lang='pol+eng')
-                    if page_text:
-                        all_ocr_text += page_text + "\n"
             
-            if all_ocr_text.strip():
-                # Search for the text (case-insensitive)
-                all_ocr_text_lower = all_ocr_text.lower()
-                if search_text_lower in all_ocr_text_lower:
-                    matches = self._extract_matches(all_ocr_text, search_text_lower)
-                    log(f"Tekst znaleziony w PDF {attachment_name} przez OCR")
-                    return {'found': True, 'matches': matches, 'method': 'ocr'}
-                else:
-                    log(f"Tekst nie znaleziony w PDF {attachment_name} przez OCR")
-            else:
-                log(f"Brak tekstu z OCR z PDF {attachment_name}")
+            # Single-threaded processing (also fallback for advanced OCR errors)
+            for page_num, image in enumerate(images):
+                if self.search_cancelled:
+                    break
                 
+                log(f"OCR strona {page_num + 1}/{len(images)} z PDF {attachment_name}")
+                
+                # Perform OCR
+                page_text = pytesseract.image_to_string(image, lang='pol+eng')
+                if page_text:
+                    all_ocr_text += page_text + "\n"
+            return all_ocr_text
+            
         except Exception as e:
             log(f"Error during OCR from {attachment_name}: {str(e)}")
+            return ""
+    
+    def match_text(self, text, search_text, method):
+        """Search extracted PDF text, returns the same dict as search_in_pdf_attachment"""
+        if isinstance(search_text, NeedleMatcher):
+            return self.match_needles(text, search_text, method)
+        search_text_lower = search_text.lower().strip()
+        if text and text.strip() and search_text_lower and search_text_lower in text.lower():
+            return {'found': True, 'matches': self._extract_matches(text, search_text_lower), 'method': method}
+        return {'found': False, 'matches': [], 'method': f'{method}_not_found'}
+    
+    def match_needles(self, text, matcher, method):
+        """Match all needles of a NeedleMatcher in one pass, adds the found needles to the result"""
+        found = matcher.find_all(text) if text and text.strip() else {}
+        if not found:
+            return {'found': False, 'matches': [], 'needles': [], 'method': f'{method}_not_found'}
+        
+        matches = []
+        for needle, positions in found.items():
+            # One context snippet per needle (50 chars before and after its first occurrence)
+            pos = positions[0]
+            matches.append(text[max(0, pos - 50):min(len(text), pos + len(needle) + 50)].strip())
+        return {'found': True, 'matches': matches, 'needles': list(found), 'method': method}
+    
+    def _search_with_text_extraction(self, pdf_content, search_text_lower, attachment_name):
+        """Try to extract text directly from PDF and search"""
+        if not HAVE_PDFPLUMBER:
+            return {'found': False, 'matches': [], 'method': 'pdfplumber_not_available'}
+            
+        log(f"Próba ekstrakcji tekstu z PDF: {attachment_name}")
+        all_text = self.extract_text(pdf_content, attachment_name)
+        if not all_text.strip():
+            log(f"Brak tekstu do ekstrakcji z PDF {attachment_name}")
+            return {'found': False, 'matches': [], 'method': 'text_extraction_failed'}
+        
+        result = self.match_text(all_text, search_text_lower, 'text_extraction')
+        if result['found']:
+            log(f"Tekst znaleziony w PDF {attachment_name} przez ekstrakcję tekstu")
+            return result
+        log(f"Tekst nie znaleziony w PDF {attachment_name} przez ekstrakcję tekstu")
+        return {'found': False, 'matches': [], 'method': 'text_extraction_failed'}
+    
+    def _search_with_ocr(self, pdf_content, search_text_lower, attachment_name):
+        """Use OCR to extract text from PDF and search"""
+        if not HAVE_OCR:
+            return {'found': False, 'matches': [], 'method': 'ocr_not_available'}
+            
+        log(f"Próba OCR z PDF: {attachment_name}")
+        all_ocr_text = self.ocr_text(pdf_content, attachment_name)
+        if not all_ocr_text.strip():
+            log(f"Brak tekstu z OCR z PDF {attachment_name}")
+            return {'found': False, 'matches': [], 'method': 'ocr_failed'}
         
+        result = self.match_text(all_ocr_text, search_text_lower, 'ocr')
+        if result['found']:
+            log(f"Tekst znaleziony w PDF {attachment_name} przez OCR")
+            return result
+        log(f"Tekst nie znaleziony w PDF {attachment_name} przez OCR")
         return {'found': False, 'matches': [], 'method': 'ocr_failed'}
     
     def _extract_matches(self, full_text, search_text_lower):
@@ -0,0 +1,136 @@
+"""
+Local cache of POP3 messages keyed by UIDL
+Stores the TOP response (headers and the first body lines) and, for messages that were
+downloaded, the raw message, so repeated searches only send UIDL plus TOP/RETR for new
+messages. Messages deleted from the server are removed on the next UIDL listing.
+"""
+import sqlite3
+import threading
+import time
+from tools.logger import log
+
+
+POP3_CACHE_FILE = "pop3_cache.db"
+
+# Raw messages larger than this are not stored (they are downloaded again when needed)
+POP3_CACHE_MAX_MESSAGE_SIZE = 10 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pop3_messages (
+    account TEXT NOT NULL,
+    uidl TEXT NOT NULL,
+    top_lines INTEGER,
+    headers BLOB,
+    raw_message BLOB,
+    cached_at REAL,
+    PRIMARY KEY (account, uidl)
+);
+"""
+
+
+def parse_uidl_listing(lines):
+    """Map message numbers to UIDLs from a UIDL response, e.g. [b'1 abc', b'2 def'] -> {1: 'abc', 2: 'def'}"""
+    uidls = {}
+    for line in lines:
+        message_num, uidl = line.decode('utf-8', errors='ignore').split(' ', 1)
+        uidls[int(message_num)] = uidl.strip()
+    return uidls
+
+
+class POP3MessageCache:
+    """SQLite store of TOP responses and raw messages of POP3 accounts"""
+
+    def __init__(self, db_path=POP3_CACHE_FILE, max_message_size=POP3_CACHE_MAX_MESSAGE_SIZE):
+        self.db_path = db_path
+        self.max_message_size = max_message_size
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def get_headers(self, account, uidl, top_lines):
+        """Cached TOP response with at least top_lines body lines (or the raw message), None when missing"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT top_lines, headers, raw_message FROM pop3_messages WHERE account = ? AND uidl = ?",
+                (account, uidl)
+            ).fetchone()
+        if not row:
+            return None
+        cached_lines, headers, raw_message = row
+        if raw_message is not None:
+            return bytes(raw_message)
+        if headers is not None and cached_lines is not None and cached_lines >= top_lines:
+            return bytes(headers)
+        return None
+
+    def store_headers(self, account, uidl, top_lines, headers):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO pop3_messages (account, uidl, top_lines, headers, cached_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (account, uidl) DO UPDATE SET top_lines = excluded.top_lines, "
+                "headers = excluded.headers, cached_at = excluded.cached_at",
+                (account, uidl, top_lines, headers, time.time())
+            )
+            self._db.commit()
+
+    def get_message(self, account, uidl):
+        """Cached raw message or None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT raw_message FROM pop3_messages WHERE account = ? AND uidl = ?", (account, uidl)
+            ).fetchone()
+        return bytes(row[0]) if row and row[0] is not None else None
+
+    def store_message(self, account, uidl, raw_message):
+        if len(raw_message) > self.max_message_size:
+            return
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO pop3_messages (account, uidl, raw_message, cached_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (account, uidl) DO UPDATE SET raw_message = excluded.raw_message, "
+                "cached_at = excluded.cached_at",
+                (account, uidl, raw_message, time.time())
+            )
+            self._db.commit()
+
+    def prune(self, account, live_uidls):
+        """Remove messages of the account that are no longer on the server"""
+        live_uidls = set(live_uidls)
+        with self._lock:
+            cached = [row[0] for row in self._db.execute(
+                "SELECT uidl FROM pop3_messages WHERE account = ?", (account,))]
+            removed = [(account, uidl) for uidl in cached if uidl not in live_uidls]
+            if removed:
+                self._db.executemany("DELETE FROM pop3_messages WHERE account = ? AND uidl = ?", removed)
+                self._db.commit()
+        if removed:
+            log(f"[POP3] Removed {len(removed)} deleted messages from the local cache")
+        return len(removed)
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_pop3_cache(db_path=POP3_CACHE_FILE):
+    """Shared cache for a database file"""
+    with _caches_lock:
+        cache = _caches.get(db_path)
+        if cache is None:
+            cache = POP3MessageCache(db_path)
+            _caches[db_path] = cache
+        return cache
+
+
+def close_pop3_caches():
+    """Close all cache databases (application shutdown)"""
+    with _caches_lock:
+        caches = list(_caches.values())
+        _caches.clear()
+    for cache in caches:
+        cache.close()
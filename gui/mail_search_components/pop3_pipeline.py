@@ -0,0 +1,92 @@
+"""
+POP3 command pipelining (RFC 2449 PIPELINING) for TOP/RETR
+With PIPELINING the next commands are sent before the previous responses arrive, so
+hundreds of TOP commands cost a few round trips instead of one each. Servers without
+the capability get the same commands one at a time.
+"""
+import poplib
+import weakref
+from collections import deque
+from tools.logger import log
+
+
+# Commands sent ahead of the responses read so far
+POP3_PIPELINE_WINDOW = 50
+
+_pipelining_support = weakref.WeakKeyDictionary()
+
+
+def supports_pipelining(pop3):
+    """True when the server lists PIPELINING in CAPA (checked once per connection)"""
+    supported = _pipelining_support.get(pop3)
+    if supported is None:
+        try:
+            supported = 'PIPELINING' in pop3.capa()
+        except (poplib.error_proto, OSError) as e:
+            log(f"[POP3] CAPA not available, commands sent one at a time: {str(e)}")
+            supported = False
+        _pipelining_support[pop3] = supported
+    return supported
+
+
+def pipelined_commands(pop3, commands, window=POP3_PIPELINE_WINDOW):
+    """Send multi-line POP3 commands and yield (command, response lines or None) in order
+
+    Up to `window` commands are outstanding at a time. A -ERR response yields None for that
+    command only. Stopping the iteration early reads the outstanding responses, so the
+    connection stays usable.
+    """
+    if window <= 1 or not supports_pipelining(pop3):
+        for command in commands:
+            pop3._putcmd(command)
+            yield command, _read_response(pop3, command)
+        return
+
+    pending = deque()
+    commands = iter(commands)
+    try:
+        while True:
+            batch = []
+            # Refilled when half of the window has been answered - fewer, larger writes
+            if len(pending) <= window // 2:
+                for command in commands:
+                    batch.append(command)
+                    if len(pending) + len(batch) >= window:
+                        break
+            if batch:
+                pop3.sock.sendall(b''.join(command.encode(pop3.encoding) + poplib.CRLF for command in batch))
+                pending.extend(batch)
+            if not pending:
+                return
+            command = pending.popleft()
+            yield command, _read_response(pop3, command)
+    finally:
+        # Responses of commands already sent must be consumed before the next command
+        try:
+            while pending:
+                _read_response(pop3, pending.popleft())
+        except (poplib.error_proto, OSError) as e:
+            log(f"[POP3] Connection lost while reading pipelined responses: {str(e)}")
+
+
+def _read_response(pop3, command):
+    try:
+        return pop3._getlongresp()[1]
+    except poplib.error_proto as e:
+        # Server -ERR status lines are raised as bytes, connection problems (EOF, line too long) as str
+        if not isinstance(e.args[0], bytes):
+            raise
+        log(f"[POP3] {command} failed: {e.args[0].decode('utf-8', errors='ignore')}")
+        return None
+
+
+def fetch_tops(pop3, message_nums, lines, window=POP3_PIPELINE_WINDOW):
+    """Yield (message number, TOP response lines or None)"""
+    for command, response in pipelined_commands(pop3, (f"TOP {num} {lines}" for num in message_nums), window):
+        yield int(command.split()[1]), response
+
+
+def fetch_messages(pop3, message_nums, window=POP3_PIPELINE_WINDOW):
+    """Yield (message number, RETR response lines or None)"""
+    for command, response in pipelined_commands(pop3, (f"RETR {num}" for num in message_nums), window):
+        yield int(command.split()[1]), response
@@ -8,6 +8,9 @@ import threading
 from .datetime_utils import IMAPDateHandler
 
 
+RESULT_COLUMNS = ("Date", "Account", "Folder", "Sender", "Subject", "Status", "Attachments", "PDFMatch")
+
+
 class ResultsDisplay:
     """Handles display of search results with interactive capabilities"""
     
@@ -18,6 +21,7 @@ class ResultsDisplay:
         self.per_page = 500
         self.total_pages = 0
         self.total_count = 0
+        self.has_more = False  # Search stopped at the shown pages, later ones are filtered on demand
         
         # Create temp directory in the main application folder
         self.temp_dir = os.path.join(os.getcwd(), 'temp')
@@ -38,10 +42,11 @@ class ResultsDisplay:
         self.results_frame.grid_columnconfigure(0, weight=1)
         
         # Treeview with scrollbars - Added Folder column before Sender
-        self.tree = ttk.Treeview(self.results_frame, columns=("Date", "Folder", "Sender", "Subject", "Status", "Attachments", "PDFMatch"), show="headings", height=15)
+        self.tree = ttk.Treeview(self.results_frame, columns=RESULT_COLUMNS, show="headings", height=15)
         
         # Configure column headings and widths
         self.tree.heading("Date", text="Data")
+        self.tree.heading("Account", text="Konto")
         self.tree.heading("Folder", text="Folder")
         self.tree.heading("Sender", text="Nadawca")
         self.tree.heading("Subject", text="Temat")
@@ -50,6 +55,7 @@ class ResultsDisplay:
         self.tree.heading("PDFMatch", text="Znaleziono w PDF")
         
         self.tree.column("Date", width=120, minwidth=100)
+        self.tree.column("Account", width=130, minwidth=100)
         self.tree.column("Folder", width=150, minwidth=120)
         self.tree.column("Sender", width=150, minwidth=130)
         self.tree.column("Subject", width=200, minwidth=150)
@@ -57,6 +63,9 @@ class ResultsDisplay:
         self.tree.column("Attachments", width=80, minwidth=70)
         self.tree.column("PDFMatch", width=150, minwidth=100)
         
+        # Account column is shown only for multi-account searches
+        self._show_account_column(False)
+        
         # Scrollbars
         h_scrollbar = ttk.Scrollbar(self.results_frame, orient=tk.HORIZONTAL, command=self.tree.xview)
         v_scrollbar = ttk.Scrollbar(self.results_frame, orient=tk.VERTICAL, command=self.tree.yview)
@@ -110,51 +119,100 @@ class ResultsDisplay:
         # Initially disable buttons
         self.update_button_states()
     
-    def display_results(self, results, page=0, per_page=500, total_count=0, total_pages=0):
+    def display_results(self, results, page=0, per_page=500, total_count=0, total_pages=0, has_more=False):
         """Display search results in the tree"""
         self.results_data = results
         self.current_page = page
         self.per_page = per_page
         self.total_pages = total_pages
         self.total_count = total_count
+        self.has_more = has_more
         
         # Clear existing items
         for item in self.tree.get_children():
             self.tree.delete(item)
         
+        self._show_account_column(any(result.get('account') for result in results))
+        
         if not results:
             # Insert placeholder item for no results - Updated for new column structure
-            self.tree.insert("", "end", values=("", "", "", "Nie znaleziono wiadomości spełniających kryteria", "", "", ""))
+            self.tree.insert("", "end", values=("", "", "", "", "Nie znaleziono wiadomości spełniających kryteria", "", "", ""))
             self.update_button_states()
             self.update_pagination_display()
             return
         
         # Insert results
-        for i, result in enumerate(results):
-            # Use IMAPDateHandler for consistent date formatting - no split() operations
-            date_str = IMAPDateHandler.format_display_date(result['datetime_received'])
-            folder_path = result.get('folder_path', 'Skrzynka odbiorcza')  # New folder column
-            sender = result['sender'][:35] if len(result['sender']) > 35 else result['sender']
-            subject = result['subject'][:55] if len(result['subject']) > 55 else result['subject']
-            status = "Nieprzeczyt." if not result['is_read'] else "Przeczytane"
-            attachments = f"{result['attachment_count']}" if result['has_attachments'] else "Brak"
-            
-            # PDF match information
-            pdf_match_info = result.get('pdf_match_info')
-            pdf_match_text = ""
-            if pdf_match_info and pdf_match_info.get('found'):
-                pdf_attachments = pdf_match_info.get('attachments', [])
-                if pdf_attachments:
-                    pdf_names = [att['name'] for att in pdf_attachments]
-                    pdf_match_text = f"Tak ({len(pdf_names)} PDF)"
-                else:
-                    pdf_match_text = "Tak"
-            
-            self.tree.insert("", "end", values=(date_str, folder_path, sender, subject, status, attachments, pdf_match_text))
+        for result in results:
+            self.tree.insert("", "end", values=self._format_result_row(result))
         
         self.update_button_states()
         self.update_pagination_display()
     
+    def append_results(self, results):
+        """Append a partial batch of streamed results, keeping rows ordered by date (newest first)"""
+        if not results:
+            return
+        
+        # Remove placeholder/status rows shown before the first real result arrived
+        if not self.results_data:
+            for item in self.tree.get_children():
+                self.tree.delete(item)
+        
+        if any(result.get('account') for result in results):
+            self._show_account_column(True)
+        
+        for result in results:
+            position = self._find_insert_position(result.get('datetime_received'))
+            self.results_data.insert(position, result)
+            self.tree.insert("", position, values=self._format_result_row(result))
+        
+        self.total_count = len(self.results_data)
+        self.count_label.config(text=f"Znaleziono: {self.total_count} wyników (wyszukiwanie trwa...)")
+        self.update_button_states()
+    
+    def _show_account_column(self, show):
+        columns = RESULT_COLUMNS if show else tuple(column for column in RESULT_COLUMNS if column != "Account")
+        self.tree.configure(displaycolumns=columns)
+    
+    def _find_insert_position(self, datetime_received):
+        """Find row index for a streamed result so the tree stays sorted by date descending"""
+        if not datetime_received:
+            return len(self.results_data)
+        
+        try:
+            for index, existing in enumerate(self.results_data):
+                existing_date = existing.get('datetime_received')
+                if existing_date and existing_date < datetime_received:
+                    return index
+        except TypeError:
+            # Mixed naive/aware datetimes - fall back to arrival order
+            pass
+        return len(self.results_data)
+    
+    def _format_result_row(self, result):
+        """Format a single result dictionary as tree row values"""
+        # Use IMAPDateHandler for consistent date formatting - no split() operations
+        date_str = IMAPDateHandler.format_display_date(result['datetime_received'])
+        account = result.get('account', '')  # Set by multi-account search
+        folder_path = result.get('folder_path', 'Skrzynka odbiorcza')  # New folder column
+        sender = result['sender'][:35] if len(result['sender']) > 35 else result['sender']
+        subject = result['subject'][:55] if len(result['subject']) > 55 else result['subject']
+        status = "Nieprzeczyt." if not result['is_read'] else "Przeczytane"
+        attachments = f"{result['attachment_count']}" if result['has_attachments'] else "Brak"
+        
+        # PDF match information
+        pdf_match_info = result.get('pdf_match_info')
+        pdf_match_text = ""
+        if pdf_match_info and pdf_match_info.get('found'):
+            pdf_attachments = pdf_match_info.get('attachments', [])
+            if pdf_attachments:
+                pdf_names = [att['name'] for att in pdf_attachments]
+                pdf_match_text = f"Tak ({len(pdf_names)} PDF)"
+            else:
+                pdf_match_text = "Tak"
+        
+        return (date_str, account, folder_path, sender, subject, status, attachments, pdf_match_text)
+    
     def update_button_states(self):
         """Update button states based on selection and data"""
         selected_items = self.tree.selection()
@@ -171,8 +229,9 @@ class ResultsDisplay:
     
     def update_pagination_display(self):
         """Update pagination display"""
-        self.page_label.config(text=f"Strona {self.current_page + 1} z {max(1, self.total_pages)}")
-        self.count_label.config(text=f"Znaleziono: {self.total_count} wyników")
+        more = "+" if self.has_more else ""
+        self.page_label.config(text=f"Strona {self.current_page + 1} z {max(1, self.total_pages)}{more}")
+        self.count_label.config(text=f"Znaleziono: {self.total_count}{more} wyników")
     
     def get_selected_result(self):
         """Get the selected result data"""
@@ -497,13 +556,14 @@ class ResultsDisplay:
         self.current_page = 0
         self.total_pages = 0
         self.total_count = 0
+        self.has_more = False
         self.update_button_states()
         self.update_pagination_display()
     
     def show_status(self, message):
         """Show status message in results area"""
         self.clear_results()
-        self.tree.insert("", "end", values=("", "", message, "", ""))
+        self.tree.insert("", "end", values=("", "", "", message, "", ""))
         
     def bind_selection_change(self):
         """Bind selection change event"""
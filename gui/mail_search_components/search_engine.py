@@ -3,18 +3,39 @@ Email search engine for mail search functionality
 """
 import threading
 import queue
+import socket
+import poplib
 import os
 import time
 import email
 import email.header
 import email.utils
-import re
+import heapq
+from itertools import islice, repeat
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta, timezone
-from exchangelib import Q, Message
+from exchangelib import Q, Message, FolderCollection
 from imapclient import IMAPClient
 from tools.logger import log
+from tools.cancellation import CancellationToken
 from .pdf_processor import PDFProcessor
 from .datetime_utils import IMAPDateHandler
+from .search_session import SearchSession, SearchSessionStore
+from .folder_cursor import FolderCursor, IdBatchLoader
+from .filter_pipeline import compile_filter_pipeline, is_email_address, STAGE_BODY, STAGE_PDF, STAGE_LABELS
+from .needle_search import NeedleMatcher, build_pdf_search, build_needle_matches
+from .pdf_pipeline import (PDFSearchPipeline, DEFAULT_PDF_DOWNLOAD_WORKERS, DEFAULT_PDF_EXTRACT_WORKERS,
+                           DEFAULT_PDF_OCR_WORKERS)
+from .imap_utils import (AdaptiveBatchSizer, compress_uid_set, estimate_fetch_response_size, attachment_manifest,
+                         mime_attachment_manifest, decode_part_content, decode_header_value, search_newest)
+from .imap_pool import mark_connection_broken
+from .imap_header_cache import header_cache
+from .imap_compression import TransferStats
+from .pop3_cache import get_pop3_cache, parse_uidl_listing, POP3_CACHE_FILE
+from .pop3_pipeline import fetch_tops
+from .exchange_attachments import ExchangeAttachmentPrefetcher, is_pdf_attachment
+from .exchange_folder_tree import folder_display_path
+from .mail_index import MailIndex, MailIndexSyncer, MAIL_INDEX_FILE, DEFAULT_INDEX_MAX_AGE, get_account_key
 
 # Handle optional tkinter import
 try:
@@ -29,6 +50,29 @@ except ImportError:
             log(f"Error: {title} - {message}")
     messagebox = DummyMessagebox()
 
+# Parallel folder search settings (Exchange only - IMAP/POP3 share a single connection)
+DEFAULT_FOLDER_SEARCH_WORKERS = 4
+MAX_FOLDER_SEARCH_WORKERS = 16
+
+# Number of rows collected before a 'search_partial' batch is sent in streaming mode
+STREAM_BATCH_SIZE = 20
+
+# Exchange listing queries only request the fields shown in the results list; full items
+# (body, attachments) are fetched in batches for messages that need them
+EXCHANGE_LISTING_FIELDS = ('subject', 'sender', 'datetime_received', 'is_read', 'has_attachments')
+EXCHANGE_FETCH_BATCH_SIZE = 50
+
+# Recursive Exchange searches query this many folders with one multi-folder FindItem (can be
+# overridden with "exchange_folder_chunk_size", 1 queries every folder separately)
+EXCHANGE_FOLDER_CHUNK_SIZE = 10
+
+# Accounts searched concurrently in multi-account mode (each account uses its own connection)
+MAX_ACCOUNT_SEARCH_WORKERS = 4
+
+# Body lines requested with POP3 TOP when attachment name/extension filters are set - enough
+# for the MIME part headers of typical messages, so attachments are listed without RETR
+POP3_MANIFEST_TOP_LINES = 200
+
 
 class EmailSearchEngine:
     """Handles email search operations in background thread"""
@@ -36,9 +80,10 @@ class EmailSearchEngine:
     def __init__(self, progress_callback, result_callback):
         self.progress_callback = progress_callback
         self.result_callback = result_callback
-        self.search_cancelled = False
         self.search_thread = None
-        self.pdf_processor = PDFProcessor()
+        # Shared by the engine, PDF processor and OCR manager; replaced for every new search
+        self.cancellation_token = CancellationToken()
+        self.pdf_processor = PDFProcessor(self.cancellation_token)
         
         # PDF auto-save support
         self.auto_save_pdfs = False
@@ -48,19 +93,40 @@ class EmailSearchEngine:
         # PDF history manager (will be set by external components)
         self.pdf_history_manager = None
         
+        # Filtered results of the last search, reused for page changes
+        self.search_sessions = SearchSessionStore()
+        
+        # Exchange messages already fetched with all fields by ID (listing uses field projection)
+        self._hydrated_items = {}
+        
+        # Optional local mail index (opened on first use) and its background sync
+        self.mail_index = None
+        self.index_syncer = None
+        self.index_sync_thread = None
+        
+        # Per-account engines of the multi-account search (account index -> EmailSearchEngine)
+        self.account_engines = {}
+        
+        # Exact match counts reported by IMAP SORT/ESEARCH (folder name -> count) for the folder summary
+        self.imap_match_counts = {}
+        
+        # Matches listed beyond the first batch of a folder, newest first - their headers are loaded
+        # by the folder cursor once the merge reaches them (folder name -> (selected folder, UIDs))
+        self.imap_pending_uids = {}
+        self.pop3_pending_messages = []
+        # POP3 session whose message numbers were listed, with its UIDL -> message number map
+        self.pop3_listing = (None, {})
+        
+        # Connection of the running search, used by folder cursors loading further batches
+        self.search_connection = None
+        
         # Cache valid Message field names for validation
         self._valid_fields = self._get_valid_message_fields()
         log(f"Zainicjalizowano wyszukiwarkę z {len(self._valid_fields)} dostępnymi polami Message")
     
     def _is_email_address(self, text):
         """Check if text looks like a complete email address"""
-        if not text or not isinstance(text, str):
-            return False
-        
-        text = text.strip()
-        # Simple but effective email pattern
-        email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        return re.match(email_pattern, text) is not None
+        return is_email_address(text)
     
     def _get_valid_message_fields(self):
         """Get set of valid field names from exchangelib Message class"""
@@ -143,13 +209,178 @@ class EmailSearchEngine:
         )
         self.search_thread.start()
     
+    def search_all_accounts_threaded(self, search_criteria, page=0, per_page=500, account_indexes=None,
+                                     connection_factory=None):
+        """Start threaded search across several configured accounts
+        
+        Args:
+            account_indexes: Indexes of accounts to search (None = all configured accounts)
+            connection_factory: Callable(account_index) -> connection bound to that account
+                (defaults to MailConnection(account_index))
+        """
+        self.search_cancelled = False
+        
+        self.search_thread = threading.Thread(
+            target=self._threaded_multi_account_search,
+            args=(search_criteria, page, per_page, account_indexes, connection_factory),
+            daemon=True
+        )
+        self.search_thread.start()
+    
+    def reset_search_session(self):
+        """Forget cached results so the next search queries the server again"""
+        self.search_sessions.reset()
+        for account_engine in list(self.account_engines.values()):
+            account_engine.reset_search_session()
+    
+    @property
+    def search_cancelled(self):
+        return self.cancellation_token.cancelled
+    
+    @search_cancelled.setter
+    def search_cancelled(self, cancelled):
+        if cancelled:
+            self.cancellation_token.cancel()
+        else:
+            # New search - fresh token so an earlier cancel does not leak into it
+            self.cancellation_token = CancellationToken()
+            self.pdf_processor.cancellation_token = self.cancellation_token
+    
     def cancel_search(self):
         """Cancel ongoing search"""
         self.search_cancelled = True
-        self.pdf_processor.cancel_search()
+        for account_engine in list(self.account_engines.values()):
+            account_engine.cancel_search()
+    
+    def _threaded_multi_account_search(self, criteria, page, per_page, account_indexes, connection_factory):
+        """Search several accounts in parallel and merge their results by date
+        
+        Every account is searched by its own EmailSearchEngine with its own connection, so a
+        failing account does not abort the others. Each account returns its first page + 1
+        pages of results which are merged newest first and sliced to the page. The account
+        searches keep the base per_page, so page changes are served from their cached sessions.
+        """
+        try:
+            if connection_factory is None:
+                from gui.mail_search_components.mail_connection import MailConnection
+                connection_factory = MailConnection
+            
+            account_configs = connection_factory(None).get_account_configs()
+            if account_indexes is None:
+                account_indexes = list(range(len(account_configs)))
+            account_indexes = [index for index in account_indexes if 0 <= index < len(account_configs)]
+            if not account_indexes:
+                self.result_callback({'type': 'search_error', 'error': 'Brak skonfigurowanych kont poczty'})
+                return
+            
+            log(f"=== WYSZUKIWANIE NA WIELU KONTACH ({len(account_indexes)}) ===")
+            start_idx = page * per_page
+            end_idx = start_idx + per_page
+            stream_results = criteria.get('stream_results', False) and page == 0
+            
+            # Engines are prepared before any account is queued: a worker waiting for a free slot must not
+            # clear a cancellation requested in the meantime
+            for index in account_indexes:
+                account_engine = self.account_engines.get(index)
+                if account_engine is None:
+                    account_engine = EmailSearchEngine(lambda message: None, None)
+                    self.account_engines[index] = account_engine
+                account_engine.search_cancelled = False
+            
+            def search_account(index):
+                account_name = account_configs[index].get('name') or account_configs[index].get('email') or f"Konto {index + 1}"
+                outcome = {}
+                if self.search_cancelled:
+                    return account_name, {'type': 'search_cancelled'}
+                
+                def on_result(result):
+                    if result['type'] == 'search_partial':
+                        if stream_results:
+                            self._emit_partial_results([dict(row, account=account_name) for row in result['results']])
+                    else:
+                        outcome.update(result)
+                
+                account_engine = self.account_engines[index]
+                account_engine.progress_callback = lambda message: self.progress_callback(f"[{account_name}] {message}")
+                account_engine.result_callback = on_result
+                account_engine.pdf_history_manager = self.pdf_history_manager
+                
+                connection = None
+                try:
+                    connection = connection_factory(index)
+                    account_engine._threaded_search(connection, dict(criteria, stream_results=stream_results), 0,
+                                                    per_page, pages=page + 1)
+                except Exception as e:
+                    outcome = {'type': 'search_error', 'error': str(e)}
+                finally:
+                    # Release the pooled IMAP session / POP3 maildrop of this account for later searches
+                    if connection is not None:
+                        try:
+                            connection.close_connections()
+                        except Exception as e:
+                            log(f"Błąd zamykania połączenia konta '{account_name}': {str(e)}")
+                return account_name, outcome
+            
+            account_results = []
+            account_errors = {}
+            has_more = False
+            with ThreadPoolExecutor(max_workers=min(MAX_ACCOUNT_SEARCH_WORKERS, len(account_indexes))) as executor:
+                for future in as_completed([executor.submit(search_account, index) for index in account_indexes]):
+                    account_name, outcome = future.result()
+                    if outcome.get('type') == 'search_complete':
+                        rows = [dict(row, account=account_name) for row in outcome['results']]
+                        account_results.append((rows, outcome.get('total_count', len(rows))))
+                        has_more = has_more or outcome.get('has_more', False)
+                        log(f"Konto '{account_name}': {outcome.get('total_count', len(rows))} wiadomości")
+                    elif outcome.get('type') == 'search_cancelled' or self.search_cancelled:
+                        log(f"Konto '{account_name}': wyszukiwanie anulowane")
+                    else:
+                        account_errors[account_name] = outcome.get('error', 'Nieznany błąd')
+                        log(f"BŁĄD wyszukiwania na koncie '{account_name}': {account_errors[account_name]}")
+            
+            if self.search_cancelled:
+                self.result_callback({'type': 'search_cancelled'})
+                return
+            
+            if not account_results and account_errors:
+                self.result_callback({'type': 'search_error', 'error': "; ".join(
+                    f"{name}: {error}" for name, error in account_errors.items())})
+                return
+            
+            # Every account list is already newest first - merge and cut out the requested page
+            merged = heapq.merge(*[rows for rows, _ in account_results], key=self._row_sort_key, reverse=True)
+            results = list(islice(merged, start_idx, end_idx))
+            total_count = sum(count for _, count in account_results)
+            
+            if account_errors:
+                self.progress_callback(f"Nie udało się przeszukać kont: {', '.join(account_errors)}")
+            log(f"Wyniki z {len(account_results)} kont: {total_count} wiadomości, na stronie: {len(results)}")
+            
+            self.result_callback({
+                'type': 'search_complete',
+                'results': results,
+                'count': len(results),
+                'total_count': total_count,
+                'page': page,
+                'per_page': per_page,
+                'total_pages': (total_count + per_page - 1) // per_page,
+                'has_more': has_more,
+                'account_errors': account_errors
+            })
+            
+        except Exception as e:
+            log(f"BŁĄD KRYTYCZNY wyszukiwania na wielu kontach: {str(e)}")
+            self.result_callback({
+                'type': 'search_error',
+                'error': str(e)
+            })
     
-    def _threaded_search(self, connection, criteria, page=0, per_page=500):
-        """Main search logic running in background thread"""
+    def _threaded_search(self, connection, criteria, page=0, per_page=500, pages=1):
+        """Main search logic running in background thread
+        
+        pages > 1 returns that many consecutive pages in one result (multi-account merge); the search
+        window and the cached session still depend on per_page only.
+        """
         try:
             # Log search start
             search_params = {k: v for k, v in criteria.items() if k != 'password'}  # Exclude sensitive data
@@ -157,11 +388,32 @@ class EmailSearchEngine:
             log(f"Parametry wyszukiwania: {search_params}")
             log(f"Paginacja: strona {page}, na stronie {per_page}")
             
-            # Get account for folder operations and determine account type
+            # Get account for folder operations and determine account type (this also loads the
+            # account configuration the session signature and the index key are built from)
             account = connection.get_main_account()
             if not account:
                 log("BŁĄD: Nie można nawiązać połączenia z serwerem poczty")
                 raise Exception("Nie można nawiązać połączenia z serwerem poczty")
+            self.search_connection = connection
+            
+            # Serve page changes from the cached session of the same search
+            session_signature = SearchSession.build_signature(connection.current_account_config, criteria)
+            session = self.search_sessions.get(session_signature, self._get_max_total_messages(per_page))
+            if session:
+                self._emit_page_from_session(session, connection, account, page, per_page, pages)
+                return
+            
+            # Answer from the local mail index when it is fresh, otherwise search live
+            if criteria.get('use_index') and self._search_from_index(connection, account, criteria, session_signature,
+                                                                     page, per_page, pages):
+                return
+            self._hydrated_items = {}
+            self.imap_pending_uids = {}
+            self.pop3_pending_messages = []
+            
+            # Transfer counters of the IMAP sessions, to report the COMPRESS=DEFLATE saving of this search
+            imap_pool = getattr(connection, 'imap_pool', None)
+            transfer_before = imap_pool.transfer_stats.snapshot() if imap_pool is not None else None
             
             # Determine account type for universal handling
             account_type = "unknown"
@@ -307,7 +559,9 @@ class EmailSearchEngine:
                     else:
                         invalid_field_warnings.append(f"  └── Pola rozpoczynające się od '_' nie powinny być używane w filtrach wiadomości.")
                 elif key in ['folder_path', 'excluded_folders', 'subject_search', 'pdf_search_text', 'sender', 'unread_only', 'attachments_required', 
-                           'attachment_name', 'attachment_extension', 'selected_period']:
+                           'attachment_name', 'attachment_extension', 'selected_period', 'folder_search_workers', 'stream_results',
+                           'use_index', 'index_pdf_text', 'pdf_download_workers', 'pdf_extract_workers', 'pdf_ocr_workers',
+                           'pdf_search_needles', 'pdf_needles_file']:
                     # These are valid UI/search criteria (not Message fields)
                     valid_field_count += 1
                 elif key in self._valid_fields:
@@ -361,120 +615,117 @@ class EmailSearchEngine:
                 combined_query = None
                 log("Brak prawidłowych filtrów - pobieranie wszystkich wiadomości")
             
+            # Local filters are compiled once and evaluated cheapest first
+            filter_pipeline = compile_filter_pipeline(criteria, self, account_type)
+            log(f"Etapy lokalnego filtrowania: {', '.join(STAGE_LABELS[stage.name] for stage in filter_pipeline.stages) or 'brak'}")
+            
             # Search across all folders
             log("=== PRZESZUKIWANIE FOLDERÓW ===")
-            all_messages = []
             folder_results = {}  # Track results per folder
             message_to_folder_map = {}  # Map message IDs to their folder paths (avoid modifying message objects)
             
-            for idx, search_folder in enumerate(folders_to_search):
-                if self.search_cancelled:
-                    log("Wyszukiwanie anulowane przez użytkownika")
-                    self.result_callback({'type': 'search_cancelled'})
-                    return
-                
-                folder_name = self._get_safe_folder_name(search_folder)
-                log(f"--- Folder {idx + 1}/{len(folders_to_search)}: '{folder_name}' ---")
+            # Streaming: rows are sent as 'search_partial' batches before the final 'search_complete'.
+            # Folder-level batches are only possible when no per-message attachment/PDF checks are needed
+            # and the first page is requested (later pages need the full date-ordered merge).
+            stream_results = criteria.get('stream_results', False)
+            stream_from_folders = stream_results and page == 0 and not self._needs_message_content_filters(criteria)
+            streamed_count = 0
+            if stream_results:
+                log(f"Tryb strumieniowy wyników: {'po folderach' if stream_from_folders else 'po filtrowaniu wiadomości'}")
+            
+            # Exchange folders are grouped into chunks queried with one FindItem each, other folders go alone
+            folder_groups = self._plan_folder_queries(folders_to_search, account_type, criteria)
+            if len(folder_groups) < len(folders_to_search):
+                log(f"Zapytania wielofolderowe: {len(folders_to_search)} folderów w {len(folder_groups)} zapytaniach")
+            folder_workers = self._get_folder_worker_count(criteria, account_type, len(folder_groups),
+                                                           getattr(connection, 'imap_pool', None))
+            if folder_workers > 1:
+                log(f"Równoległe przeszukiwanie folderów: {folder_workers} wątków")
+                # exchangelib keeps one HTTP session per Account by default, which would serialize the workers
+                protocol = getattr(account, 'protocol', None)
+                if protocol is not None and getattr(protocol, 'max_connections', 0) < folder_workers:
+                    protocol.max_connections = folder_workers
+            
+            # Calculate pagination
+            start_idx = page * per_page
+            end_idx = start_idx + per_page * pages
+            log(f"Paginacja: indeksy {start_idx}-{end_idx}")
+            
+            # Limit total messages for performance (use multiple of per_page to allow proper pagination)
+            max_total_messages = self._get_max_total_messages(per_page)
+            
+            # Each folder query returns only enough of its newest messages for the requested pages (one extra
+            # shows whether there is more); older ones, up to the search window, are loaded in batches of the
+            # same size by the folder cursors when the merge reaches them
+            folder_limit = max_total_messages
+            folder_batch = min(end_idx + 1, folder_limit)
+            per_folder_messages = [[] for _ in folders_to_search]
+            streams_by_group = {}
+            executor = ThreadPoolExecutor(max_workers=folder_workers, thread_name_prefix="folder-search")
+            try:
+                future_to_group = {
+                    executor.submit(self._search_folder_group, group, folders_to_search, account, connection,
+                                    account_type, combined_query, criteria, folder_limit, folder_batch): group
+                    for group in folder_groups
+                }
                 
-                try:
-                    self.progress_callback(f"Przeszukiwanie folderu {idx + 1}/{len(folders_to_search)}: {folder_name}")
+                completed_folders = 0
+                for future in as_completed(future_to_group):
+                    if self.search_cancelled:
+                        log("Wyszukiwanie anulowane przez użytkownika")
+                        executor.shutdown(wait=False, cancel_futures=True)
+                        self.result_callback({'type': 'search_cancelled'})
+                        return
                     
-                    # Strategy varies by account type
-                    messages_list = []
-                    query_success = False
+                    try:
+                        group_results, group_streams = future.result()
+                    except Exception as e:
+                        group_results = [(idx, [], {'error': str(e)}) for idx in future_to_group[future]]
+                        group_streams = []
+                    # Keyed by the first folder of the group, so messages with equal dates keep the folder order
+                    streams_by_group[future_to_group[future][0]] = group_streams
                     
-                    if account_type == "exchange" and hasattr(search_folder, 'filter'):
-                        # Exchange-specific folder operations
-                        if combined_query:
-                            try:
-                                log(f"Próba zapytania z filtrami dla folderu '{folder_name}'")
-                                messages = search_folder.filter(combined_query).order_by('-datetime_received')
-                                messages_list = list(messages)
-                                query_success = True
-                                log(f"Zapytanie z filtrami: znaleziono {len(messages_list)} wiadomości")
-                            except Exception as query_error:
-                                log(f"BŁĄD zapytania z filtrami: {str(query_error)}")
-                                # Query failed, fallback to getting all messages and filtering manually
-                                try:
-                                    log(f"Fallback: pobieranie wszystkich wiadomości z folderu '{folder_name}'")
-                                    messages = search_folder.all().order_by('-datetime_received')
-                                    messages_list = list(messages)
-                                    log(f"Fallback: pobrano {len(messages_list)} wszystkich wiadomości")
-                                except Exception as fallback_error:
-                                    log(f"BŁĄD fallback: {str(fallback_error)}")
-                        else:
-                            try:
-                                log(f"Pobieranie wszystkich wiadomości z folderu '{folder_name}' (brak filtrów)")
-                                messages = search_folder.all().order_by('-datetime_received')
-                                messages_list = list(messages)
-                                log(f"Pobrano {len(messages_list)} wszystkich wiadomości")
-                            except Exception as all_error:
-                                log(f"BŁĄD pobierania wszystkich: {str(all_error)}")
+                    for idx, folder_messages, folder_result in group_results:
+                        folder_name = self._get_safe_folder_name(folders_to_search[idx])
+                        completed_folders += 1
                         
-                        # If we still have no messages, try alternative QuerySet conversion
-                        if not messages_list:
-                            log(f"Brak wiadomości - próba alternatywnej metody konwersji")
-                            try:
-                                if combined_query:
-                                    messages = search_folder.filter(combined_query)
-                                else:
-                                    messages = search_folder.all()
-                                
-                                # Use normal iteration instead of .iterator()
-                                messages_list = [msg for msg in messages][:per_page]  # Limit during iteration
-                                log(f"Alternatywna metoda: znaleziono {len(messages_list)} wiadomości (limit {per_page})")
-                            except Exception as iteration_error:
-                                log(f"BŁĄD alternatywnej metody: {str(iteration_error)}")
-                                pass  # Continue with empty list
-                    
-                    else:
-                        # IMAP/POP3 implementation using IMAPClient
-                        log(f"Non-Exchange account type '{account_type}': Using IMAPClient message retrieval for folder '{folder_name}'")
-                        messages_list = self._get_imap_messages(search_folder, connection, combined_query, criteria, account_type, per_page)
-                        log(f"IMAP/POP3 retrieval completed: found {len(messages_list)} messages")
-                    
-                    # Apply per-folder limit
-                    original_count = len(messages_list)
-                    folder_messages = messages_list[:per_page]  # Limit per folder after converting to list
-                    if original_count > per_page:
-                        log(f"Ograniczono z {original_count} do {len(folder_messages)} wiadomości (limit na folder: {per_page})")
-                    
-                    log(f"Folder '{folder_name}' - szczegóły wiadomości:")
-                    log(f"  - Znalezione wiadomości: {original_count}")
-                    log(f"  - Po limicie folderu: {len(folder_messages)}")
-                    log(f"  - Strategia pobierania: {'z filtrami' if query_success else 'wszystkie (fallback)'}")
-                    
-                    # Map each message to its folder path (DO NOT modify message objects)
-                    # This avoids adding non-standard fields like _folder_reference to Message objects
-                    folder_path_for_display = self._get_folder_path(search_folder)
-                    for message in folder_messages:
-                        # Use message ID or object reference as key to map to folder path
-                        message_key = getattr(message, 'id', id(message))
-                        message_to_folder_map[message_key] = folder_path_for_display
-                    
-                    all_messages.extend(folder_messages)
-                    
-                    # Store folder results for summary
-                    folder_results[folder_name] = {
-                        'original_count': original_count,
-                        'limited_count': len(folder_messages),
-                        'query_success': query_success
-                    }
-                    
-                    log(f"Folder '{folder_name}': {len(folder_messages)} wiadomości dodano do wyników")
-                    
-                except Exception as e:
-                    # Log the error but continue with other folders
-                    error_msg = f"Błąd w folderze {folder_name}: {str(e)}"
-                    log(f"BŁĄD FOLDERU '{folder_name}': {str(e)}")
-                    folder_results[folder_name] = {'error': str(e)}
-                    self.progress_callback(error_msg)
-                    continue
+                        if 'error' in folder_result:
+                            # Log the error but continue with other folders
+                            error_msg = f"Błąd w folderze {folder_name}: {folder_result['error']}"
+                            log(f"BŁĄD FOLDERU '{folder_name}': {folder_result['error']}")
+                            folder_results[folder_name] = folder_result
+                            self.progress_callback(error_msg)
+                            continue
+                        
+                        per_folder_messages[idx] = folder_messages
+                        folder_results[folder_name] = folder_result
+                        self.progress_callback(f"Przeszukano folder {completed_folders}/{len(folders_to_search)}: {folder_name}")
+                        
+                        if stream_from_folders and streamed_count < per_page:
+                            folder_path_for_display = self._get_folder_path(folders_to_search[idx])
+                            batch = []
+                            for message in folder_messages:
+                                if streamed_count + len(batch) >= per_page:
+                                    break
+                                try:
+                                    if filter_pipeline.prefilter(message, STAGE_BODY):
+                                        batch.append(self._build_result_info(message, folder_path_for_display))
+                                except Exception as e:
+                                    log(f"Błąd przygotowania wyniku częściowego: {str(e)}")
+                            if batch:
+                                if account_type == "exchange":
+                                    # Rows need attachment details that the projected listing does not carry
+                                    batch = self._hydrate_result_rows(account, batch)
+                                streamed_count += len(batch)
+                                self._emit_partial_results(batch, folder_name)
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
             
             # Log folder search summary
             log("=== PODSUMOWANIE PRZESZUKIWANIA FOLDERÓW ===")
-            total_messages_found = len(all_messages)
-            log(f"Łącznie znaleziono {total_messages_found} wiadomości ze wszystkich folderów")
+            total_messages_found = sum(len(folder_messages) for folder_messages in per_folder_messages)
+            log(f"Łącznie pobrano {total_messages_found} najnowszych wiadomości ze wszystkich folderów "
+                f"(kolejne wczytywane w paczkach po {folder_batch} w miarę potrzeby)")
             
             for folder_name, result in folder_results.items():
                 if 'error' in result:
@@ -486,34 +737,22 @@ class EmailSearchEngine:
                     else:
                         log(f"  {folder_name}: {result['limited_count']} wiadomości ({status})")
             
-            # Sort all messages by date
-            all_messages.sort(key=lambda m: m.datetime_received if m.datetime_received else datetime.min.replace(tzinfo=timezone.utc), reverse=True)
-            
             log("=== PRZETWARZANIE I FILTROWANIE WIADOMOŚCI ===")
             self.progress_callback("Przetwarzanie wiadomości...")
             
-            # Calculate pagination
-            start_idx = page * per_page
-            end_idx = start_idx + per_page
-            log(f"Paginacja: indeksy {start_idx}-{end_idx}")
-            
-            # Limit total messages for performance (use multiple of per_page to allow proper pagination)
-            max_total_messages = max(per_page * 10, 1000)  # At least 10 pages worth, minimum 1000
-            original_total = len(all_messages)
-            total_messages = all_messages[:max_total_messages]
-            total_count = len(total_messages)
-            
-            if original_total > max_total_messages:
-                log(f"Ograniczono wiadomości z {original_total} do {total_count} (limit wydajności: {max_total_messages})")
-            else:
-                log(f"Przetwarzanie {total_count} wiadomości (bez ograniczeń)")
+            # k-way merge of the lazy folder streams - it is only read as far as the requested pages need
+            # (at most max_total_messages), so messages beyond that are never loaded, copied or sorted
+            folder_streams = [stream for key in sorted(streams_by_group) for stream in streams_by_group[key]]
+            merged_messages = self._merge_folder_messages(folder_streams, max_total_messages)
             
             # Filter by attachment criteria if needed  
             filtered_messages = []
             subject_search = criteria.get('subject_search', '').lower() if criteria.get('subject_search') else None
-            pdf_search_text = criteria.get('pdf_search_text', '').strip() if criteria.get('pdf_search_text') else None
+            # Plain text or NeedleMatcher (many invoice numbers matched in one pass over each PDF)
+            pdf_search_text = build_pdf_search(criteria)
             has_attachment_filter = criteria.get('attachments_required') or criteria.get('no_attachments_only') or criteria.get('attachment_name') or criteria.get('attachment_extension')
-            has_pdf_search = pdf_search_text is not None and len(pdf_search_text) > 0
+            has_pdf_search = bool(pdf_search_text)
+            needle_matcher = pdf_search_text if isinstance(pdf_search_text, NeedleMatcher) else None
             
             # Setup PDF auto-save if PDF search is enabled
             if has_pdf_search:
@@ -534,10 +773,9 @@ class EmailSearchEngine:
                 self.auto_save_pdfs = False
                 
             log("=== ETAPY FILTROWANIA ===")
-            log(f"Wiadomości przed filtrowaniem: {len(total_messages)}")
             log(f"Kryteria filtrowania:")
             log(f"  - Filtr tematu: {'TAK (' + subject_search + ')' if subject_search else 'NIE'}")
-            log(f"  - Wyszukiwanie w PDF: {'TAK (' + pdf_search_text + ')' if has_pdf_search else 'NIE'}")
+            log(f"  - Wyszukiwanie w PDF: {f'TAK ({pdf_search_text})' if has_pdf_search else 'NIE'}")
             log(f"  - Automatyczny zapis PDFów: {'TAK' if self.auto_save_pdfs else 'NIE'}")
             log(f"  - Filtry załączników: {'TAK' if has_attachment_filter else 'NIE'}")
             if has_attachment_filter:
@@ -555,114 +793,161 @@ class EmailSearchEngine:
                     log(f"  ⚠️  OSTRZEŻENIE: Wybrano jednocześnie 'Tylko z załącznikami' i 'Tylko bez załączników'")
                     log(f"    Zostanie zastosowany filtr 'Tylko z załącznikami' (ma wyższy priorytet)")
             
-            # Track filtering statistics
-            subject_filtered_out = 0
-            attachment_filtered_out = 0
-            pdf_search_filtered_out = 0
-            processing_errors = 0
+            # Listing used field projection - fetch full items only for candidates of the attachment/PDF checks
+            hydrate_candidates = account_type == "exchange" and bool(
+                criteria.get('attachment_name') or criteria.get('attachment_extension') or has_pdf_search)
+            
+            # With a PDF search the cheap stages run first, PDF candidates then go through the pipelined PDF stage
+            stop_before = STAGE_PDF if has_pdf_search else None
             
-            for message in total_messages:
+            def filter_more(needed, on_pass, consumed=None):
+                """Filter merged messages until `needed` passed (None: the whole window)
+                
+                Calls on_pass(message, folder_path, pdf_match_info) for each passing message and returns
+                False once the window is consumed. The search session keeps this function, so a later
+                page continues filtering where this search stopped.
+                """
+                passed_count = 0
+                while needed is None or passed_count < needed:
+                    if self.search_cancelled:
+                        return True
+                    chunk_size = max(needed - passed_count, STREAM_BATCH_SIZE) if needed else EXCHANGE_FETCH_BATCH_SIZE
+                    chunk = list(islice(merged_messages, chunk_size))
+                    if not chunk:
+                        return False
+                    
+                    if hydrate_candidates:
+                        try:
+                            candidates = [m for m, _ in chunk if m.has_attachments and filter_pipeline.prefilter(m, STAGE_BODY)]
+                            log(f"Pobieranie pełnych danych {len(candidates)} z {len(chunk)} wiadomości (załączniki/PDF)")
+                            hydrated_by_id = {m.id: m for m in self._hydrate_exchange_messages(account, candidates)}
+                            chunk = [(hydrated_by_id.get(getattr(m, 'id', None), m), path) for m, path in chunk]
+                        except Exception as e:
+                            log(f"BŁĄD przygotowania wiadomości do filtrów załączników: {str(e)}")
+                    
+                    for message, folder_path_for_display in chunk:
+                        if consumed is not None:
+                            consumed.append((message, folder_path_for_display))
+                        try:
+                            # Header, metadata, body, attachment (and PDF without pipelining) stages in order of cost
+                            passed, stage_outputs = filter_pipeline.evaluate(message, stop_before)
+                            if not passed:
+                                continue
+                            passed_count += 1
+                            on_pass(message, folder_path_for_display, stage_outputs.get('pdf'))
+                        except Exception as filter_error:
+                            # Skip messages that cause errors
+                            filter_pipeline.errors += 1
+                            log(f"Błąd przetwarzania wiadomości: {str(filter_error)}")
+                return True
+            
+            pending_partial = []
+            
+            def accept_message(message, pdf_match_info):
+                filtered_messages.append(message)
+                
+                # Store PDF match info if found (for later use in results)
+                if pdf_match_info:
+                    # Use message ID or object reference as key to store PDF match info
+                    message_key = getattr(message, 'id', id(message))
+                    if not hasattr(self, '_pdf_matches'):
+                        self._pdf_matches = {}
+                    self._pdf_matches[message_key] = pdf_match_info
+                
+                # Stream rows of the requested page as soon as they pass all filters
+                if stream_results and not stream_from_folders and start_idx < len(filtered_messages) <= end_idx:
+                    message_key = getattr(message, 'id', id(message))
+                    pending_partial.append(self._build_result_info(
+                        message, message_to_folder_map.get(message_key, 'Skrzynka odbiorcza'), pdf_match_info
+                    ))
+                    # PDF matches are expensive to find, so show each one immediately
+                    if has_pdf_search or len(pending_partial) >= STREAM_BATCH_SIZE:
+                        self._emit_partial_results(pending_partial)
+                        pending_partial.clear()
+            
+            pdf_candidates = []
+            
+            def on_pass(message, folder_path_for_display, pdf_match_info):
+                # Map each message to its folder path (DO NOT modify message objects)
+                # This avoids adding non-standard fields like _folder_reference to Message objects
+                message_to_folder_map[getattr(message, 'id', id(message))] = folder_path_for_display
+                if has_pdf_search:
+                    pdf_candidates.append(message)
+                else:
+                    accept_message(message, pdf_match_info)
+            
+            # Without a PDF search filtering stops once the requested pages are full (one more result shows
+            # that a next page exists); PDF searches scan the whole window through the PDF pipeline
+            needed = None if has_pdf_search else end_idx + 1
+            # The subject fallback below needs the messages read so far
+            consumed_messages = [] if subject_search else None
+            more_available = filter_more(needed, on_pass, consumed_messages)
+            if self.search_cancelled:
+                log("Filtrowanie anulowane przez użytkownika")
+                self.result_callback({'type': 'search_cancelled'})
+                return
+            if more_available:
+                log(f"Zebrano wyniki dla stron do {end_idx} - kolejne wiadomości będą filtrowane przy zmianie strony")
+            
+            if has_pdf_search and pdf_candidates:
+                skip_searched_pdfs = criteria.get('skip_searched_pdfs', False)
+                pdf_pipeline = self._create_pdf_pipeline(criteria, account_type, pdf_search_text, skip_searched_pdfs)
+                log(f"Przeszukiwanie PDF w {len(pdf_candidates)} wiadomościach (pobieranie: {pdf_pipeline.download_workers}, "
+                    f"tekst: {pdf_pipeline.extract_workers}, OCR: {pdf_pipeline.ocr_workers} wątków)")
+                pipeline_started = time.perf_counter()
+                
+                # Exchange PDF attachments are downloaded with batched GetAttachment calls ahead of the pipeline
+                prefetcher = None
+                pdf_messages = pdf_candidates
+                if account_type == "exchange" and account is not None:
+                    prefetcher = ExchangeAttachmentPrefetcher(account, criteria.get('exchange_attachment_batch_size'),
+                                                              is_cancelled=lambda: self.search_cancelled)
+                    pdf_messages = prefetcher.iter_prefetched(pdf_candidates)
+                
+                # Jobs come back in date order, so results are reported in the same order as before
+                for job in pdf_pipeline.run(pdf_messages):
+                    try:
+                        pdf_match_info = self._finish_pdf_check(job.message, pdf_search_text, job.searched, job.skipped)
+                        found = pdf_match_info['found'] and not job.error
+                        filter_pipeline.record(STAGE_PDF, found, 0.0)
+                        if found:
+                            accept_message(job.message, pdf_match_info)
+                    except Exception as filter_error:
+                        filter_pipeline.errors += 1
+                        log(f"Błąd przetwarzania wiadomości: {str(filter_error)}")
+                
+                # Stage time is wall-clock time of the whole pipeline (stages overlap)
+                filter_pipeline.record_time(STAGE_PDF, time.perf_counter() - pipeline_started)
+                if prefetcher is not None:
+                    log(f"Pobrano {prefetcher.stats['attachments']} załączników PDF w {prefetcher.stats['calls']} "
+                        f"wywołaniach GetAttachment (ErrorServerBusy: {prefetcher.stats['busy']})")
+                
                 if self.search_cancelled:
                     log("Filtrowanie anulowane przez użytkownika")
                     self.result_callback({'type': 'search_cancelled'})
                     return
-                
-                try:
-                    # Manual subject filtering (case-insensitive) - this acts as backup when query filtering didn't work properly
-                    if subject_search:
-                        message_subject = (message.subject or '').lower()
-                        if subject_search not in message_subject:
-                            subject_filtered_out += 1
-                            continue
-                    
-                    # Manual sender filtering for fragments (case-insensitive)
-                    if criteria.get('sender'):
-                        sender_value = criteria['sender']
-                        if not self._is_email_address(sender_value):
-                            # This is a fragment, do local filtering
-                            sender_fragment = sender_value.lower()
-                            message_sender_matches = False
-                            
-                            # Check sender display name/email
-                            if message.sender:
-                                # For Exchange messages
-                                if hasattr(message.sender, 'email_address') and message.sender.email_address:
-                                    sender_email = message.sender.email_address.lower()
-                                    if sender_fragment in sender_email:
-                                        message_sender_matches = True
-                                
-                                # Check sender name if available
-                                if hasattr(message.sender, 'name') and message.sender.name:
-                                    sender_name = message.sender.name.lower()
-                                    if sender_fragment in sender_name:
-                                        message_sender_matches = True
-                                
-                                # For IMAP messages or fallback
-                                sender_str = str(message.sender).lower()
-                                if sender_fragment in sender_str:
-                                    message_sender_matches = True
-                            
-                            if not message_sender_matches:
-                                subject_filtered_out += 1  # Use same counter for simplicity
-                                continue
-                    
-                    # Check attachment filters if needed
-                    if has_attachment_filter:
-                        if not self._check_attachment_filters(message, criteria):
-                            attachment_filtered_out += 1
-                            continue
-                    
-                    # Check PDF content search if needed
-                    pdf_match_info = None
-                    if has_pdf_search:
-                        skip_searched_pdfs = criteria.get('skip_searched_pdfs', False)
-                        pdf_match_result = self._check_pdf_content(message, pdf_search_text, skip_searched_pdfs)
-                        if not pdf_match_result['found']:
-                            pdf_search_filtered_out += 1
-                            continue
-                        else:
-                            pdf_match_info = pdf_match_result  # Store for results display
-                            
-                    filtered_messages.append(message)
-                    
-                    # Store PDF match info if found (for later use in results)
-                    if pdf_match_info:
-                        # Use message ID or object reference as key to store PDF match info
-                        message_key = getattr(message, 'id', id(message))
-                        if not hasattr(self, '_pdf_matches'):
-                            self._pdf_matches = {}
-                        self._pdf_matches[message_key] = pdf_match_info
-                    
-                except Exception as filter_error:
-                    # Skip messages that cause errors
-                    processing_errors += 1
-                    log(f"Błąd przetwarzania wiadomości: {str(filter_error)}")
-                    continue
+            
+            if pending_partial:
+                self._emit_partial_results(pending_partial)
             
             # Log filtering results
             log(f"Wyniki filtrowania:")
             log(f"  - Wiadomości po filtrach: {len(filtered_messages)}")
-            if subject_search:
-                log(f"  - Odrzucone przez filtr tematu: {subject_filtered_out}")
-            if has_attachment_filter:
-                log(f"  - Odrzucone przez filtry załączników: {attachment_filtered_out}")
-            if has_pdf_search:
-                log(f"  - Odrzucone przez wyszukiwanie w PDF: {pdf_search_filtered_out}")
-            if processing_errors > 0:
-                log(f"  - Błędy przetwarzania: {processing_errors}")
+            filter_pipeline.log_statistics()
             
             # FALLBACK: If filtering returned 0 results and we have a subject search, 
             # fetch all messages and filter manually by subject
-            if len(filtered_messages) == 0 and subject_search and len(total_messages) > 0:
+            if len(filtered_messages) == 0 and subject_search and consumed_messages:
                 log("=== FALLBACK: RĘCZNE FILTROWANIE PO TEMACIE ===")
-                log(f"Filtracja zwróciła 0 wyników, próba ręcznego filtrowania {len(total_messages)} wiadomości po temacie: '{criteria['subject_search']}'")
+                log(f"Filtracja zwróciła 0 wyników, próba ręcznego filtrowania {len(consumed_messages)} wiadomości po temacie: '{criteria['subject_search']}'")
                 
                 fallback_messages = []
-                for message in total_messages:
+                for message, folder_path_for_display in consumed_messages:
                     try:
                         message_subject = (message.subject or '').lower()
                         if subject_search in message_subject:
                             fallback_messages.append(message)
+                            message_to_folder_map[getattr(message, 'id', id(message))] = folder_path_for_display
                     except Exception as e:
                         log(f"Błąd ręcznego filtrowania wiadomości: {str(e)}")
                         continue
@@ -675,59 +960,21 @@ class EmailSearchEngine:
             # Apply pagination to filtered messages
             paginated_messages = filtered_messages[start_idx:end_idx]
             log(f"Wiadomości po paginacji: {len(paginated_messages)}")
-            
-            results = []
-            result_processing_errors = 0
-            
-            log("=== TWORZENIE WYNIKÓW ===")
-            for i, message in enumerate(paginated_messages):
-                if self.search_cancelled:
-                    log("Tworzenie wyników anulowane przez użytkownika")
-                    self.result_callback({'type': 'search_cancelled'})
-                    return
-
-                if i % 5 == 0:  # Update progress every 5 messages
-                    self.progress_callback(f"Przetworzono {i + start_idx} wiadomości...")
-                
-                try:
-                    # Extract clean sender email address from Mailbox object
-                    sender_display = 'Nieznany'
-                    if message.sender:
-                        if hasattr(message.sender, 'email_address') and message.sender.email_address:
-                            sender_display = message.sender.email_address
-                        else:
-                            sender_display = str(message.sender)
-                    
-                    # Get folder path for this specific message from our mapping
-                    message_key = getattr(message, 'id', id(message))
-                    message_folder_path = message_to_folder_map.get(message_key, 'Skrzynka odbiorcza')
-                    
-                    # Get PDF match info if available
-                    pdf_match_info = getattr(self, '_pdf_matches', {}).get(message_key, None)
-                    
-                    result_info = {
-                        'datetime_received': message.datetime_received,
-                        'sender': sender_display,
-                        'subject': message.subject if message.subject else 'Brak tematu',
-                        'is_read': message.is_read if hasattr(message, 'is_read') else True,
-                        'has_attachments': message.has_attachments if hasattr(message, 'has_attachments') else False,
-                        'attachment_count': len(message.attachments) if message.attachments else 0,
-                        'message_id': message.id if hasattr(message, 'id') else None,
-                        'folder_path': message_folder_path,  # Use message-specific folder path
-                        'message_obj': message,  # Store full message object for opening
-                        'attachments': list(message.attachments) if message.attachments else [],
-                        'pdf_match_info': pdf_match_info  # Add PDF match information
-                    }
-                    results.append(result_info)
-                    
-                except Exception as e:
-                    # Skip messages that cause errors
-                    result_processing_errors += 1
-                    log(f"Błąd przetwarzania wyniku {i}: {str(e)}")
-                    continue
-            
-            if result_processing_errors > 0:
-                log(f"Błędy przetwarzania wyników: {result_processing_errors}")
+            if account_type == "exchange":
+                paginated_messages = self._hydrate_exchange_messages(account, paginated_messages)
+                filtered_messages[start_idx:start_idx + len(paginated_messages)] = paginated_messages
+            
+            pdf_matches = getattr(self, '_pdf_matches', {})
+            results = self._build_page_results(paginated_messages, message_to_folder_map, pdf_matches, start_idx)
+            if results is None:
+                return
+            
+            # Keep the filtered list so other pages are served without searching again - a search that
+            # stopped early continues filtering from there
+            self.search_sessions.store(SearchSession(
+                session_signature, filtered_messages, message_to_folder_map, pdf_matches, max_total_messages,
+                pending=filter_more if more_available else None
+            ))
             
             # Log final summary
             log("=== PODSUMOWANIE WYSZUKIWANIA ===")
@@ -736,6 +983,12 @@ class EmailSearchEngine:
             log(f"Wiadomości po limitach i filtrach: {len(filtered_messages)}")
             log(f"Wiadomości na tej stronie: {len(results)}")
             log(f"Strona {page + 1} z {(len(filtered_messages) + per_page - 1) // per_page}")
+            if transfer_before is not None:
+                wire, data, saved = TransferStats.saving(
+                    TransferStats.difference(imap_pool.transfer_stats.snapshot(), transfer_before))
+                if data:
+                    log(f"Transfer IMAP (COMPRESS=DEFLATE): {wire // 1024} KB w sieci, {data // 1024} KB danych "
+                        f"(oszczędność {saved:.0f}%)")
             
             # Report PDF auto-save summary if enabled
             if self.auto_save_pdfs and has_pdf_search:
@@ -748,17 +1001,17 @@ class EmailSearchEngine:
                     log(summary_msg)
                     self.progress_callback(summary_msg)
             
+            needle_matches = None
+            if needle_matcher:
+                needle_matches = build_needle_matches(needle_matcher, filtered_messages, message_to_folder_map, pdf_matches)
+                found_needles = sum(1 for matches in needle_matches.values() if matches)
+                log(f"Znalezione numery w PDF: {found_needles} z {len(needle_matcher)}")
+                self.progress_callback(f"Znaleziono {found_needles} z {len(needle_matcher)} numerów w plikach PDF")
+            
             log("=== KONIEC WYSZUKIWANIA ===")
             
-            self.result_callback({
-                'type': 'search_complete',
-                'results': results,
-                'count': len(results),
-                'total_count': len(filtered_messages),
-                'page': page,
-                'per_page': per_page,
-                'total_pages': (len(filtered_messages) + per_page - 1) // per_page
-            })
+            self._emit_search_complete(results, len(filtered_messages), page, per_page, needle_matches,
+                                       has_more=more_available)
             
         except Exception as e:
             log(f"BŁĄD KRYTYCZNY wyszukiwania: {str(e)}")
@@ -767,6 +1020,551 @@ class EmailSearchEngine:
                 'error': str(e)
             })
     
+    def _get_mail_index(self, criteria):
+        """Open the local mail index on first use"""
+        if self.mail_index is None:
+            index_path = criteria.get('mail_index_path') or MAIL_INDEX_FILE
+            self.mail_index = MailIndex(index_path)
+            log(f"Otwarto indeks poczty: {index_path}")
+        return self.mail_index
+    
+    def _search_from_index(self, connection, account, criteria, session_signature, page, per_page, pages=1):
+        """Serve the search from the local mail index, returns False when live search is needed"""
+        try:
+            mail_index = self._get_mail_index(criteria)
+            account_key = get_account_key(connection.current_account_config)
+            folder_path = criteria.get('folder_path', 'Skrzynka odbiorcza')
+            needs_pdf_text = bool((criteria.get('pdf_search_text') or '').strip())
+            if criteria.get('pdf_search_needles') or criteria.get('pdf_needles_file'):
+                log("Wyszukiwanie wielu numerów w PDF nie jest obsługiwane przez indeks - wyszukiwanie na serwerze")
+                return False
+            max_age = criteria.get('index_max_age', DEFAULT_INDEX_MAX_AGE)
+            
+            folders = mail_index.get_fresh_folders(account_key, folder_path, criteria.get('excluded_folders', ''),
+                                                   max_age, needs_pdf_text)
+            if folders is None:
+                log("=== INDEKS POCZTY NIEAKTUALNY - WYSZUKIWANIE NA SERWERZE ===")
+                self.start_index_sync(criteria)
+                return False
+            
+            log("=== WYSZUKIWANIE W INDEKSIE POCZTY ===")
+            start_date = None
+            if criteria.get('selected_period') and criteria['selected_period'] != 'wszystkie':
+                start_date = self._get_period_start_date(criteria['selected_period'])
+            
+            max_total_messages = self._get_max_total_messages(per_page)
+            started = time.time()
+            matches = mail_index.search(account_key, folders, criteria, start_date, max_total_messages)
+            log(f"Indeks: znaleziono {len(matches)} wiadomości w {(time.time() - started) * 1000:.1f} ms")
+            
+            messages = [message for message, _ in matches]
+            folder_map = {message.id: message.folder_path for message in messages}
+            pdf_matches = {message.id: pdf_match for message, pdf_match in matches if pdf_match}
+            session = SearchSession(session_signature, messages, folder_map, pdf_matches, max_total_messages,
+                                    from_index=True)
+            self.search_sessions.store(session)
+            self._emit_page_from_session(session, connection, account, page, per_page, pages)
+            return True
+            
+        except Exception as e:
+            log(f"BŁĄD wyszukiwania w indeksie poczty, wyszukiwanie na serwerze: {str(e)}")
+            return False
+    
+    def start_index_sync(self, criteria):
+        """Synchronise the local mail index in the background (uses its own mail connection)"""
+        if self.index_sync_thread and self.index_sync_thread.is_alive():
+            log("Synchronizacja indeksu poczty już trwa")
+            return
+        
+        def _sync():
+            sync_connection = None
+            try:
+                from gui.mail_search_components.mail_connection import MailConnection
+                sync_connection = MailConnection()
+                self.index_syncer = MailIndexSyncer(self._get_mail_index(criteria), sync_connection, self,
+                                                    index_pdf_text=criteria.get('index_pdf_text', False))
+                self.index_syncer.sync(criteria)
+            except Exception as e:
+                log(f"BŁĄD synchronizacji indeksu poczty: {str(e)}")
+            finally:
+                # Failed syncs must release the connection too (pooled IMAP session, POP3 maildrop lock)
+                if sync_connection is not None:
+                    try:
+                        sync_connection.close_connections()
+                    except Exception as e:
+                        log(f"Błąd zamykania połączenia synchronizacji: {str(e)}")
+        
+        log("Uruchomiono synchronizację indeksu poczty w tle")
+        self.index_sync_thread = threading.Thread(target=_sync, daemon=True)
+        self.index_sync_thread.start()
+    
+    def _get_max_total_messages(self, per_page):
+        """Limit of merged messages considered by one search (multiple of per_page for proper pagination)"""
+        return max(per_page * 10, 1000)  # At least 10 pages worth, minimum 1000
+    
+    def _build_page_results(self, paginated_messages, message_to_folder_map, pdf_matches, start_idx):
+        """Build result dictionaries for one page, returns None when cancelled"""
+        results = []
+        result_processing_errors = 0
+        
+        log("=== TWORZENIE WYNIKÓW ===")
+        for i, message in enumerate(paginated_messages):
+            if self.search_cancelled:
+                log("Tworzenie wyników anulowane przez użytkownika")
+                self.result_callback({'type': 'search_cancelled'})
+                return None
+
+            if i % 5 == 0:  # Update progress every 5 messages
+                self.progress_callback(f"Przetworzono {i + start_idx} wiadomości...")
+            
+            try:
+                # Get folder path and PDF match info for this specific message from our mappings
+                message_key = getattr(message, 'id', id(message))
+                message_folder_path = message_to_folder_map.get(message_key, 'Skrzynka odbiorcza')
+                pdf_match_info = pdf_matches.get(message_key, None)
+                
+                result_info = self._build_result_info(message, message_folder_path, pdf_match_info)
+                results.append(result_info)
+                
+            except Exception as e:
+                # Skip messages that cause errors
+                result_processing_errors += 1
+                log(f"Błąd przetwarzania wyniku {i}: {str(e)}")
+                continue
+        
+        if result_processing_errors > 0:
+            log(f"Błędy przetwarzania wyników: {result_processing_errors}")
+        return results
+    
+    def _emit_page_from_session(self, session, connection, account, page, per_page, pages=1):
+        """Send one page (or `pages` consecutive pages) of a cached search session without repeating the folder queries"""
+        start_idx = page * per_page
+        end_idx = start_idx + per_page * pages
+        log("=== STRONA Z SESJI WYSZUKIWANIA ===")
+        log(f"Użyto zapisanych wyników ({session.total_count} wiadomości), indeksy {start_idx}-{end_idx}")
+        self.progress_callback(f"Ładowanie strony {page + 1} z zapisanych wyników...")
+        
+        # A search that stopped early filters further messages up to this page (and one more result)
+        session.fill(end_idx + 1)
+        if self.search_cancelled:
+            self.result_callback({'type': 'search_cancelled'})
+            return
+        
+        page_messages = session.get_page(start_idx, end_idx)
+        account_config = connection.current_account_config or {}
+        if account_config.get("type") == "exchange" and not session.from_index:
+            # Rows of this page were only listed with projected fields so far
+            page_messages = self._hydrate_exchange_messages(account, page_messages)
+            session.filtered_messages[start_idx:start_idx + len(page_messages)] = page_messages
+        
+        results = self._build_page_results(page_messages, session.folder_map, session.pdf_matches, start_idx)
+        if results is None:
+            return
+        self._emit_search_complete(results, session.total_count, page, per_page, has_more=session.has_more)
+    
+    def _emit_search_complete(self, results, total_count, page, per_page, needle_matches=None, has_more=False):
+        """Send the final page of results to the UI
+        
+        has_more - the search stopped once the requested pages were full, total_count only counts
+        the results found so far (one more than fit on them)
+        """
+        result = {
+            'type': 'search_complete',
+            'results': results,
+            'count': len(results),
+            'total_count': total_count,
+            'page': page,
+            'per_page': per_page,
+            'total_pages': (total_count + per_page - 1) // per_page,
+            'has_more': has_more
+        }
+        if needle_matches is not None:
+            # needle -> [(message, attachment)] of a multi-needle PDF search
+            result['needle_matches'] = needle_matches
+        self.result_callback(result)
+    
+    def _needs_message_content_filters(self, criteria):
+        """Check if criteria require per-message attachment or PDF inspection"""
+        pdf_search_text = (criteria.get('pdf_search_text') or '').strip()
+        return bool(
+            pdf_search_text or criteria.get('pdf_search_needles') or criteria.get('pdf_needles_file')
+            or criteria.get('attachments_required') or criteria.get('no_attachments_only')
+            or criteria.get('attachment_name') or criteria.get('attachment_extension')
+        )
+    
+    def _build_result_info(self, message, folder_path, pdf_match_info=None):
+        """Build result dictionary displayed by ResultsDisplay for a single message"""
+        # Extract clean sender email address from Mailbox object
+        sender_display = 'Nieznany'
+        if message.sender:
+            if hasattr(message.sender, 'email_address') and message.sender.email_address:
+                sender_display = message.sender.email_address
+            else:
+                sender_display = str(message.sender)
+        
+        return {
+            'datetime_received': message.datetime_received,
+            'sender': sender_display,
+            'subject': message.subject if message.subject else 'Brak tematu',
+            'is_read': message.is_read if hasattr(message, 'is_read') else True,
+            'has_attachments': message.has_attachments if hasattr(message, 'has_attachments') else False,
+            'attachment_count': len(message.attachments) if message.attachments else 0,
+            'message_id': message.id if hasattr(message, 'id') else None,
+            'folder_path': folder_path,  # Use message-specific folder path
+            'message_obj': message,  # Store full message object for opening
+            'attachments': list(message.attachments) if message.attachments else [],
+            'pdf_match_info': pdf_match_info  # Add PDF match information
+        }
+    
+    def _emit_partial_results(self, batch, folder_name=None):
+        """Send a batch of ready result rows before the search completes"""
+        if not batch or self.search_cancelled:
+            return
+        if folder_name:
+            log(f"Wyniki częściowe: {len(batch)} wiadomości z folderu '{folder_name}'")
+        else:
+            log(f"Wyniki częściowe: {len(batch)} wiadomości")
+        self.result_callback({
+            'type': 'search_partial',
+            'results': batch,
+            'count': len(batch)
+        })
+    
+    def _message_sort_key(self, message):
+        """Date key used to order messages newest first (messages without a date go last)"""
+        return message.datetime_received if message.datetime_received else datetime.min.replace(tzinfo=timezone.utc)
+    
+    def _row_sort_key(self, row):
+        """Date key of a result row; naive dates (some IMAP servers) are treated as UTC so accounts can be merged"""
+        received = row.get('datetime_received')
+        if not received:
+            return datetime.min.replace(tzinfo=timezone.utc)
+        if received.tzinfo is None:
+            return received.replace(tzinfo=timezone.utc)
+        return received
+    
+    def _merge_folder_messages(self, folder_streams, limit):
+        """Lazily merge per-folder (message, folder_path) streams by date, newest first
+        
+        Each stream must already be ordered newest first. The streams are folder cursors that load
+        older messages in batches only when the merge reaches them, and at most `limit` items are
+        taken, so memory holds one loaded batch per folder plus the messages the caller keeps.
+        """
+        merged = heapq.merge(*folder_streams, key=lambda item: self._message_sort_key(item[0]), reverse=True)
+        return islice(merged, limit)
+    
+    def _apply_listing_projection(self, queryset, extra_fields=()):
+        """Restrict an Exchange listing query to the fields shown in the results list"""
+        try:
+            return queryset.only(*EXCHANGE_LISTING_FIELDS, *extra_fields)
+        except Exception as e:
+            log(f"Nie można ograniczyć pól zapytania, pobieranie pełnych wiadomości: {str(e)}")
+            return queryset
+    
+    def _hydrate_exchange_messages(self, account, messages):
+        """Fetch full Exchange items (body, attachments) for messages listed with field projection
+        
+        Messages are fetched in batches with a single GetItem call each; the returned list keeps
+        the input order and falls back to the listed message when fetching fails.
+        """
+        if not messages or account is None or not hasattr(account, 'fetch'):
+            return messages
+        
+        # Items fetched earlier in this search (e.g. streamed rows) are reused instead of fetched again
+        pending = [m for m in messages if getattr(m, 'id', None) and m.id not in self._hydrated_items]
+        if not pending:
+            return [self._hydrated_items.get(getattr(m, 'id', None), m) for m in messages]
+        
+        hydrated = {}
+        for batch_start in range(0, len(pending), EXCHANGE_FETCH_BATCH_SIZE):
+            if self.search_cancelled:
+                break
+            batch = pending[batch_start:batch_start + EXCHANGE_FETCH_BATCH_SIZE]
+            try:
+                for item in account.fetch(ids=batch):
+                    if isinstance(item, Exception):
+                        log(f"Błąd pobierania wiadomości: {str(item)}")
+                        continue
+                    hydrated[item.id] = item
+            except Exception as e:
+                log(f"BŁĄD pobierania pełnych wiadomości ({len(batch)}): {str(e)}")
+        
+        self._hydrated_items.update(hydrated)
+        log(f"Pobrano pełne dane {len(hydrated)} z {len(pending)} wiadomości")
+        return [self._hydrated_items.get(getattr(m, 'id', None), m) for m in messages]
+    
+    def _hydrate_result_rows(self, account, rows):
+        """Replace message objects of ready result rows with full Exchange items"""
+        messages = self._hydrate_exchange_messages(account, [row['message_obj'] for row in rows])
+        hydrated_rows = []
+        for row, message in zip(rows, messages):
+            if message is not row['message_obj']:
+                row = self._build_result_info(message, row['folder_path'], row.get('pdf_match_info'))
+            hydrated_rows.append(row)
+        return hydrated_rows
+    
+    def _get_folder_worker_count(self, criteria, account_type, folder_count, imap_pool=None):
+        """Get number of worker threads used to query folders concurrently"""
+        if account_type == "imap_smtp" and imap_pool is not None:
+            # Each IMAP worker leases a pooled session; one is held by the search connection itself
+            max_workers = imap_pool.max_size - 1
+        elif account_type != "exchange":
+            # POP3 (and IMAP without a pool) share a single connection which cannot be used from several threads
+            return 1
+        else:
+            max_workers = MAX_FOLDER_SEARCH_WORKERS
+        
+        try:
+            workers = int(criteria.get('folder_search_workers') or DEFAULT_FOLDER_SEARCH_WORKERS)
+        except (TypeError, ValueError):
+            log(f"OSTRZEŻENIE: Nieprawidłowa liczba wątków folderów: {criteria.get('folder_search_workers')}")
+            workers = DEFAULT_FOLDER_SEARCH_WORKERS
+        
+        return max(1, min(workers, max_workers, folder_count))
+    
+    def _create_pdf_pipeline(self, criteria, account_type, pdf_search_text, skip_searched_pdfs):
+        """Create the download → extract → OCR pipeline used by the PDF content stage"""
+        def worker_count(key, default):
+            try:
+                return max(1, int(criteria.get(key) or default))
+            except (TypeError, ValueError):
+                log(f"OSTRZEŻENIE: Nieprawidłowa liczba wątków {key}: {criteria.get(key)}")
+                return default
+        
+        # IMAP/POP3 attachments come from a single shared connection - download one message at a time
+        download_workers = worker_count('pdf_download_workers', DEFAULT_PDF_DOWNLOAD_WORKERS) if account_type == "exchange" else 1
+        return PDFSearchPipeline(
+            self.pdf_processor,
+            pdf_search_text,
+            prepare_message=lambda message: self._collect_pdf_attachments(message, pdf_search_text, skip_searched_pdfs),
+            is_cancelled=lambda: self.search_cancelled,
+            download_workers=download_workers,
+            extract_workers=worker_count('pdf_extract_workers', DEFAULT_PDF_EXTRACT_WORKERS),
+            ocr_workers=worker_count('pdf_ocr_workers', DEFAULT_PDF_OCR_WORKERS)
+        )
+    
+    def _plan_folder_queries(self, folders, account_type, criteria):
+        """Group folder indexes into queries - Exchange folders in chunks sharing one FindItem, others alone"""
+        chunk_size = 1
+        if account_type == "exchange" and len(folders) > 1:
+            try:
+                chunk_size = max(1, int(criteria.get('exchange_folder_chunk_size') or EXCHANGE_FOLDER_CHUNK_SIZE))
+            except (TypeError, ValueError):
+                log(f"OSTRZEŻENIE: Nieprawidłowy rozmiar grupy folderów: {criteria.get('exchange_folder_chunk_size')}")
+                chunk_size = EXCHANGE_FOLDER_CHUNK_SIZE
+        
+        groups = []
+        chunk = []
+        for idx, search_folder in enumerate(folders):
+            # Only real Exchange folders (with an ID) can be listed together in ParentFolderIds
+            if chunk_size > 1 and getattr(search_folder, 'id', None) and hasattr(search_folder, 'filter'):
+                chunk.append(idx)
+                if len(chunk) == chunk_size:
+                    groups.append(chunk)
+                    chunk = []
+            else:
+                groups.append([idx])
+        if chunk:
+            groups.append(chunk)
+        return groups
+    
+    def _search_folder_group(self, indexes, folders, account, connection, account_type, combined_query, criteria,
+                             folder_limit, batch_size=None):
+        """Query a group of folders, returns ([(folder index, messages, folder_results entry)], streams)
+        
+        Runs in a worker thread. A chunk of Exchange folders is queried with one multi-folder FindItem;
+        when that fails the folders are queried one by one. The messages are the first batch of each
+        folder; streams yield (message, folder_path) newest first and load older messages on demand.
+        """
+        if len(indexes) > 1 and not self.search_cancelled:
+            try:
+                return self._search_exchange_folder_chunk(indexes, folders, account, combined_query, folder_limit,
+                                                          batch_size)
+            except Exception as e:
+                log(f"BŁĄD zapytania wielofolderowego ({len(indexes)} folderów), przeszukiwanie pojedynczo: {str(e)}")
+        
+        group_results = []
+        streams = []
+        for idx in indexes:
+            try:
+                folder_messages, folder_result, stream = self._search_single_folder(
+                    folders[idx], idx, len(folders), connection, account_type, combined_query, criteria, folder_limit,
+                    batch_size)
+                streams.append(stream)
+            except Exception as e:
+                folder_messages, folder_result = [], {'error': str(e)}
+            group_results.append((idx, folder_messages, folder_result))
+        return group_results, streams
+    
+    def _search_exchange_folder_chunk(self, indexes, folders, account, combined_query, folder_limit, batch_size=None):
+        """Query several Exchange folders with one FindItem and split the items by their parent folder
+        
+        The chunk is ordered newest first as a whole, so its first folder_limit items hold every message
+        of these folders that can reach the merged search window. Only the first batch_size items are
+        fetched now; the chunk stream pages through the rest when the merge needs it.
+        """
+        chunk = [folders[idx] for idx in indexes]
+        folder_names = ', '.join(self._get_safe_folder_name(search_folder) for search_folder in chunk)
+        log(f"--- Zapytanie wielofolderowe ({len(chunk)} folderów): {folder_names} ---")
+        self.progress_callback(f"Przeszukiwanie {len(chunk)} folderów jednym zapytaniem...")
+        
+        collection = FolderCollection(account=account, folders=chunk)
+        queryset = collection.filter(combined_query) if combined_query else collection.all()
+        # parent_folder_id maps every item back to its folder (and its display path)
+        messages = self._apply_listing_projection(queryset, ('parent_folder_id',)).order_by('-datetime_received')
+        cursor = self._queryset_cursor(messages, folder_limit, batch_size, folder_names)
+        messages_list = list(cursor.buffered)
+        
+        index_by_folder_id = {folders[idx].id: idx for idx in indexes}
+        messages_by_index = {idx: [] for idx in indexes}
+        unmatched = 0
+        for message in messages_list:
+            parent_folder_id = getattr(message, 'parent_folder_id', None)
+            idx = index_by_folder_id.get(getattr(parent_folder_id, 'id', None))
+            if idx is None:
+                unmatched += 1
+                continue
+            messages_by_index[idx].append(message)
+        if unmatched:
+            if unmatched == len(messages_list):
+                raise ValueError("wiadomości bez identyfikatora folderu nadrzędnego")
+            log(f"OSTRZEŻENIE: Pominięto {unmatched} wiadomości z nieznanego folderu")
+        
+        log(f"Zapytanie wielofolderowe: pobrano {len(messages_list)} wiadomości (limit {folder_limit})")
+        group_results = []
+        for idx in indexes:
+            folder_messages = messages_by_index[idx]
+            group_results.append((idx, folder_messages, {
+                'original_count': len(folder_messages),
+                'limited_count': len(folder_messages),
+                'query_success': combined_query is not None
+            }))
+        paths_by_folder_id = {folders[idx].id: self._get_folder_path(folders[idx]) for idx in indexes}
+        return group_results, [self._label_chunk_messages(cursor, paths_by_folder_id)]
+    
+    def _label_chunk_messages(self, cursor, paths_by_folder_id):
+        """Pair the messages of a multi-folder cursor with the display path of their parent folder"""
+        for message in cursor:
+            path = paths_by_folder_id.get(getattr(getattr(message, 'parent_folder_id', None), 'id', None))
+            if path is not None:
+                yield message, path
+    
+    def _queryset_cursor(self, messages, folder_limit, batch_size, label):
+        """Cursor over an ordered Exchange query - the first batch is fetched now, later ones on demand"""
+        batch_size = batch_size or folder_limit
+        iterator = islice(messages, folder_limit)
+        first_batch = list(islice(iterator, batch_size))
+        load_next = (lambda: list(islice(iterator, batch_size))) if len(first_batch) == batch_size else None
+        return FolderCursor(first_batch, load_next, label, is_cancelled=lambda: self.search_cancelled)
+    
+    def _search_single_folder(self, search_folder, idx, folder_count, connection, account_type, combined_query, criteria,
+                              folder_limit, batch_size=None):
+        """Query a single folder, returns (first batch of messages, folder_results entry, stream)
+        
+        Runs in a worker thread during parallel folder search. The stream yields (message, folder_path)
+        newest first and loads messages beyond the first batch_size (up to folder_limit) on demand.
+        """
+        folder_name = self._get_safe_folder_name(search_folder)
+        if self.search_cancelled:
+            return [], {'original_count': 0, 'limited_count': 0, 'query_success': False}, iter(())
+        
+        log(f"--- Folder {idx + 1}/{folder_count}: '{folder_name}' ---")
+        self.progress_callback(f"Przeszukiwanie folderu {idx + 1}/{folder_count}: {folder_name}")
+        
+        # Strategy varies by account type
+        messages_list = []
+        cursor = None
+        query_success = False
+        # Queries are ordered newest first, so only the first batch_size items are pulled from the server
+        # now - the cursor fetches the next ones (never more than folder_limit) when the merge reaches them
+        batch_size = min(batch_size or folder_limit, folder_limit)
+        
+        if account_type == "exchange" and hasattr(search_folder, 'filter'):
+            # Exchange-specific folder operations
+            if combined_query:
+                try:
+                    log(f"Próba zapytania z filtrami dla folderu '{folder_name}'")
+                    messages = self._apply_listing_projection(search_folder.filter(combined_query)).order_by('-datetime_received')
+                    cursor = self._queryset_cursor(messages, folder_limit, batch_size, folder_name)
+                    messages_list = list(cursor.buffered)
+                    query_success = True
+                    log(f"Zapytanie z filtrami: pobrano {len(messages_list)} najnowszych wiadomości")
+                except Exception as query_error:
+                    log(f"BŁĄD zapytania z filtrami: {str(query_error)}")
+                    # Query failed, fallback to getting all messages and filtering manually
+                    try:
+                        log(f"Fallback: pobieranie wszystkich wiadomości z folderu '{folder_name}'")
+                        messages = self._apply_listing_projection(search_folder.all()).order_by('-datetime_received')
+                        cursor = self._queryset_cursor(messages, folder_limit, batch_size, folder_name)
+                        messages_list = list(cursor.buffered)
+                        log(f"Fallback: pobrano {len(messages_list)} najnowszych wiadomości (limit {folder_limit})")
+                    except Exception as fallback_error:
+                        log(f"BŁĄD fallback: {str(fallback_error)}")
+            else:
+                try:
+                    log(f"Pobieranie wszystkich wiadomości z folderu '{folder_name}' (brak filtrów)")
+                    messages = self._apply_listing_projection(search_folder.all()).order_by('-datetime_received')
+                    cursor = self._queryset_cursor(messages, folder_limit, batch_size, folder_name)
+                    messages_list = list(cursor.buffered)
+                    log(f"Pobrano {len(messages_list)} najnowszych wiadomości (limit {folder_limit})")
+                except Exception as all_error:
+                    log(f"BŁĄD pobierania wszystkich: {str(all_error)}")
+            
+            # If we still have no messages, try alternative QuerySet conversion
+            if not messages_list:
+                cursor = None
+                log(f"Brak wiadomości - próba alternatywnej metody konwersji")
+                try:
+                    if combined_query:
+                        messages = search_folder.filter(combined_query)
+                    else:
+                        messages = search_folder.all()
+                    
+                    # Use normal iteration instead of .iterator() - the result is unordered, so the
+                    # whole window is read here and sorted below
+                    messages_list = list(islice(messages, folder_limit))  # Limit during iteration
+                    log(f"Alternatywna metoda: znaleziono {len(messages_list)} wiadomości (limit {folder_limit})")
+                except Exception as iteration_error:
+                    log(f"BŁĄD alternatywnej metody: {str(iteration_error)}")
+                    pass  # Continue with empty list
+        
+        else:
+            # IMAP/POP3 implementation using IMAPClient
+            log(f"Non-Exchange account type '{account_type}': Using IMAPClient message retrieval for folder '{folder_name}'")
+            messages_list = self._get_imap_messages(search_folder, connection, combined_query, criteria, account_type,
+                                                    folder_limit, batch_size)
+            load_next = self._pending_batch_loader(search_folder, criteria, account_type, batch_size)
+            if load_next is not None:
+                messages_list.sort(key=self._message_sort_key, reverse=True)
+                cursor = FolderCursor(messages_list, load_next, folder_name, is_cancelled=lambda: self.search_cancelled)
+            log(f"IMAP/POP3 retrieval completed: found {len(messages_list)} messages")
+        
+        # Apply per-folder limit (IMAP servers report the exact number of matches when only a window was fetched)
+        original_count = max(len(messages_list), self.imap_match_counts.pop(search_folder, 0)) \
+            if isinstance(search_folder, str) else len(messages_list)
+        folder_messages = messages_list[:folder_limit]  # Limit per folder
+        # The merge step expects every folder list ordered newest first (fallback paths are unordered)
+        folder_messages.sort(key=self._message_sort_key, reverse=True)
+        if cursor is None:
+            cursor = FolderCursor(folder_messages, label=folder_name)
+        if original_count > len(folder_messages):
+            log(f"Pobrano {len(folder_messages)} z {original_count} wiadomości (kolejne w miarę potrzeby, "
+                f"limit na folder: {folder_limit})")
+        
+        log(f"Folder '{folder_name}' - szczegóły wiadomości:")
+        log(f"  - Znalezione wiadomości: {original_count}")
+        log(f"  - Pobrane od razu: {len(folder_messages)}")
+        log(f"  - Strategia pobierania: {'z filtrami' if query_success else 'wszystkie (fallback)'}")
+        
+        folder_result = {
+            'original_count': original_count,
+            'limited_count': len(folder_messages),
+            'query_success': query_success
+        }
+        log(f"Folder '{folder_name}': {len(folder_messages)} wiadomości dodano do wyników")
+        # The path is bound per stream - a generator would only read a loop variable (the last folder) later
+        return folder_messages, folder_result, zip(cursor, repeat(self._get_folder_path(search_folder)))
+    
     def _get_period_start_date(self, period):
         """Get start date for the selected period using proper datetime methods"""
         return IMAPDateHandler.get_period_start_date(period)
@@ -806,6 +1604,11 @@ class EmailSearchEngine:
                     return 'Skrzynka odbiorcza'
                 return folder
             
+            # Exchange folders from the cached folder tree already know their path
+            tree_path = folder_display_path(folder)
+            if tree_path:
+                return tree_path
+            
             # Handle Exchange folder objects - build path by traversing up the folder hierarchy
             if hasattr(folder, 'name'):
                 path_parts = []
@@ -865,59 +1668,31 @@ class EmailSearchEngine:
             log(f"BŁĄD przy tworzeniu ścieżki miesięcznego folderu: {e}")
             return base_directory  # Fallback to base directory
     
-    def _check_attachment_filters(self, message, criteria):
-        """Check if message meets attachment criteria"""
-        if criteria.get('attachments_required') and not message.has_attachments:
-            return False
-        
-        # Check for "only without attachments" filter only if "attachments_required" is not set
-        # This gives priority to "attachments_required" when both filters are conflicting
-        if not criteria.get('attachments_required') and criteria.get('no_attachments_only') and message.has_attachments:
-            return False
-            
-        attachment_name_filter = criteria.get('attachment_name', '').lower()
-        attachment_ext_filter = criteria.get('attachment_extension', '').lower()
-        
-        if not attachment_name_filter and not attachment_ext_filter:
-            return True
-            
-        if not message.attachments:
-            return False
-            
-        for attachment in message.attachments:
-            if hasattr(attachment, 'name') and attachment.name:
-                attachment_name = attachment.name.lower()
-                
-                # Check name filter
-                if attachment_name_filter and attachment_name_filter not in attachment_name:
-                    continue
-                    
-                # Check extension filter
-                if attachment_ext_filter:
-                    if not attachment_name.endswith(f'.{attachment_ext_filter}'):
-                        continue
-                
-                # If we get here, attachment matches filters
-                return True
-        
-        return False
-    
     def _check_pdf_content(self, message, search_text, skip_searched_pdfs=False):
         """Check if message has PDF attachments containing the search text"""
         if not message.attachments or not search_text:
             return {'found': False, 'matches': [], 'method': 'no_attachments_or_text'}
         
-        found_matches = []
-        found_attachment_names = []
-        skipped_pdfs_count = 0
-        
-        for attachment in message.attachments:
+        pdfs, skipped = self._collect_pdf_attachments(message, search_text, skip_searched_pdfs)
+        searched = []
+        for attachment_name, attachment in pdfs:
             if self.search_cancelled:
                 return {'found': False, 'matches': [], 'method': 'cancelled'}
             
+            # Search in this PDF attachment
+            result = self.pdf_processor.search_in_pdf_attachment(attachment, search_text, attachment_name)
+            searched.append((attachment_name, attachment, result))
+        
+        return self._finish_pdf_check(message, search_text, searched, skipped)
+    
+    def _collect_pdf_attachments(self, message, search_text, skip_searched_pdfs=False):
+        """Return ([(name, attachment)] to search, [(name, attachment)] skipped by PDF history)"""
+        pdfs = []
+        skipped = []
+        for attachment in message.attachments or []:
             # Check if attachment is a PDF
             attachment_name = getattr(attachment, 'name', '') or ''
-            if not attachment_name.lower().endswith('.pdf'):
+            if not is_pdf_attachment(attachment):
                 continue
             
             # Check if we should skip this PDF based on history
@@ -925,153 +1700,223 @@ class EmailSearchEngine:
                 try:
                     attachment_content = getattr(attachment, 'content', None)
                     if attachment_content and self.pdf_history_manager.is_pdf_already_searched(
-                        attachment_name, attachment_content, search_text
+                        attachment_name, attachment_content, str(search_text)
                     ):
-                        # Mark as skipped and continue to next attachment
-                        self.pdf_history_manager.mark_pdf_as_skipped(
-                            attachment_name, attachment_content, search_text
-                        )
-                        skipped_pdfs_count += 1
+                        skipped.append((attachment_name, attachment))
                         log(f"[PDF HISTORY] Pominięto już przeszukany PDF: {attachment_name}")
                         continue
                 except Exception as e:
                     log(f"[PDF HISTORY] Błąd sprawdzania historii dla {attachment_name}: {e}")
                     # Continue with search if history check fails
             
-            # Search in this PDF attachment
-            result = self.pdf_processor.search_in_pdf_attachment(attachment, search_text, attachment_name)
-            
+            pdfs.append((attachment_name, attachment))
+        return pdfs, skipped
+    
+    def _finish_pdf_check(self, message, search_text, searched, skipped):
+        """Update PDF history, auto-save matching PDFs and build the PDF match info of a message
+        
+        Args:
+            searched: [(attachment_name, attachment, search result)] of searched PDFs
+            skipped: [(attachment_name, attachment)] skipped because of PDF history
+        """
+        found_matches = []
+        found_attachment_names = []
+        
+        for attachment_name, attachment in skipped:
+            try:
+                self.pdf_history_manager.mark_pdf_as_skipped(attachment_name, attachment.content, str(search_text))
+            except Exception as e:
+                log(f"[PDF HISTORY] Błąd sprawdzania historii dla {attachment_name}: {e}")
+        
+        for attachment_name, attachment, result in searched:
             if result['found']:
                 found_matches.extend(result.get('matches', []))
                 found_attachment_names.append({
                     'name': attachment_name,
                     'method': result.get('method', 'unknown'),
-                    'matches': result.get('matches', [])
+                    'matches': result.get('matches', []),
+                    'needles': result.get('needles', [])
                 })
                 
                 # Mark PDF as searched in history
-                if self.pdf_history_manager:
-                    try:
-                        attachment_content = getattr(attachment, 'content', None)
-                        if attachment_content:
-                            # Get sender email from message
-                            sender_email = getattr(message.sender, 'email_address', None) if hasattr(message, 'sender') else None
-                            self.pdf_history_manager.mark_pdf_as_searched(
-                                attachment_name, attachment_content, search_text, result.get('matches', []), sender_email
-                            )
-                    except Exception as e:
-                        log(f"[PDF HISTORY] Błąd oznaczania PDF {attachment_name} jako przeszukany: {e}")
+                self._mark_pdf_searched(message, attachment_name, attachment, search_text, result.get('matches', []))
                 
                 # Auto-save PDF if enabled
                 if self.auto_save_pdfs and self.pdf_save_directory:
-                    try:
-                        # Get monthly folder path based on email date
-                        monthly_folder = self._get_monthly_folder_path(self.pdf_save_directory, message.datetime_received)
-                        
-                        # Create monthly folder if it doesn't exist
-                        try:
-                            os.makedirs(monthly_folder, exist_ok=True)
-                        except Exception as e:
-                            log(f"BŁĄD: Nie można utworzyć miesięcznego folderu {monthly_folder}: {e}")
-                            monthly_folder = self.pdf_save_directory  # Fallback to main directory
-                        
-                        # Create safe filename (remove/replace problematic characters)
-                        safe_filename = "".join(c for c in attachment_name if c.isalnum() or c in (' ', '.', '_', '-', '(', ')'))
-                        if not safe_filename:
-                            safe_filename = f"attachment_{self.saved_pdf_count + 1}.pdf"
-                        
-                        output_path = os.path.join(monthly_folder, safe_filename)
-                        
-                        # Write PDF content to file (overwrite if exists to avoid duplicates)
-                        with open(output_path, 'wb') as f:
-                            f.write(attachment.content)
-                        
-                        # Set file modification time to match email date using proper methods
-                        if message.datetime_received:
-                            try:
-                                # Use IMAPDateHandler for timestamp conversion - no split()
-                                email_timestamp = IMAPDateHandler.convert_to_timestamp(message.datetime_received)
-                                if email_timestamp:
-                                    # Set both access time and modification time to email date
-                                    os.utime(output_path, (email_timestamp, email_timestamp))
-                                    log(f"Ustawiono datę modyfikacji pliku {safe_filename} na: {message.datetime_received}")
-                            except Exception as e:
-                                log(f"OSTRZEŻENIE: Nie można ustawić daty modyfikacji pliku {safe_filename}: {e}")
-                        
-                        self.saved_pdf_count += 1
-                        
-                        # Log successful save with folder information
-                        subject = (message.subject[:50] + "...") if message.subject and len(message.subject) > 50 else (message.subject or "Bez tematu")
-                        folder_name = os.path.basename(monthly_folder)
-                        log(f"Auto-zapisano PDF: {safe_filename} do folderu {folder_name}/ (z wiadomości: {subject})")
-                        self.progress_callback(f"Zapisano: {safe_filename} -> {folder_name}/")
-                        
-                    except Exception as e:
-                        log(f"BŁĄD auto-zapisu PDF {attachment_name}: {e}")
-                        # Don't stop processing, just log the error
+                    self._auto_save_pdf(message, attachment_name, attachment)
             else:
                 # Mark PDF as searched in history even if no matches found
-                if self.pdf_history_manager:
-                    try:
-                        attachment_content = getattr(attachment, 'content', None)
-                        if attachment_content:
-                            # Get sender email from message
-                            sender_email = getattr(message.sender, 'email_address', None) if hasattr(message, 'sender') else None
-                            self.pdf_history_manager.mark_pdf_as_searched(
-                                attachment_name, attachment_content, search_text, [], sender_email
-                            )
-                    except Exception as e:
-                        log(f"[PDF HISTORY] Błąd oznaczania PDF {attachment_name} jako przeszukany (bez wyników): {e}")
+                self._mark_pdf_searched(message, attachment_name, attachment, search_text, [])
         
         # Log statistics about skipped PDFs
-        if skipped_pdfs_count > 0:
-            log(f"[PDF HISTORY] Pominięto {skipped_pdfs_count} już przeszukanych PDF-ów")
+        if skipped:
+            log(f"[PDF HISTORY] Pominięto {len(skipped)} już przeszukanych PDF-ów")
         
         if found_attachment_names:
             return {
                 'found': True,
                 'attachments': found_attachment_names,
                 'all_matches': found_matches,
-                'skipped_count': skipped_pdfs_count
+                'skipped_count': len(skipped)
             }
         
-        return {'found': False, 'matches': [], 'method': 'not_found_in_pdfs', 'skipped_count': skipped_pdfs_count}
-
-    def _get_imap_messages(self, folder_name, connection, combined_query, criteria, account_type, per_page=500):
-        """Retrieve messages from IMAP folder using IMAPClient"""
+        return {'found': False, 'matches': [], 'method': 'not_found_in_pdfs', 'skipped_count': len(skipped)}
+    
+    def _mark_pdf_searched(self, message, attachment_name, attachment, search_text, matches):
+        """Record a searched PDF in the PDF history"""
+        if not self.pdf_history_manager:
+            return
+        try:
+            attachment_content = getattr(attachment, 'content', None)
+            if attachment_content:
+                # Get sender email from message
+                sender_email = getattr(message.sender, 'email_address', None) if hasattr(message, 'sender') else None
+                self.pdf_history_manager.mark_pdf_as_searched(
+                    attachment_name, attachment_content, str(search_text), matches, sender_email
+                )
+        except Exception as e:
+            log(f"[PDF HISTORY] Błąd oznaczania PDF {attachment_name} jako przeszukany: {e}")
+    
+    def _auto_save_pdf(self, message, attachment_name, attachment):
+        """Save a matching PDF into the monthly folder of the PDF save directory"""
+        try:
+            # Get monthly folder path based on email date
+            monthly_folder = self._get_monthly_folder_path(self.pdf_save_directory, message.datetime_received)
+            
+            # Create monthly folder if it doesn't exist
+            try:
+                os.makedirs(monthly_folder, exist_ok=True)
+            except Exception as e:
+                log(f"BŁĄD: Nie można utworzyć miesięcznego folderu {monthly_folder}: {e}")
+                monthly_folder = self.pdf_save_directory  # Fallback to main directory
+            
+            # Create safe filename (remove/replace problematic characters)
+            safe_filename = "".join(c for c in attachment_name if c.isalnum() or c in (' ', '.', '_', '-', '(', ')'))
+            if not safe_filename:
+                safe_filename = f"attachment_{self.saved_pdf_count + 1}.pdf"
+            
+            output_path = os.path.join(monthly_folder, safe_filename)
+            
+            # Write PDF content to file (overwrite if exists to avoid duplicates)
+            with open(output_path, 'wb') as f:
+                f.write(attachment.content)
+            
+            # Set file modification time to match email date using proper methods
+            if message.datetime_received:
+                try:
+                    # Use IMAPDateHandler for timestamp conversion - no split()
+                    email_timestamp = IMAPDateHandler.convert_to_timestamp(message.datetime_received)
+                    if email_timestamp:
+                        # Set both access time and modification time to email date
+                        os.utime(output_path, (email_timestamp, email_timestamp))
+                        log(f"Ustawiono datę modyfikacji pliku {safe_filename} na: {message.datetime_received}")
+                except Exception as e:
+                    log(f"OSTRZEŻENIE: Nie można ustawić daty modyfikacji pliku {safe_filename}: {e}")
+            
+            self.saved_pdf_count += 1
+            
+            # Log successful save with folder information
+            subject = (message.subject[:50] + "...") if message.subject and len(message.subject) > 50 else (message.subject or "Bez tematu")
+            folder_name = os.path.basename(monthly_folder)
+            log(f"Auto-zapisano PDF: {safe_filename} do folderu {folder_name}/ (z wiadomości: {subject})")
+            self.progress_callback(f"Zapisano: {safe_filename} -> {folder_name}/")
+            
+        except Exception as e:
+            log(f"BŁĄD auto-zapisu PDF {attachment_name}: {e}")
+            # Don't stop processing, just log the error
+    
+    def _get_imap_messages(self, folder_name, connection, combined_query, criteria, account_type, per_page=500,
+                           first_batch=None):
+        """Retrieve messages from IMAP folder using IMAPClient
+        
+        With first_batch only that many of the newest per_page matches are fetched, the rest is left
+        for the folder cursor (see _pending_batch_loader).
+        """
         try:
             if account_type == "pop3_smtp":
-                return self._get_pop3_messages(connection, criteria, per_page)
+                return self._get_pop3_messages(connection, criteria, per_page, first_batch)
+            
+            imap_pool = getattr(connection, 'imap_pool', None)
+            account_key = get_account_key(getattr(connection, 'current_account_config', None))
+            if imap_pool is not None and imap_pool.max_size > 1:
+                # Each folder is searched on its own pooled session, so folders can run in parallel
+                with imap_pool.lease() as imap:
+                    return self._search_imap_folder(imap, folder_name, criteria, per_page, imap_pool, account_key,
+                                                    first_batch)
             
-            # For IMAP accounts, use the existing IMAP connection
+            # Otherwise use the existing IMAP connection
             imap = connection.imap_connection
             if not imap:
                 log("[IMAP] ERROR: No IMAP connection available")
                 return []
+            return self._search_imap_folder(imap, folder_name, criteria, per_page, imap_pool, account_key, first_batch)
             
-            # Select the folder
+        except Exception as e:
+            log(f"[IMAP] ERROR in _get_imap_messages: {str(e)}")
+            return []
+    
+    def _search_imap_folder(self, imap, folder_name, criteria, per_page, imap_pool=None, account_key=None,
+                            first_batch=None):
+        """Search one IMAP folder, opened read-only with EXAMINE
+        
+        The newest per_page matching UIDs are listed; with first_batch only the headers of that many
+        are fetched and the other UIDs are kept in imap_pending_uids for the folder cursor.
+        """
+        try:
+            header_cache.enable_condstore(imap)
+            folder_info = {}
+            
+            # Open the folder read-only (EXAMINE) - searching never changes flags
             try:
                 if isinstance(folder_name, str):
-                    imap.select_folder(folder_name)
+                    folder_info = imap.select_folder(folder_name, readonly=True)
+                    selected_folder = folder_name
                     log(f"[IMAP] Selected folder: {folder_name}")
                 else:
                     # Should not happen for IMAP, but fallback to INBOX
-                    imap.select_folder("INBOX")
+                    folder_info = imap.select_folder("INBOX", readonly=True)
+                    selected_folder = "INBOX"
                     log(f"[IMAP] Fallback to INBOX folder")
             except Exception as folder_error:
                 log(f"[IMAP] ERROR selecting folder {folder_name}: {str(folder_error)}")
                 try:
-                    imap.select_folder("INBOX")
+                    folder_info = imap.select_folder("INBOX", readonly=True)
+                    selected_folder = "INBOX"
                     log("[IMAP] Fallback to INBOX after folder selection error")
                 except Exception as inbox_error:
                     log(f"[IMAP] ERROR: Cannot even select INBOX: {str(inbox_error)}")
                     return []
             
+            # Headers cached by an earlier search stay valid when CONDSTORE reports what changed
+            folder_headers = None
+            try:
+                folder_headers = header_cache.refresh(imap, (account_key, selected_folder), folder_info or {})
+            except Exception as cache_error:
+                log(f"[IMAP] Header cache refresh failed: {str(cache_error)}")
+            
             # Build IMAP search criteria
             search_criteria = self._build_imap_search_criteria(criteria)
             log(f"[IMAP] Search criteria: {search_criteria}")
             
-            # Search for message UIDs
+            # Search for message UIDs - with SORT/ESEARCH the server returns the exact total and
+            # only the newest per_page UIDs instead of the whole UID list
+            try:
+                limited_uids, total, method = search_newest(imap, search_criteria, per_page)
+                # Keyed by the requested folder (not the selected one, which may be the INBOX fallback) -
+                # _search_single_folder reads the count back with that name
+                if isinstance(folder_name, str):
+                    self.imap_match_counts[folder_name] = total
+                log(f"[IMAP] {method}: {total} messages matching criteria, {len(limited_uids)} newest requested")
+                if not limited_uids:
+                    log("[IMAP] No messages found")
+                    return []
+                limited_uids = self._defer_imap_uids(folder_name, selected_folder, limited_uids,
+                                                     method in ('ESORT', 'SORT'), first_batch)
+                return self._fetch_imap_messages(imap, limited_uids, criteria, folder=selected_folder,
+                                                 imap_pool=imap_pool, folder_headers=folder_headers)
+            except Exception as extension_error:
+                log(f"[IMAP] Server side search failed: {str(extension_error)}, using plain SEARCH")
+            
             try:
                 message_uids = imap.search(search_criteria)
                 log(f"[IMAP] Found {len(message_uids)} messages matching criteria")
@@ -1092,18 +1937,75 @@ class EmailSearchEngine:
             limited_uids = message_uids[-per_page:]  # Get most recent messages up to per_page limit
             if len(limited_uids) < len(message_uids):
                 log(f"[IMAP] Limited to {len(limited_uids)} most recent messages (from {len(message_uids)} total)")
+            limited_uids = self._defer_imap_uids(folder_name, selected_folder, limited_uids, False, first_batch)
             
             # Fetch message data
             log(f"[IMAP] Fetching message data for {len(limited_uids)} messages...")
-            messages_list = self._fetch_imap_messages(imap, limited_uids, criteria)
+            messages_list = self._fetch_imap_messages(imap, limited_uids, criteria, folder=selected_folder,
+                                                      imap_pool=imap_pool, folder_headers=folder_headers)
             
             log(f"[IMAP] Successfully retrieved {len(messages_list)} message objects")
             return messages_list
             
         except Exception as e:
-            log(f"[IMAP] ERROR in _get_imap_messages: {str(e)}")
+            log(f"[IMAP] ERROR in _search_imap_folder: {str(e)}")
             return []
     
+    def _defer_imap_uids(self, folder_name, selected_folder, uids, newest_first, first_batch):
+        """Return the UIDs whose headers are fetched now; the older ones wait for the folder cursor"""
+        if not first_batch or len(uids) <= first_batch or not isinstance(folder_name, str):
+            return uids
+        # SORT lists the newest first, SEARCH/ESEARCH in UID order (the last UIDs are the newest)
+        ordered = list(uids) if newest_first else list(reversed(uids))
+        self.imap_pending_uids[folder_name] = (selected_folder, ordered[first_batch:])
+        log(f"[IMAP] Fetching headers of the newest {first_batch} of {len(ordered)} messages, "
+            f"the rest when the results reach them")
+        return ordered[:first_batch]
+    
+    def _pending_batch_loader(self, folder_name, criteria, account_type, batch_size):
+        """load_next() for the listed matches of an IMAP/POP3 folder beyond its first batch (None if there are none)"""
+        if account_type == "pop3_smtp":
+            pending, self.pop3_pending_messages = self.pop3_pending_messages, []
+            if not pending:
+                return None
+            return IdBatchLoader(pending, lambda entries: self._load_pop3_batch(entries, criteria), batch_size)
+        
+        selected_folder, uids = self.imap_pending_uids.pop(folder_name, (None, []))
+        if not uids:
+            return None
+        return IdBatchLoader(uids, lambda batch: self._load_imap_batch(selected_folder, batch, criteria), batch_size)
+    
+    def _load_imap_batch(self, folder_name, uids, criteria):
+        """Fetch headers of further UIDs of a searched folder, newest first"""
+        connection = self.search_connection
+        imap_pool = getattr(connection, 'imap_pool', None)
+        account_key = get_account_key(getattr(connection, 'current_account_config', None))
+        if imap_pool is not None and imap_pool.max_size > 1:
+            with imap_pool.lease() as imap:
+                return self._fetch_imap_folder_batch(imap, folder_name, uids, criteria, imap_pool, account_key)
+        
+        imap = getattr(connection, 'imap_connection', None)
+        if not imap:
+            log("[IMAP] ERROR: No IMAP connection available")
+            return []
+        return self._fetch_imap_folder_batch(imap, folder_name, uids, criteria, imap_pool, account_key)
+    
+    def _fetch_imap_folder_batch(self, imap, folder_name, uids, criteria, imap_pool, account_key):
+        """Open the folder again (the session may have searched other folders since) and fetch a UID batch"""
+        header_cache.enable_condstore(imap)
+        folder_info = imap.select_folder(folder_name, readonly=True)
+        folder_headers = None
+        try:
+            folder_headers = header_cache.refresh(imap, (account_key, folder_name), folder_info or {})
+        except Exception as cache_error:
+            log(f"[IMAP] Header cache refresh failed: {str(cache_error)}")
+        
+        log(f"[IMAP] Fetching next {len(uids)} messages of {folder_name}")
+        messages = self._fetch_imap_messages(imap, uids, criteria, folder=folder_name, imap_pool=imap_pool,
+                                             folder_headers=folder_headers)
+        messages.sort(key=self._message_sort_key, reverse=True)
+        return messages
+    
     def _build_imap_search_criteria(self, criteria):
         """Build IMAP search criteria from GUI criteria as flat list"""
         search_terms = []
@@ -1150,48 +2052,79 @@ class EmailSearchEngine:
         
         return search_terms
     
-    def _fetch_imap_messages(self, imap, message_uids, criteria):
-        """Fetch and parse IMAP messages"""
+    def _fetch_imap_messages(self, imap, message_uids, criteria, folder=None, imap_pool=None, folder_headers=None):
+        """Fetch and parse IMAP messages
+        
+        folder, imap_pool - let the messages load bodies and attachments later on a pooled
+        session, independently of the search connection
+        folder_headers - header cache of the folder (FolderHeaders); only UIDs missing from it are fetched
+        """
         messages_list = []
         
+        # Cancelling closes the socket, so a batch waiting for the server is aborted at once
+        unregister_abort = self.cancellation_token.register(lambda: self._abort_imap_fetch(imap))
         try:
-            # Fetch message data in batches
-            batch_size = 50
-            for i in range(0, len(message_uids), batch_size):
+            fetched = folder_headers.lookup(message_uids) if folder_headers is not None else {}
+            if fetched:
+                log(f"[IMAP] {len(fetched)} of {len(message_uids)} messages served from header cache")
+            uids_to_fetch = [uid for uid in message_uids if uid not in fetched]
+            
+            # Fetch message data in batches sized from the measured round trips, each batch
+            # addressed with a compressed UID sequence set (e.g. 1000:1999) instead of a UID list
+            batch_sizer = AdaptiveBatchSizer()
+            for batch_number, batch_uids in enumerate(batch_sizer.batches(uids_to_fetch), 1):
                 if self.search_cancelled:
                     log("[IMAP] Message fetching cancelled")
                     break
                 
-                batch_uids = message_uids[i:i + batch_size]
-                log(f"[IMAP] Fetching batch {i//batch_size + 1}: UIDs {len(batch_uids)} messages")
+                uid_set = compress_uid_set(batch_uids)
+                log(f"[IMAP] Fetching batch {batch_number}: {len(batch_uids)} messages (UID {uid_set[:60]})")
                 
                 try:
                     # Fetch headers and basic info
-                    response = imap.fetch(batch_uids, ['ENVELOPE', 'FLAGS', 'RFC822.SIZE', 'BODYSTRUCTURE'])
-                    
-                    for uid in batch_uids:
-                        if self.search_cancelled:
-                            break
-                        
-                        if uid in response:
-                            try:
-                                message_obj = self._parse_imap_message(imap, uid, response[uid], criteria)
-                                if message_obj:
-                                    messages_list.append(message_obj)
-                            except Exception as parse_error:
-                                log(f"[IMAP] Error parsing message UID {uid}: {str(parse_error)}")
-                                continue
+                    started = time.perf_counter()
+                    response = imap.fetch(uid_set, ['ENVELOPE', 'FLAGS', 'RFC822.SIZE', 'BODYSTRUCTURE'])
+                    batch_sizer.record(len(batch_uids), time.perf_counter() - started,
+                                       estimate_fetch_response_size(response))
+                    if folder_headers is not None:
+                        folder_headers.store(response)
+                    fetched.update(response)
                 
                 except Exception as batch_error:
                     log(f"[IMAP] Error fetching batch: {str(batch_error)}")
                     continue
+            
+            for uid in message_uids:
+                if self.search_cancelled:
+                    break
+                
+                if uid in fetched:
+                    try:
+                        message_obj = self._parse_imap_message(imap, uid, fetched[uid], criteria,
+                                                               folder=folder, imap_pool=imap_pool)
+                        if message_obj:
+                            messages_list.append(message_obj)
+                    except Exception as parse_error:
+                        log(f"[IMAP] Error parsing message UID {uid}: {str(parse_error)}")
+                        continue
         
         except Exception as e:
             log(f"[IMAP] ERROR in _fetch_imap_messages: {str(e)}")
+        finally:
+            unregister_abort()
         
         return messages_list
     
-    def _parse_imap_message(self, imap, uid, message_data, criteria):
+    def _abort_imap_fetch(self, imap):
+        """Interrupt a running IMAP fetch (the next search opens a new connection anyway)"""
+        log("[IMAP] Search cancelled - closing connection to abort fetch in progress")
+        mark_connection_broken(imap)
+        try:
+            imap.socket().shutdown(socket.SHUT_RDWR)
+        except Exception as e:
+            log(f"[IMAP] Could not abort fetch: {str(e)}")
+    
+    def _parse_imap_message(self, imap, uid, message_data, criteria, folder=None, imap_pool=None):
         """Parse IMAP message data into a message-like object"""
         try:
             envelope = message_data.get(b'ENVELOPE')
@@ -1242,7 +2175,9 @@ class EmailSearchEngine:
                 has_attachments=has_attachments,
                 imap_connection=imap,
                 size=size,
-                bodystructure=bodystructure
+                bodystructure=bodystructure,
+                folder=folder,
+                imap_pool=imap_pool
             )
             
             return message_obj
@@ -1252,31 +2187,9 @@ class EmailSearchEngine:
             return None
     
     def _decode_imap_header(self, header_value):
-        """Decode IMAP header value"""
-        if not header_value:
-            return ""
-        
+        """Decode IMAP header value (memoized, see decode_header_value)"""
         try:
-            if isinstance(header_value, bytes):
-                header_value = header_value.decode('utf-8', errors='ignore')
-            
-            # Decode RFC2047 encoded headers
-            decoded_parts = email.header.decode_header(str(header_value))
-            decoded_string = ""
-            
-            for part, encoding in decoded_parts:
-                if isinstance(part, bytes):
-                    if encoding:
-                        try:
-                            part = part.decode(encoding)
-                        except:
-                            part = part.decode('utf-8', errors='ignore')
-                    else:
-                        part = part.decode('utf-8', errors='ignore')
-                decoded_string += part
-            
-            return decoded_string.strip()
-            
+            return decode_header_value(header_value)
         except Exception as e:
             log(f"[IMAP] Error decoding header: {str(e)}")
             return str(header_value) if header_value else ""
@@ -1287,42 +2200,17 @@ class EmailSearchEngine:
             return False
         
         try:
-            # Recursively check bodystructure for attachments
-            return self._has_attachments_recursive(bodystructure)
+            return bool(attachment_manifest(bodystructure))
         except Exception as e:
             log(f"[IMAP] Error checking attachments: {str(e)}")
             return False
     
-    def _has_attachments_recursive(self, structure):
-        """Recursively check bodystructure for attachments"""
-        if not structure:
-            return False
+    def _get_pop3_messages(self, connection, criteria, per_page=500, first_batch=None):
+        """Retrieve messages from POP3 connection
         
-        try:
-            # If it's a tuple/list and has multiple parts
-            if isinstance(structure, (tuple, list)) and len(structure) > 0:
-                # Check if this is a multipart structure
-                if isinstance(structure[0], (tuple, list)):
-                    # Multipart - check each part
-                    for part in structure:
-                        if isinstance(part, (tuple, list)) and self._has_attachments_recursive(part):
-                            return True
-                else:
-                    # Single part - check disposition
-                    if len(structure) > 8:
-                        disposition = structure[8] if len(structure) > 8 else None
-                        if disposition and isinstance(disposition, (tuple, list)) and len(disposition) > 0:
-                            if disposition[0] and b'attachment' in disposition[0].lower():
-                                return True
-            
-            return False
-            
-        except Exception as e:
-            log(f"[IMAP] Error in recursive attachment check: {str(e)}")
-            return False
-    
-    def _get_pop3_messages(self, connection, criteria, per_page=500):
-        """Retrieve messages from POP3 connection"""
+        With first_batch only that many of the newest per_page messages are read now; the older ones
+        are kept in pop3_pending_messages as (number, UIDL) for the folder cursor.
+        """
         try:
             pop3 = connection.pop3_connection
             if not pop3:
@@ -1330,51 +2218,164 @@ class EmailSearchEngine:
                 return []
             
             log("[POP3] Retrieving message list...")
-            messages_list = []
+            
+            # UIDL identifies messages across sessions - it keys the local header/message cache
+            account_config = getattr(connection, 'current_account_config', None) or {}
+            account_key = get_account_key(account_config)
+            uidls = {}
+            message_cache = None
+            try:
+                uidls = parse_uidl_listing(pop3.uidl()[1])
+                if account_config.get("pop3_cache", True):
+                    message_cache = get_pop3_cache(criteria.get('pop3_cache_path') or POP3_CACHE_FILE)
+                    message_cache.prune(account_key, uidls.values())
+            except Exception as e:
+                log(f"[POP3] UIDL not available, local cache disabled: {str(e)}")
+                uidls = {}
+                message_cache = None
+            
+            self.pop3_listing = (pop3, {uidl: number for number, uidl in uidls.items()})
             
             # Get message count
-            num_messages = len(pop3.list()[1])
+            num_messages = len(uidls) if uidls else len(pop3.list()[1])
             log(f"[POP3] Found {num_messages} messages")
             
             # Limit messages for performance
             max_messages = min(num_messages, per_page)
             start_index = max(1, num_messages - max_messages + 1)
             
-            log(f"[POP3] Retrieving {max_messages} most recent messages (from {start_index} to {num_messages})")
+            # Older messages of the window are read by the folder cursor when the results reach them
+            if first_batch and max_messages > first_batch:
+                fetch_start = num_messages - first_batch + 1
+                self.pop3_pending_messages = [(i, uidls.get(i)) for i in range(fetch_start - 1, start_index - 1, -1)]
+                start_index = fetch_start
+            
+            log(f"[POP3] Retrieving {num_messages - start_index + 1} most recent messages "
+                f"(from {start_index} to {num_messages})")
+            
+            messages_list, cached_count = self._read_pop3_headers(
+                pop3, range(start_index, num_messages + 1), uidls, criteria, account_config, message_cache)
+            
+            if message_cache is not None:
+                log(f"[POP3] Headers of {cached_count} messages taken from the local cache, "
+                    f"{len(messages_list) - cached_count} downloaded")
+            log(f"[POP3] Successfully retrieved {len(messages_list)} messages")
+            return messages_list
             
-            for i in range(start_index, num_messages + 1):
+        except Exception as e:
+            log(f"[POP3] ERROR in _get_pop3_messages: {str(e)}")
+            return []
+    
+    def _load_pop3_batch(self, entries, criteria):
+        """Read headers of further POP3 messages, given as (number, UIDL), newest first"""
+        connection = self.search_connection
+        pop3 = getattr(connection, 'pop3_connection', None)
+        if not pop3:
+            log("[POP3] ERROR: No POP3 connection available")
+            return []
+        
+        # Message numbers are only valid in the session that listed them - a page change reconnects,
+        # so the pending messages are found again by their UIDL
+        listed_pop3, numbers_by_uidl = self.pop3_listing
+        if pop3 is not listed_pop3:
+            try:
+                numbers_by_uidl = {uidl: number for number, uidl in parse_uidl_listing(pop3.uidl()[1]).items()}
+            except Exception as e:
+                log(f"[POP3] UIDL not available in the new session, using listed message numbers: {str(e)}")
+                numbers_by_uidl = {}
+            self.pop3_listing = (pop3, numbers_by_uidl)
+        if numbers_by_uidl:
+            # Messages deleted since the listing are skipped
+            entries = [(numbers_by_uidl[uidl], uidl) for _, uidl in entries if uidl in numbers_by_uidl]
+        
+        account_config = getattr(connection, 'current_account_config', None) or {}
+        uidls = {number: uidl for number, uidl in entries if uidl}
+        message_cache = None
+        if uidls and account_config.get("pop3_cache", True):
+            message_cache = get_pop3_cache(criteria.get('pop3_cache_path') or POP3_CACHE_FILE)
+        
+        log(f"[POP3] Retrieving next {len(entries)} messages")
+        messages, _ = self._read_pop3_headers(pop3, [number for number, _ in entries], uidls, criteria,
+                                              account_config, message_cache)
+        messages.sort(key=self._message_sort_key, reverse=True)
+        return messages
+    
+    def _read_pop3_headers(self, pop3, numbers, uidls, criteria, account_config, message_cache):
+        """Build message objects for POP3 message numbers, returns (messages, number served from the cache)"""
+        messages_list = []
+        account_key = get_account_key(account_config)
+        
+        # Attachment filters need the MIME part headers, which follow the message headers
+        top_lines = 0
+        if criteria.get('attachment_name') or criteria.get('attachment_extension'):
+            top_lines = POP3_MANIFEST_TOP_LINES
+        
+        # Only headers are cached by default - raw messages (attachments included) are stored
+        # when the account config sets "pop3_cache_messages": true
+        store_messages = message_cache is not None and account_config.get("pop3_cache_messages", False)
+        cached_headers = {}
+        if message_cache is not None:
+            for i in numbers:
+                if uidls.get(i):
+                    raw_message = message_cache.get_headers(account_key, uidls[i], top_lines)
+                    if raw_message is not None:
+                        cached_headers[i] = raw_message
+        cached_count = len(cached_headers)
+        
+        # Headers of the other messages - TOP commands are pipelined when the server supports it
+        missing = [i for i in numbers if i not in cached_headers]
+        tops = fetch_tops(pop3, missing, top_lines)
+        
+        try:
+            for i in numbers:
                 if self.search_cancelled:
                     log("[POP3] Message retrieval cancelled")
                     break
                 
+                uidl = uidls.get(i)
+                raw_message = cached_headers.get(i)
+                if raw_message is None:
+                    try:
+                        _, response = next(tops)  # Headers (and the first body lines)
+                    except (poplib.error_proto, OSError) as connection_error:
+                        log(f"[POP3] Connection error while retrieving headers: {str(connection_error)}")
+                        break
+                    if response is None:
+                        continue
+                    raw_message = b'\n'.join(response)
+                    if message_cache is not None and uidl:
+                        message_cache.store_headers(account_key, uidl, top_lines, raw_message)
+                
                 try:
-                    # Get message headers
-                    response = pop3.top(i, 0)  # Get headers only
-                    if response:
-                        header_lines = response[1]
-                        header_text = b'\n'.join(header_lines).decode('utf-8', errors='ignore')
-                        
-                        # Parse headers
-                        msg = email.message_from_string(header_text)
-                        
-                        # Create message object
-                        message_obj = self._create_pop3_message_object(i, msg, pop3)
-                        if message_obj:
-                            messages_list.append(message_obj)
+                    header_text = raw_message.decode('utf-8', errors='ignore')
+                    
+                    # Parse headers
+                    msg = email.message_from_string(header_text)
+                    manifest = mime_attachment_manifest(msg, raw_message) if top_lines else None
+                    
+                    # Create message object
+                    message_obj = self._create_pop3_message_object(
+                        i, msg, pop3, manifest, uidl=uidl,
+                        message_cache=message_cache if store_messages else None, account_key=account_key)
+                    if message_obj:
+                        messages_list.append(message_obj)
                 
                 except Exception as msg_error:
                     log(f"[POP3] Error retrieving message {i}: {str(msg_error)}")
                     continue
-            
-            log(f"[POP3] Successfully retrieved {len(messages_list)} messages")
-            return messages_list
-            
-        except Exception as e:
-            log(f"[POP3] ERROR in _get_pop3_messages: {str(e)}")
-            return []
+        finally:
+            # Reads the responses of TOP commands already sent when the loop stopped early
+            tops.close()
+        
+        return messages_list, cached_count
     
-    def _create_pop3_message_object(self, message_num, email_msg, pop3_connection):
-        """Create a message-like object from POP3 email"""
+    def _create_pop3_message_object(self, message_num, email_msg, pop3_connection, attachment_manifest=None,
+                                    uidl=None, message_cache=None, account_key=None):
+        """Create a message-like object from POP3 email
+        
+        attachment_manifest - attachments listed from a TOP response, None when unknown
+        message_cache - POP3MessageCache storing the raw message under (account_key, uidl) once retrieved
+        """
         try:
             # Extract basic info
             subject = self._decode_imap_header(email_msg.get('Subject', 'Brak tematu'))
@@ -1389,7 +2390,10 @@ class EmailSearchEngine:
             is_read = True
             
             # Check for attachments by examining Content-Type
-            has_attachments = email_msg.is_multipart()
+            if attachment_manifest is not None:
+                has_attachments = bool(attachment_manifest)
+            else:
+                has_attachments = email_msg.is_multipart()
             
             # Create message object
             message_obj = POP3Message(
@@ -1400,7 +2404,11 @@ class EmailSearchEngine:
                 is_read=is_read,
                 has_attachments=has_attachments,
                 pop3_connection=pop3_connection,
-                email_message=email_msg
+                email_message=email_msg,
+                attachment_manifest=attachment_manifest,
+                uidl=uidl,
+                message_cache=message_cache,
+                account_key=account_key
             )
             
             return message_obj
@@ -1423,7 +2431,7 @@ class IMAPSender:
 class IMAPMessage:
     """Message object for IMAP messages, compatible with Exchange Message interface"""
     def __init__(self, uid, subject, sender, datetime_received, is_read, has_attachments, 
-                 imap_connection, size=0, bodystructure=None):
+                 imap_connection, size=0, bodystructure=None, folder=None, imap_pool=None):
         self.id = uid
         self.uid = uid
         self.subject = subject
@@ -1436,7 +2444,10 @@ class IMAPMessage:
         self.size = size
         self.bodystructure = bodystructure
         self._imap_connection = imap_connection
+        self.folder = folder
+        self._imap_pool = imap_pool
         self._attachments = None
+        self._attachment_manifest = None
         self._body = None
     
     @property
@@ -1446,6 +2457,13 @@ class IMAPMessage:
             self._attachments = self._load_attachments()
         return self._attachments
     
+    @property
+    def attachment_manifest(self):
+        """Attachment metadata (BodyParts) from BODYSTRUCTURE, None when it is not available"""
+        if self._attachment_manifest is None and self.bodystructure:
+            self._attachment_manifest = attachment_manifest(self.bodystructure)
+        return self._attachment_manifest
+    
     @property
     def body(self):
         """Lazy load message body when requested"""
@@ -1454,20 +2472,34 @@ class IMAPMessage:
         return self._body
     
     def _load_attachments(self):
-        """Load attachments from IMAP message"""
+        """Load attachments from IMAP message
+        
+        With a BODYSTRUCTURE the attachment list is built without any download and each
+        attachment fetches only its own MIME part (BODY.PEEK[section]) when its content
+        is read. Without it the whole message is fetched.
+        """
         try:
             if not self.has_attachments:
                 return []
             
+            manifest = self.attachment_manifest
+            if manifest:
+                attachments = [
+                    IMAPAttachment(part.filename, size=part.size, loader=self._make_part_loader(part))
+                    for part in manifest
+                ]
+                log(f"[IMAP] Found {len(attachments)} attachments in BODYSTRUCTURE for UID {self.uid}")
+                return attachments
+            
             log(f"[IMAP] Loading attachments for message UID {self.uid}")
             
-            # Fetch the full message to get attachments
-            response = self._imap_connection.fetch([self.uid], ['RFC822'])
+            # Fetch the full message to get attachments (PEEK keeps the \Seen flag unchanged)
+            response = self._fetch(['BODY.PEEK[]'])
             if self.uid not in response:
                 log(f"[IMAP] Could not fetch full message for UID {self.uid}")
                 return []
             
-            raw_message = response[self.uid][b'RFC822']
+            raw_message = response[self.uid][b'BODY[]']
             email_msg = email.message_from_bytes(raw_message)
             
             attachments = []
@@ -1488,13 +2520,30 @@ class IMAPMessage:
             log(f"[IMAP] Error loading attachments for UID {self.uid}: {str(e)}")
             return []
     
+    def _fetch(self, data):
+        """FETCH data items of this message - on a pooled session with the folder selected when available"""
+        if self._imap_pool is not None and self.folder:
+            with self._imap_pool.lease(self.folder) as imap:
+                return imap.fetch([self.uid], data)
+        return self._imap_connection.fetch([self.uid], data)
+    
+    def _make_part_loader(self, part):
+        """Return a function downloading and decoding a single MIME part"""
+        def load():
+            section_key = f'BODY[{part.section}]'.encode()
+            log(f"[IMAP] Fetching part {part.section} ({part.filename}, {part.size} bytes) of UID {self.uid}")
+            response = self._fetch([f'BODY.PEEK[{part.section}]'])
+            data = response.get(self.uid, {}).get(section_key)
+            return decode_part_content(data, part.encoding)
+        return load
+    
     def _load_body(self):
         """Load message body from IMAP message"""
         try:
             log(f"[IMAP] Loading body for message UID {self.uid}")
             
-            # Try to get just the text parts first
-            response = self._imap_connection.fetch([self.uid], ['BODY[TEXT]'])
+            # Try to get just the text parts first (PEEK keeps the \Seen flag unchanged)
+            response = self._fetch(['BODY.PEEK[TEXT]'])
             if self.uid in response and b'BODY[TEXT]' in response[self.uid]:
                 body_text = response[self.uid][b'BODY[TEXT]']
                 if isinstance(body_text, bytes):
@@ -1502,11 +2551,11 @@ class IMAPMessage:
                 return str(body_text)
             
             # Fallback to full message
-            response = self._imap_connection.fetch([self.uid], ['RFC822'])
+            response = self._fetch(['BODY.PEEK[]'])
             if self.uid not in response:
                 return ""
             
-            raw_message = response[self.uid][b'RFC822']
+            raw_message = response[self.uid][b'BODY[]']
             email_msg = email.message_from_bytes(raw_message)
             
             # Extract text content
@@ -1530,11 +2579,25 @@ class IMAPMessage:
 
 
 class IMAPAttachment:
-    """Attachment object for IMAP messages"""
-    def __init__(self, name, content):
+    """Attachment object for IMAP messages
+    
+    Content is either given directly or downloaded by `loader` on first access.
+    """
+    def __init__(self, name, content=None, size=None, loader=None):
         self.name = name
-        self.content = content
-        self.size = len(content) if content else 0
+        self._content = content
+        self._loader = loader
+        self.size = size if size is not None else (len(content) if content else 0)
+    
+    @property
+    def content(self):
+        if self._content is None and self._loader is not None:
+            try:
+                self._content = self._loader()
+            except Exception as e:
+                log(f"[IMAP] Error fetching attachment {self.name}: {str(e)}")
+            self._loader = None
+        return self._content
     
     def __str__(self):
         return f"IMAPAttachment(name={self.name}, size={self.size})"
@@ -1543,7 +2606,8 @@ class IMAPAttachment:
 class POP3Message:
     """Message object for POP3 messages, compatible with Exchange Message interface"""
     def __init__(self, message_num, subject, sender, datetime_received, is_read, has_attachments,
-                 pop3_connection, email_message):
+                 pop3_connection, email_message, attachment_manifest=None, uidl=None, message_cache=None,
+                 account_key=None):
         self.id = message_num
         self.message_num = message_num
         self.subject = subject
@@ -1555,6 +2619,11 @@ class POP3Message:
         self.has_attachments = has_attachments
         self._pop3_connection = pop3_connection
         self._email_message = email_message
+        self.attachment_manifest = attachment_manifest
+        self.uidl = uidl
+        self._message_cache = message_cache
+        self._account_key = account_key
+        self._raw_message = None
         self._attachments = None
         self._body = None
     
@@ -1572,6 +2641,20 @@ class POP3Message:
             self._body = self._load_body()
         return self._body
     
+    def _retrieve(self):
+        """Raw message - retrieved once (from the local cache or with RETR) for body and attachments"""
+        if self._raw_message is None:
+            if self._message_cache is not None and self.uidl:
+                self._raw_message = self._message_cache.get_message(self._account_key, self.uidl)
+            if self._raw_message is None:
+                response = self._pop3_connection.retr(self.message_num)
+                if not response:
+                    return None
+                self._raw_message = b'\n'.join(response[1])
+                if self._message_cache is not None and self.uidl:
+                    self._message_cache.store_message(self._account_key, self.uidl, self._raw_message)
+        return self._raw_message
+    
     def _load_attachments(self):
         """Load attachments from POP3 message"""
         try:
@@ -1581,11 +2664,10 @@ class POP3Message:
             log(f"[POP3] Loading attachments for message {self.message_num}")
             
             # Get full message
-            response = self._pop3_connection.retr(self.message_num)
-            if not response:
+            full_message = self._retrieve()
+            if not full_message:
                 return []
             
-            full_message = b'\n'.join(response[1])
             email_msg = email.message_from_bytes(full_message)
             
             attachments = []
@@ -1612,11 +2694,10 @@ class POP3Message:
             log(f"[POP3] Loading body for message {self.message_num}")
             
             # Get full message
-            response = self._pop3_connection.retr(self.message_num)
-            if not response:
+            full_message = self._retrieve()
+            if not full_message:
                 return ""
             
-            full_message = b'\n'.join(response[1])
             email_msg = email.message_from_bytes(full_message)
             
             # Extract text content
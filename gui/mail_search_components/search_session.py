@@ -0,0 +1,119 @@
+"""
+Search session cache for mail search pagination
+Keeps the ordered, already filtered results of the last search so page changes
+do not repeat folder queries, attachment checks and PDF/OCR scans
+"""
+import json
+import threading
+import time
+from tools.logger import log
+
+
+# Criteria keys that do not change which messages match (UI/performance settings)
+SESSION_IGNORED_CRITERIA = ('password', 'stream_results', 'folder_search_workers', 'index_pdf_text',
+                            'pdf_download_workers', 'pdf_extract_workers', 'pdf_ocr_workers')
+
+
+class SearchSession:
+    """Ordered filtered messages of one search together with their folder paths and PDF matches"""
+
+    def __init__(self, signature, filtered_messages, folder_map, pdf_matches, max_total_messages, from_index=False,
+                 pending=None):
+        """
+        Args:
+            signature: Account/criteria signature from build_signature()
+            filtered_messages: Messages that passed all filters, newest first
+            folder_map: Message key -> display folder path
+            pdf_matches: Message key -> PDF match info (only for PDF searches)
+            max_total_messages: Window limit used when the session was built
+            from_index: Results come from the local mail index (no server objects to fetch)
+            pending: For a search that stopped once its pages were full - pending(needed, on_pass)
+                filters further messages of the window, calls on_pass(message, folder_path, pdf_match_info)
+                for each result and returns False once the window is consumed
+        """
+        self.signature = signature
+        self.filtered_messages = list(filtered_messages)
+        self.folder_map = {}
+        self.pdf_matches = {}
+        for message in self.filtered_messages:
+            message_key = getattr(message, 'id', id(message))
+            if message_key in folder_map:
+                self.folder_map[message_key] = folder_map[message_key]
+            if message_key in pdf_matches:
+                self.pdf_matches[message_key] = pdf_matches[message_key]
+        self.max_total_messages = max_total_messages
+        self.from_index = from_index
+        self.pending = pending
+        self.created_at = time.time()
+
+    @property
+    def total_count(self):
+        return len(self.filtered_messages)
+
+    @property
+    def has_more(self):
+        """More results may follow the known ones (the search window is not consumed yet)"""
+        return self.pending is not None
+
+    def fill(self, count):
+        """Continue the search until `count` results are known or the search window is consumed"""
+        if self.pending is None or len(self.filtered_messages) >= count:
+            return
+        log(f"Sesja wyszukiwania: filtrowanie kolejnych wiadomości (znane wyniki: {self.total_count}, potrzebne: {count})")
+        if not self.pending(count - len(self.filtered_messages), self._add_result):
+            self.pending = None
+
+    def _add_result(self, message, folder_path, pdf_match_info=None):
+        message_key = getattr(message, 'id', id(message))
+        self.filtered_messages.append(message)
+        self.folder_map[message_key] = folder_path
+        if pdf_match_info:
+            self.pdf_matches[message_key] = pdf_match_info
+
+    @staticmethod
+    def build_signature(account_config, criteria):
+        """Build a stable signature of the account and the criteria that affect matching"""
+        account_part = {}
+        if account_config:
+            account_part = {
+                'name': account_config.get('name'),
+                'email': account_config.get('email'),
+                'type': account_config.get('type')
+            }
+        criteria_part = {k: v for k, v in criteria.items() if k not in SESSION_IGNORED_CRITERIA}
+        return json.dumps({'account': account_part, 'criteria': criteria_part}, sort_keys=True, default=str)
+
+    def matches(self, signature, max_total_messages):
+        """Check whether this session can serve a page for the given signature and window"""
+        return self.signature == signature and max_total_messages <= self.max_total_messages
+
+    def get_page(self, start_idx, end_idx):
+        """Return messages for a page slice"""
+        return self.filtered_messages[start_idx:end_idx]
+
+
+class SearchSessionStore:
+    """Thread-safe holder for the current search session"""
+
+    def __init__(self):
+        self._session = None
+        self._lock = threading.Lock()
+
+    def get(self, signature, max_total_messages):
+        """Return the current session if it matches, otherwise None"""
+        with self._lock:
+            if self._session and self._session.matches(signature, max_total_messages):
+                return self._session
+            return None
+
+    def store(self, session):
+        with self._lock:
+            self._session = session
+        log(f"Zapisano sesję wyszukiwania: {session.total_count} wyników")
+
+    def reset(self):
+        with self._lock:
+            had_session = self._session is not None
+            self._session = None
+        if had_session:
+            log("Wyczyszczono sesję wyszukiwania")
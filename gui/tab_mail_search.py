@@ -6,7 +6,9 @@ import json
 import os
 
 from gui.mail_search_components.mail_connection import MailConnection
-from gui.mail_search_components.search_engine import EmailSearchEngine
+from gui.mail_search_components.imap_pool import close_all_pools
+from gui.mail_search_components.pop3_cache import close_pop3_caches
+from gui.mail_search_components.search_engine import EmailSearchEngine, DEFAULT_FOLDER_SEARCH_WORKERS
 from gui.mail_search_components.results_display import ResultsDisplay
 from gui.mail_search_components.ui_builder import MailSearchUI
 
@@ -46,6 +48,20 @@ class MailSearchTab(ttk.Frame):
         self.current_page = 0
         self.per_page = 500
         
+        # Number of folders queried concurrently (Exchange), loaded from mail_search_config.json
+        self.folder_search_workers = DEFAULT_FOLDER_SEARCH_WORKERS
+        
+        # Show partial results while the search is still running
+        self.stream_results = True
+        
+        # Answer searches from the local mail index when it is up to date
+        self.use_mail_index = False
+        self.index_pdf_text = False
+        
+        # Search all (or selected) configured accounts at once, each with its own connection
+        self.search_all_accounts = False
+        self.search_account_indexes = None
+        
         # Threading support
         self.result_queue = queue.Queue()
         self.progress_queue = queue.Queue()
@@ -222,6 +238,8 @@ class MailSearchTab(ttk.Frame):
                 
                 account = self.connection.get_main_account()
                 log(f"[FOLDER DISCOVERY] Got account: {account is not None}")
+                # Explicit discovery reloads the cached Exchange folder tree
+                self.connection.refresh_folder_tree()
                 
                 # Update account info display after getting account
                 self.after_idle(self.update_account_info_display)
@@ -317,6 +335,9 @@ class MailSearchTab(ttk.Frame):
         # Reset pagination
         self.current_page = 0
         
+        # New search must query the server again - page changes reuse the cached session
+        self.search_engine.reset_search_session()
+        
         # Update excluded_folders from checkboxes before search
         self.vars['excluded_folders'].set(self._get_excluded_folders_from_checkboxes())
 
@@ -326,7 +347,15 @@ class MailSearchTab(ttk.Frame):
         """Perform search in background thread"""
         try:
             criteria = {key: var.get() if hasattr(var, 'get') else var for key, var in self.vars.items()}
-            self.search_engine.search_emails_threaded(self.connection, criteria, self.current_page, self.per_page)
+            criteria['folder_search_workers'] = self.folder_search_workers
+            criteria['stream_results'] = self.stream_results
+            criteria['use_index'] = self.use_mail_index
+            criteria['index_pdf_text'] = self.index_pdf_text
+            if self.search_all_accounts:
+                self.search_engine.search_all_accounts_threaded(criteria, self.current_page, self.per_page,
+                                                                self.search_account_indexes)
+            else:
+                self.search_engine.search_emails_threaded(self.connection, criteria, self.current_page, self.per_page)
             
         except Exception as e:
             self._add_result({'type': 'search_error', 'error': str(e)})
@@ -375,11 +404,22 @@ class MailSearchTab(ttk.Frame):
                 result.get('page', 0), 
                 result.get('per_page', 500),
                 result.get('total_count', result['count']),
-                result.get('total_pages', 1)
+                result.get('total_pages', 1),
+                result.get('has_more', False)
             )
-            self.status_label.config(text=f"Znaleziono {result.get('total_count', result['count'])} wiadomości", foreground="green")
+            # With has_more the search stopped once the shown pages were full
+            found = f"{result.get('total_count', result['count'])}{'+' if result.get('has_more') else ''}"
+            if result.get('account_errors'):
+                failed_accounts = ', '.join(result['account_errors'])
+                self.status_label.config(text=f"Znaleziono {found} wiadomości (błąd kont: {failed_accounts})", foreground="orange")
+            else:
+                self.status_label.config(text=f"Znaleziono {found} wiadomości", foreground="green")
             self.search_button.config(text="Rozpocznij wyszukiwanie")
             
+        elif result['type'] == 'search_partial':
+            self.results_display.append_results(result['results'])
+            self.status_label.config(text=f"Wyszukiwanie... znaleziono dotąd {self.results_display.total_count} wiadomości", foreground="blue")
+            
         elif result['type'] == 'search_cancelled':
             self.status_label.config(text="Wyszukiwanie anulowane", foreground="orange")
             self.search_button.config(text="Rozpocznij wyszukiwanie")
@@ -431,6 +471,16 @@ class MailSearchTab(ttk.Frame):
                     # Load skip searched PDFs setting
                     skip_searched = config.get("skip_searched_pdfs", False)
                     self.vars['skip_searched_pdfs'].set(skip_searched)
+                    # Load parallel folder search setting
+                    self.folder_search_workers = config.get("folder_search_workers", DEFAULT_FOLDER_SEARCH_WORKERS)
+                    # Load streaming results setting
+                    self.stream_results = config.get("stream_results", True)
+                    # Load mail index settings
+                    self.use_mail_index = config.get("use_mail_index", False)
+                    self.index_pdf_text = config.get("index_pdf_text", False)
+                    # Load multi-account search settings
+                    self.search_all_accounts = config.get("search_all_accounts", False)
+                    self.search_account_indexes = config.get("search_account_indexes")
                     # Excluded folders will be loaded when folders are discovered
         except Exception as e:
             print(f"Błąd ładowania konfiguracji wyszukiwania: {e}")
@@ -448,7 +498,13 @@ class MailSearchTab(ttk.Frame):
                 "excluded_folders": excluded_folders,
                 "exclusion_section_visible": self.exclusion_section_visible,
                 "pdf_save_directory": self.vars['pdf_save_directory'].get(),
-                "skip_searched_pdfs": self.vars['skip_searched_pdfs'].get()
+                "skip_searched_pdfs": self.vars['skip_searched_pdfs'].get(),
+                "folder_search_workers": self.folder_search_workers,
+                "stream_results": self.stream_results,
+                "use_mail_index": self.use_mail_index,
+                "index_pdf_text": self.index_pdf_text,
+                "search_all_accounts": self.search_all_accounts,
+                "search_account_indexes": self.search_account_indexes
             }
             
             with open(MAIL_SEARCH_CONFIG_FILE, "w", encoding='utf-8') as f:
@@ -499,4 +555,7 @@ class MailSearchTab(ttk.Frame):
         """Cleanup on destroy"""
         if self.search_engine.search_thread and self.search_engine.search_thread.is_alive():
             self.search_engine.cancel_search()
+        self.connection.close_connections()
+        close_all_pools()
+        close_pop3_caches()
         super().destroy()
\ No newline at end of file
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared cancellation token used by mail search, PDF processing and OCR.
+"""
+import unittest
+import sys
+import os
+import threading
+import time
+from unittest import mock
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.cancellation import CancellationToken, OperationCancelled
+from tools import ocr_engines
+from gui.mail_search_components.search_engine import EmailSearchEngine
+
+
+def slow_ocr_worker(image, language, engine, **kwargs):
+    time.sleep(30)
+    return "never"
+
+
+class TestCancellationToken(unittest.TestCase):
+
+    def test_callbacks_run_once(self):
+        token = CancellationToken()
+        calls = []
+        token.register(lambda: calls.append("a"))
+        unregister = token.register(lambda: calls.append("b"))
+        unregister()
+
+        token.cancel()
+        token.cancel()
+
+        self.assertEqual(calls, ["a"])
+        self.assertRaises(OperationCancelled, token.raise_if_cancelled)
+        # Registering after cancel runs the callback immediately
+        token.register(lambda: calls.append("c"))
+        self.assertEqual(calls, ["a", "c"])
+
+    def test_engine_shares_token_with_pdf_processor(self):
+        engine = EmailSearchEngine(lambda message: None, lambda result: None)
+
+        engine.cancel_search()
+        self.assertTrue(engine.pdf_processor.search_cancelled)
+
+        # A new search starts with a fresh token for both
+        engine.search_cancelled = False
+        self.assertFalse(engine.pdf_processor.search_cancelled)
+        self.assertIs(engine.pdf_processor.cancellation_token, engine.cancellation_token)
+
+
+class TestOCRBatchCancellation(unittest.TestCase):
+
+    def test_cancel_terminates_workers(self):
+        manager = ocr_engines.OCREngineManager()
+        token = CancellationToken()
+        threading.Timer(0.3, token.cancel).start()
+
+        with mock.patch.object(ocr_engines.ocr_config, 'get_multiprocessing', return_value=True), \
+                mock.patch.object(ocr_engines.ocr_config, 'get_max_workers', return_value=2), \
+                mock.patch.object(ocr_engines.ocr_config, 'get_use_gpu', return_value=False), \
+                mock.patch.object(manager, 'get_current_engine', return_value='tesseract'), \
+                mock.patch.object(ocr_engines, '_ocr_worker', slow_ocr_worker):
+            started = time.time()
+            with self.assertRaises(OperationCancelled):
+                manager.perform_ocr_batch(["page"] * 6, cancellation_token=token)
+
+        self.assertLess(time.time() - started, 2.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Tests for batched GetAttachment downloads of Exchange PDF attachments.
+"""
+import unittest
+import sys
+import os
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from exchangelib.attachments import FileAttachment, ItemAttachment, AttachmentId
+from exchangelib.errors import ErrorServerBusy
+
+from gui.mail_search_components.exchange_attachments import ExchangeAttachmentPrefetcher, is_pdf_attachment
+
+
+class FakeMessage:
+    def __init__(self, attachments):
+        self.attachments = attachments
+
+
+def file_attachment(attachment_id, name, content_type="application/octet-stream", is_inline=False):
+    return FileAttachment(name=name, content_type=content_type, is_inline=is_inline,
+                          attachment_id=AttachmentId(id=attachment_id))
+
+
+class FakeGetAttachment:
+    """Records requested attachment ids, answers ErrorServerBusy for the first `busy` calls"""
+
+    def __init__(self, busy=0):
+        self.busy = busy
+        self.calls = []
+
+    def __call__(self, account, attachment_ids):
+        self.calls.append([attachment_id.id for attachment_id in attachment_ids])
+        if self.busy:
+            self.busy -= 1
+            raise ErrorServerBusy("The server cannot service this request right now", back_off=2)
+        return [FileAttachment(name=attachment_id.id, content=f"%PDF {attachment_id.id}".encode())
+                for attachment_id in attachment_ids]
+
+
+class TestExchangeAttachmentPrefetch(unittest.TestCase):
+
+    def test_only_pdf_file_attachments_in_batches(self):
+        messages = [FakeMessage([file_attachment(f"pdf{i}", f"faktura{i}.PDF"),
+                                 file_attachment(f"bin{i}", "skan", content_type="application/pdf"),
+                                 file_attachment(f"img{i}", "logo.png", content_type="image/png", is_inline=True),
+                                 file_attachment(f"xls{i}", "zestawienie.xlsx"),
+                                 ItemAttachment(name="Przekazana wiadomość.pdf")])
+                    for i in range(5)]
+        fetch = FakeGetAttachment()
+        prefetcher = ExchangeAttachmentPrefetcher(None, batch_size=4, fetch=fetch)
+
+        yielded = list(prefetcher.iter_prefetched(messages))
+
+        self.assertEqual(yielded, messages)
+        self.assertEqual([len(call) for call in fetch.calls], [4, 4, 2])
+        self.assertEqual(fetch.calls[0], ["pdf0", "bin0", "pdf1", "bin1"])
+        self.assertEqual(messages[4].attachments[1].content, b"%PDF bin4")
+        self.assertEqual(prefetcher.stats['attachments'], 10)
+        self.assertFalse(is_pdf_attachment(messages[0].attachments[4]))
+
+    def test_server_busy_backs_off_with_smaller_batches(self):
+        messages = [FakeMessage([file_attachment(f"pdf{i}", f"faktura{i}.pdf")]) for i in range(6)]
+        fetch = FakeGetAttachment(busy=1)
+        waits = []
+        prefetcher = ExchangeAttachmentPrefetcher(None, batch_size=6, fetch=fetch, sleep=waits.append)
+
+        prefetcher.prefetch([m.attachments[0] for m in messages])
+
+        self.assertEqual([len(call) for call in fetch.calls], [6, 3, 3])
+        self.assertAlmostEqual(sum(waits), 2, delta=0.1)
+        self.assertEqual((prefetcher.stats['busy'], prefetcher.stats['attachments']), (1, 6))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Tests for the compiled, cost-ordered local filter pipeline.
+"""
+import unittest
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gui.mail_search_components.filter_pipeline import compile_filter_pipeline, STAGE_HEADER, STAGE_ATTACHMENTS, STAGE_PDF
+
+
+class FakeSender:
+    def __init__(self, email_address, name=None):
+        self.email_address = email_address
+        self.name = name
+
+    def __str__(self):
+        return self.name or self.email_address
+
+
+class CountingMessage:
+    """Message that records access to expensive attributes"""
+
+    def __init__(self, subject, attachment_names=(), sender="faktury@example.com", days_ago=0, body=""):
+        self.id = subject
+        self.subject = subject
+        self.sender = FakeSender(sender, "Biuro Rachunkowe")
+        self.datetime_received = datetime.now(timezone.utc) - timedelta(days=days_ago)
+        self.has_attachments = bool(attachment_names)
+        self._attachments = [type('Attachment', (), {'name': name})() for name in attachment_names]
+        self.body = body
+        self.attachment_loads = 0
+
+    @property
+    def attachments(self):
+        self.attachment_loads += 1
+        return self._attachments
+
+
+class FakeEngine:
+    def __init__(self):
+        self.pdf_checks = []
+
+    def _check_pdf_content(self, message, search_text, skip_searched_pdfs=False):
+        self.pdf_checks.append(message.id)
+        return {'found': message.id.endswith("ok"), 'attachments': [{'name': 'a.pdf'}]}
+
+    def _get_period_start_date(self, period):
+        return datetime.now(timezone.utc) - timedelta(days=7)
+
+
+class TestFilterPipeline(unittest.TestCase):
+
+    def test_cheap_stages_reject_before_attachments_and_pdf(self):
+        engine = FakeEngine()
+        pipeline = compile_filter_pipeline({
+            'subject_search': 'Faktura', 'attachment_extension': 'pdf', 'pdf_search_text': '123'
+        }, engine, "exchange")
+        rejected_by_subject = CountingMessage("Oferta", ["oferta.pdf"])
+        rejected_by_name = CountingMessage("Faktura zip", ["faktura.zip"])
+        accepted = CountingMessage("Faktura ok", ["faktura.pdf"])
+
+        results = [pipeline.evaluate(m) for m in (rejected_by_subject, rejected_by_name, accepted)]
+
+        self.assertEqual([passed for passed, _ in results], [False, False, True])
+        self.assertEqual(rejected_by_subject.attachment_loads, 0)
+        self.assertEqual(engine.pdf_checks, ["Faktura ok"])
+        self.assertEqual(results[2][1][STAGE_PDF]['attachments'][0]['name'], 'a.pdf')
+        self.assertEqual([stage.name for stage in pipeline.stages], [STAGE_HEADER, STAGE_ATTACHMENTS, STAGE_PDF])
+        self.assertEqual([(s.evaluated, s.rejected) for s in pipeline.stages], [(3, 1), (2, 1), (1, 0)])
+
+    def test_sender_address_filtered_locally_only_for_pop3(self):
+        criteria = {'sender': 'inny@example.com'}
+        message = CountingMessage("Faktura")
+
+        self.assertTrue(compile_filter_pipeline(criteria, FakeEngine(), "exchange").evaluate(message)[0])
+        self.assertFalse(compile_filter_pipeline(criteria, FakeEngine(), "pop3_smtp").evaluate(message)[0])
+
+    def test_sender_fragment_matches_name(self):
+        pipeline = compile_filter_pipeline({'sender': 'rachunkowe'}, FakeEngine(), "imap_smtp")
+
+        self.assertTrue(pipeline.evaluate(CountingMessage("Faktura"))[0])
+
+    def test_pop3_period_and_body_checked_locally(self):
+        pipeline = compile_filter_pipeline({'selected_period': 'ostatni_tydzien', 'body_search': 'kwota'},
+                                           FakeEngine(), "pop3_smtp")
+
+        self.assertTrue(pipeline.evaluate(CountingMessage("A", days_ago=1, body="Kwota 100"))[0])
+        self.assertFalse(pipeline.evaluate(CountingMessage("B", days_ago=30, body="Kwota 100"))[0])
+        self.assertFalse(pipeline.evaluate(CountingMessage("C", days_ago=1, body="brak"))[0])
+
+    def test_prefilter_skips_expensive_stages(self):
+        engine = FakeEngine()
+        pipeline = compile_filter_pipeline({'subject_search': 'faktura', 'pdf_search_text': 'x'}, engine, "exchange")
+
+        self.assertTrue(pipeline.prefilter(CountingMessage("Faktura"), STAGE_ATTACHMENTS))
+        self.assertEqual(engine.pdf_checks, [])
+        self.assertEqual(pipeline.stages[0].evaluated, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Tests for IMAP COMPRESS=DEFLATE streams and their transfer counters.
+"""
+import unittest
+import sys
+import os
+import socket
+import zlib
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gui.mail_search_components.imap_compression import TransferStats, enable_compression
+
+
+class FakeIMAP4:
+    """imaplib.IMAP4 stand-in: a socket, its reader and send()"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.file = sock.makefile('rb')
+        self.commands = []
+
+    def xatom(self, name, *args):
+        self.commands.append((name,) + args)
+        return 'OK', [b'DEFLATE active']
+
+    def send(self, data):
+        self.sock.sendall(data)
+
+
+class FakeIMAPClient:
+    def __init__(self, sock, capabilities):
+        self._imap = FakeIMAP4(sock)
+        self.capabilities = capabilities
+
+    def has_capability(self, name):
+        return name in self.capabilities
+
+
+class TestDeflateCompression(unittest.TestCase):
+
+    def setUp(self):
+        self.client_sock, self.server_sock = socket.socketpair()
+
+    def tearDown(self):
+        self.client_sock.close()
+        self.server_sock.close()
+
+    def test_compressed_session_round_trip(self):
+        stats = TransferStats()
+        imap = FakeIMAPClient(self.client_sock, {'COMPRESS=DEFLATE'})
+
+        self.assertTrue(enable_compression(imap, stats))
+        self.assertEqual(imap._imap.commands, [('COMPRESS', 'DEFLATE')])
+
+        # Server -> client: a highly compressible FETCH response
+        lines = [b'* %d FETCH (UID %d ENVELOPE ("Tue, 1 Jul 2025" "Faktura" NIL NIL))\r\n' % (i, i)
+                 for i in range(1, 501)]
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self.server_sock.sendall(compressor.compress(b"".join(lines)) + compressor.flush(zlib.Z_SYNC_FLUSH))
+        received = [imap._imap.file.readline() for _ in lines]
+        self.assertEqual(received, lines)
+
+        # Client -> server: commands are deflated with a sync flush
+        imap._imap.send(b'A1 UID FETCH 1:500 (FLAGS)\r\n')
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        self.assertEqual(decompressor.decompress(self.server_sock.recv(4096)), b'A1 UID FETCH 1:500 (FLAGS)\r\n')
+
+        counters = stats.snapshot()
+        self.assertEqual(counters['data_in'], len(b"".join(lines)))
+        wire, data, saved = TransferStats.saving(counters)
+        self.assertLess(wire, data // 5)
+        self.assertGreater(saved, 80)
+
+    def test_not_negotiated_without_capability(self):
+        imap = FakeIMAPClient(self.client_sock, set())
+        original_file = imap._imap.file
+
+        self.assertFalse(enable_compression(imap, TransferStats()))
+        self.assertIs(imap._imap.file, original_file)
+        self.assertEqual(imap._imap.commands, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Tests for the CONDSTORE based IMAP header cache used by repeated searches.
+"""
+import unittest
+import sys
+import os
+from datetime import timedelta
+from itertools import islice
+from types import SimpleNamespace
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gui.mail_search_components.imap_header_cache import IMAPHeaderCache
+from gui.mail_search_components import search_engine
+from gui.mail_search_components.search_engine import EmailSearchEngine
+from gui.mail_search_components.imap_utils import expand_sequence_set
+
+from tests.test_mail_index import BASE_DATE, FakeEnvelope
+
+
+class CondstoreIMAP:
+    """Fake CONDSTORE server: FLAGS per UID with the mod-sequence of their last change"""
+
+    def __init__(self, uids):
+        self.uidvalidity = 7
+        self.modseq = 100
+        self.flags = {uid: ((), self.modseq) for uid in uids}
+        self.fetches = []
+
+    def has_capability(self, name):
+        return name in ('CONDSTORE', 'ENABLE')
+
+    def enable(self, *capabilities):
+        return list(capabilities)
+
+    def select_folder(self, folder, readonly=False):
+        return {b'UIDVALIDITY': self.uidvalidity, b'HIGHESTMODSEQ': self.modseq}
+
+    def search(self, criteria):
+        return sorted(self.flags)
+
+    def set_flags(self, uid, flags):
+        self.modseq += 1
+        self.flags[uid] = (flags, self.modseq)
+
+    def fetch(self, uid_set, data, modifiers=None):
+        self.fetches.append((data, modifiers))
+        changed_since = int(modifiers[0].split()[1]) if modifiers else None
+        response = {}
+        for uid in expand_sequence_set(uid_set):
+            if uid not in self.flags:
+                continue
+            flags, modseq = self.flags[uid]
+            if changed_since is not None and modseq <= changed_since:
+                continue
+            item = {b'FLAGS': flags, b'MODSEQ': (modseq,)}
+            if 'ENVELOPE' in data:
+                item.update({b'ENVELOPE': FakeEnvelope(f"Wiadomość {uid}", BASE_DATE - timedelta(minutes=uid)),
+                             b'RFC822.SIZE': 100, b'BODYSTRUCTURE': None})
+            response[uid] = item
+        return response
+
+
+class TestIMAPHeaderCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = IMAPHeaderCache()
+        self.original_cache = search_engine.header_cache
+        search_engine.header_cache = self.cache
+        self.engine = EmailSearchEngine(lambda message: None, lambda result: None)
+
+    def tearDown(self):
+        search_engine.header_cache = self.original_cache
+
+    def search(self, imap):
+        return self.engine._search_imap_folder(imap, "INBOX", {}, 100, account_key="imap_smtp:test@example.com")
+
+    def test_second_search_fetches_only_changes(self):
+        imap = CondstoreIMAP(range(1, 21))
+        first = self.search(imap)
+        self.assertEqual(len(first), 20)
+        self.assertFalse(any(m.is_read for m in first))
+
+        imap.fetches = []
+        imap.set_flags(5, (b'\\Seen',))
+        imap.flags[21] = ((), imap.modseq)
+        second = self.search(imap)
+
+        # One CHANGEDSINCE fetch for flags, full headers only for the new UID
+        self.assertEqual(imap.fetches, [(['FLAGS'], ['CHANGEDSINCE 100']),
+                                        (['ENVELOPE', 'FLAGS', 'RFC822.SIZE', 'BODYSTRUCTURE'], None)])
+        self.assertEqual(len(second), 21)
+        self.assertEqual([m.uid for m in second if m.is_read], [5])
+
+    def test_uidvalidity_change_and_missing_modseq(self):
+        imap = CondstoreIMAP(range(1, 4))
+        key = ("account", "INBOX")
+        entry = self.cache.refresh(imap, key, imap.select_folder("INBOX"))
+        entry.store({1: {b'FLAGS': ()}})
+
+        self.assertIs(self.cache.refresh(imap, key, imap.select_folder("INBOX")), entry)
+        imap.uidvalidity = 8
+        self.assertEqual(self.cache.refresh(imap, key, imap.select_folder("INBOX")).messages, {})
+        self.assertIsNone(self.cache.refresh(imap, key, {b'UIDVALIDITY': 8}))
+
+
+
+class MissingFolderIMAP(CondstoreIMAP):
+    """Only INBOX can be selected - other folders fall back to it"""
+
+    def select_folder(self, folder, readonly=False):
+        if folder != "INBOX":
+            raise Exception(f"NO [NONEXISTENT] {folder}")
+        return super().select_folder(folder, readonly)
+
+
+class TestFolderMatchCount(unittest.TestCase):
+    """The exact match count reported by the server is read back for the searched folder"""
+
+    def setUp(self):
+        self.original_cache = search_engine.header_cache
+        search_engine.header_cache = IMAPHeaderCache()
+        self.engine = EmailSearchEngine(lambda message: None, lambda result: None)
+
+    def tearDown(self):
+        search_engine.header_cache = self.original_cache
+
+    def test_count_of_fallback_folder_is_read_back(self):
+        connection = SimpleNamespace(imap_connection=MissingFolderIMAP(range(1, 21)),
+                                     current_account_config={"type": "imap_smtp", "email": "test@example.com"})
+
+        messages, folder_result, _ = self.engine._search_single_folder(
+            "Faktury", 0, 1, connection, "imap_smtp", None, {}, 5)
+
+        self.assertEqual(len(messages), 5)
+        self.assertEqual(folder_result['original_count'], 20)
+        self.assertEqual(self.engine.imap_match_counts, {})
+
+
+class TestFolderCursor(unittest.TestCase):
+    """Headers beyond the first batch of a folder are fetched only when its stream reaches them"""
+
+    def setUp(self):
+        self.original_cache = search_engine.header_cache
+        search_engine.header_cache = IMAPHeaderCache()
+        self.engine = EmailSearchEngine(lambda message: None, lambda result: None)
+
+    def tearDown(self):
+        search_engine.header_cache = self.original_cache
+
+    def test_older_messages_are_fetched_on_demand(self):
+        imap = CondstoreIMAP(range(1, 21))
+        connection = SimpleNamespace(imap_connection=imap, imap_pool=None,
+                                     current_account_config={"type": "imap_smtp", "email": "test@example.com"})
+        self.engine.search_connection = connection
+
+        def header_fetches():
+            return len([data for data, _ in imap.fetches if 'ENVELOPE' in data])
+
+        messages, folder_result, stream = self.engine._search_single_folder(
+            "INBOX", 0, 1, connection, "imap_smtp", None, {}, 20, 5)
+
+        self.assertEqual(len(messages), 5)
+        self.assertEqual(folder_result['original_count'], 20)
+        self.assertEqual(header_fetches(), 1)
+
+        taken = [message for message, _ in islice(stream, 7)]
+        self.assertEqual(header_fetches(), 2)
+        taken.extend(message for message, _ in stream)
+        self.assertEqual(sorted(m.uid for m in taken), list(range(1, 21)))
+        self.assertEqual(header_fetches(), 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Tests for the pooled IMAP sessions (reuse, keepalive checks, reconnect on drop).
+"""
+import unittest
+import sys
+import os
+from unittest import mock
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gui.mail_search_components import imap_pool
+from gui.mail_search_components.imap_pool import IMAPConnectionPool
+from gui.mail_search_components.search_engine import EmailSearchEngine
+
+
+class FakeIMAPSession:
+    def __init__(self, number):
+        self.number = number
+        self.selected = []
+        self.alive = True
+        self.logged_out = False
+
+    def noop(self):
+        if not self.alive:
+            raise OSError("connection reset")
+
+    def select_folder(self, folder, readonly=False):
+        self.selected.append(folder)
+
+    def logout(self):
+        self.logged_out = True
+
+
+class TestIMAPConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.sessions = []
+
+        def connect():
+            session = FakeIMAPSession(len(self.sessions) + 1)
+            self.sessions.append(session)
+            return session
+
+        self.pool = IMAPConnectionPool({"imap_server": "imap.example.com"}, max_size=2, connect=connect,
+                                       keepalive_interval=0)
+
+    def test_sessions_are_reused_and_folder_selected_once(self):
+        for _ in range(3):
+            with self.pool.lease("INBOX") as imap:
+                self.assertEqual(imap.number, 1)
+        # A session released without a known folder is selected again
+        self.pool.release(self.pool.acquire())
+        with self.pool.lease("INBOX") as imap:
+            pass
+
+        self.assertEqual(len(self.sessions), 1)
+        self.assertEqual(self.sessions[0].selected, ["INBOX", "INBOX"])
+        self.assertEqual(self.pool.stats['reused'], 4)
+
+    def test_dropped_session_is_replaced(self):
+        with self.pool.lease() as imap:
+            pass
+        imap.alive = False
+
+        with mock.patch.object(imap_pool, 'IMAP_HEALTH_CHECK_AFTER', -1):
+            with self.pool.lease() as replacement:
+                self.assertEqual(replacement.number, 2)
+        self.assertTrue(imap.logged_out)
+
+        # A connection error inside a lease drops that session too
+        with self.assertRaises(OSError):
+            with self.pool.lease() as imap:
+                raise OSError("broken pipe")
+        with self.pool.lease() as imap:
+            self.assertEqual(imap.number, 3)
+
+    def test_lease_waits_for_free_session(self):
+        first = self.pool.acquire()
+        second = self.pool.acquire()
+        self.assertRaises(TimeoutError, self.pool.acquire, 0.05)
+
+        self.pool.release(first)
+        self.assertIs(self.pool.acquire(0.05), first)
+        self.pool.release(second)
+        self.pool.close()
+        self.assertTrue(second.logged_out)
+
+
+class TestPooledFolderSearch(unittest.TestCase):
+
+    def test_folder_workers_limited_by_pool(self):
+        engine = EmailSearchEngine(lambda message: None, lambda result: None)
+        pool = IMAPConnectionPool({}, max_size=3, connect=lambda: FakeIMAPSession(1))
+
+        # One pooled session stays with the search connection
+        self.assertEqual(engine._get_folder_worker_count({}, "imap_smtp", 10, pool), 2)
+        self.assertEqual(engine._get_folder_worker_count({}, "imap_smtp", 10), 1)
+        self.assertEqual(engine._get_folder_worker_count({}, "pop3_smtp", 10, pool), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
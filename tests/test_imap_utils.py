@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Tests for IMAP UID sequence sets, adaptive FETCH batch sizing, SORT/ESEARCH, BODYSTRUCTURE parsing,
+attachment manifests and header decoding.
+"""
+import unittest
+import sys
+import os
+import email
+from datetime import timedelta
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from imapclient.response_parser import parse_fetch_response
+
+from gui.mail_search_components.imap_utils import (AdaptiveBatchSizer, compress_uid_set, parse_bodystructure,
+                                                   mime_attachment_manifest, expand_sequence_set,
+                                                   parse_esearch_response, search_newest, decode_header_value,
+                                                   _decode_header_text)
+from gui.mail_search_components.filter_pipeline import _attachment_matches
+from gui.mail_search_components.search_engine import EmailSearchEngine, IMAPMessage
+
+from tests.test_mail_index import BASE_DATE, FakeEnvelope
+
+
+class SequenceSetIMAP:
+    """Fake IMAP server answering UID FETCH for sequence sets"""
+
+    def __init__(self, uids):
+        self.uids = set(uids)
+        self.fetch_sets = []
+
+    def fetch(self, uid_set, data):
+        self.fetch_sets.append(uid_set)
+        return {
+            uid: {b'ENVELOPE': FakeEnvelope(f"Wiadomość {uid}", BASE_DATE - timedelta(minutes=uid)),
+                  b'FLAGS': [], b'RFC822.SIZE': 100, b'BODYSTRUCTURE': None}
+            for uid in expand_sequence_set(uid_set) if uid in self.uids
+        }
+
+
+SAMPLE_BODYSTRUCTURE = (
+    b'1 (UID 5 BODYSTRUCTURE ((("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL "7BIT" 10 1 NIL NIL NIL)'
+    b'("TEXT" "HTML" ("CHARSET" "utf-8") NIL NIL "QUOTED-PRINTABLE" 20 1 NIL NIL NIL) "ALTERNATIVE" ("BOUNDARY" "x") NIL NIL)'
+    b'("APPLICATION" "PDF" ("NAME" "fv.pdf") NIL NIL "BASE64" 1000 NIL ("ATTACHMENT" ("FILENAME" "fv.pdf")) NIL)'
+    b'("IMAGE" "PNG" ("NAME" "logo.png") "<logo>" NIL "BASE64" 500 NIL ("INLINE" ("FILENAME" "logo.png")) NIL)'
+    b' "MIXED" ("BOUNDARY" "y") NIL NIL))'
+)
+
+
+class PartFetchIMAP:
+    """Fake IMAP server that records FETCH data items and serves single MIME parts"""
+
+    def __init__(self, parts):
+        self.parts = parts
+        self.fetched_items = []
+
+    def fetch(self, uids, data):
+        self.fetched_items.extend(data)
+        response = {}
+        for item in data:
+            section = item[len('BODY.PEEK['):-1]
+            if section in self.parts:
+                response[f'BODY[{section}]'.encode()] = self.parts[section]
+        return {uid: response for uid in uids}
+
+
+class TestSequenceSets(unittest.TestCase):
+
+    def test_compress_uid_set(self):
+        self.assertEqual(compress_uid_set([9, 1, 2, 3, 7, 10, 3]), "1:3,7,9:10")
+        self.assertEqual(compress_uid_set(range(1000, 2000)), "1000:1999")
+        self.assertEqual(compress_uid_set([5]), "5")
+        self.assertEqual(compress_uid_set([]), "")
+
+
+class ExtendedSearchIMAP:
+    """Fake IMAP server with configurable capabilities recording extended SEARCH/SORT commands"""
+
+    def __init__(self, capabilities, responses):
+        self.capabilities = capabilities
+        self.responses = list(responses)
+        self.commands = []
+
+    def has_capability(self, name):
+        return name in self.capabilities
+
+    def _raw_command_untagged(self, command, args, response_name=None, unpack=False):
+        self.commands.append((command, args))
+        return self.responses.pop(0)
+
+    def search(self, criteria):
+        self.commands.append((b"SEARCH", criteria))
+        return list(range(1, 101))
+
+
+class TestServerSideSearch(unittest.TestCase):
+
+    def test_parse_esearch(self):
+        self.assertEqual(expand_sequence_set("9,1:3,7:5"), [9, 1, 2, 3, 7, 6, 5])
+        self.assertEqual(parse_esearch_response(b'(TAG "A1") UID COUNT 23 MIN 1 MAX 50 ALL 1:3,50'),
+                         {'COUNT': 23, 'MIN': 1, 'MAX': 50, 'ALL': [1, 2, 3, 50]})
+        self.assertEqual(parse_esearch_response(b'(TAG "A1") UID COUNT 0 PARTIAL (1:10 NIL)'),
+                         {'COUNT': 0, 'PARTIAL': []})
+
+    def test_esort_returns_date_window_and_total(self):
+        imap = ExtendedSearchIMAP({'SORT', 'ESORT', 'CONTEXT=SORT'},
+                                  [b'(TAG "A1") UID COUNT 1200 PARTIAL (1:3 30,29,10)'])
+
+        uids, total, method = search_newest(imap, ['SUBJECT', 'Faktura'], 3)
+
+        self.assertEqual((uids, total, method), ([30, 29, 10], 1200, 'ESORT'))
+        command, args = imap.commands[0]
+        self.assertEqual(command, b"SORT")
+        self.assertEqual(args[:4], [b"RETURN", b"(COUNT PARTIAL 1:3)", b"(REVERSE DATE)", b"UTF-8"])
+
+    def test_esearch_partial_and_plain_fallback(self):
+        imap = ExtendedSearchIMAP({'ESEARCH', 'CONTEXT=SEARCH'},
+                                  [b'(TAG "A1") UID COUNT 500 MIN 3 MAX 900', b'(TAG "A2") UID PARTIAL (491:500 880:884,900)'])
+
+        uids, total, method = search_newest(imap, ['ALL'], 10)
+
+        self.assertEqual((uids[-1], len(uids), total, method), (900, 6, 500, 'ESEARCH'))
+        self.assertEqual(imap.commands[1][1][1], b"(PARTIAL 491:500)")
+
+        plain = ExtendedSearchIMAP(set(), [])
+        self.assertEqual(search_newest(plain, ['ALL'], 10), (list(range(91, 101)), 100, 'SEARCH'))
+
+
+class TestAdaptiveBatchSizer(unittest.TestCase):
+
+    def test_grows_on_fast_round_trips_and_shrinks_on_slow(self):
+        sizer = AdaptiveBatchSizer(initial=50, minimum=25, maximum=400, target_seconds=1.0, target_bytes=1000000)
+
+        self.assertEqual(sizer.record(50, 0.1, 10000), 100)
+        self.assertEqual(sizer.record(100, 0.1, 10000), 200)
+        self.assertEqual(sizer.record(200, 0.1, 10000), 400)
+        self.assertEqual(sizer.record(400, 0.1, 10000), 400)
+        # Too slow - scaled down proportionally
+        self.assertEqual(sizer.record(400, 4.0, 10000), 100)
+        # Too large a response counts like a slow round trip
+        self.assertEqual(sizer.record(100, 0.1, 2000000), 50)
+        # A partial last batch does not change the size
+        self.assertEqual(sizer.record(10, 0.01, 100), 50)
+
+
+class TestIMAPFetchBatches(unittest.TestCase):
+
+    def test_fetch_uses_sequence_sets_and_keeps_order(self):
+        uids = list(range(1, 301)) + [500, 502]
+        imap = SequenceSetIMAP(uids)
+        engine = EmailSearchEngine(lambda message: None, lambda result: None)
+
+        messages = engine._fetch_imap_messages(imap, uids, {})
+
+        self.assertEqual([m.uid for m in messages], uids)
+        # Fast local round trips let the batch grow past the initial 50 UIDs
+        self.assertLess(len(imap.fetch_sets), len(uids) // 50)
+        self.assertEqual(imap.fetch_sets[0], "1:50")
+
+
+class TestBodyStructure(unittest.TestCase):
+
+    def test_parse_sections(self):
+        bodystructure = parse_fetch_response([SAMPLE_BODYSTRUCTURE])[5][b'BODYSTRUCTURE']
+
+        parts = parse_bodystructure(bodystructure)
+
+        self.assertEqual([p.section for p in parts], ["1.1", "1.2", "2", "3"])
+        self.assertEqual([p.content_type for p in parts], ["text/plain", "text/html", "application/pdf", "image/png"])
+        pdf = parts[2]
+        self.assertEqual((pdf.filename, pdf.encoding, pdf.size, pdf.disposition), ("fv.pdf", "base64", 1000, "attachment"))
+        self.assertTrue(pdf.is_pdf)
+        self.assertEqual([p.section for p in parts if p.is_attachment], ["2"])
+
+    def test_message_fetches_only_attachment_part(self):
+        bodystructure = parse_fetch_response([SAMPLE_BODYSTRUCTURE])[5][b'BODYSTRUCTURE']
+        imap = PartFetchIMAP({"2": b"JVBERi0xLjQ="})
+        message = IMAPMessage(5, "Faktura", "a@b.pl", None, True, True, imap, bodystructure=bodystructure)
+
+        attachments = message.attachments
+
+        self.assertEqual([(a.name, a.size) for a in attachments], [("fv.pdf", 1000)])
+        # Listing attachments does not download anything
+        self.assertEqual(imap.fetched_items, [])
+        self.assertEqual(attachments[0].content, b"%PDF-1.4")
+        self.assertEqual(imap.fetched_items, ["BODY.PEEK[2]"])
+
+
+POP3_MESSAGE = b"""From: a@b.pl
+Subject: Faktura
+Content-Type: multipart/mixed; boundary="y"
+
+--y
+Content-Type: text/plain
+
+Tresc
+--y
+Content-Type: application/pdf; name="fv.pdf"
+Content-Disposition: attachment; filename="=?utf-8?q?faktura_=C5=9B.pdf?="
+Content-Transfer-Encoding: base64
+
+JVBERi0xLjQ=
+--y--
+"""
+
+
+class TestAttachmentManifest(unittest.TestCase):
+
+    def test_filters_use_manifest_without_download(self):
+        bodystructure = parse_fetch_response([SAMPLE_BODYSTRUCTURE])[5][b'BODYSTRUCTURE']
+        imap = PartFetchIMAP({"2": b"JVBERi0xLjQ="})
+        message = IMAPMessage(5, "Faktura", "a@b.pl", None, True, True, imap, bodystructure=bodystructure)
+
+        self.assertTrue(_attachment_matches(message, "fv", "pdf"))
+        self.assertFalse(_attachment_matches(message, "", "png"))
+        self.assertEqual(imap.fetched_items, [])
+
+    def test_pop3_top_manifest(self):
+        manifest = mime_attachment_manifest(email.message_from_bytes(POP3_MESSAGE), POP3_MESSAGE)
+
+        self.assertEqual([(p.section, p.content_type, p.filename) for p in manifest],
+                         [("2", "application/pdf", "faktura ś.pdf")])
+
+        # TOP cut the message before its closing boundary - later parts are unknown
+        truncated = POP3_MESSAGE[:POP3_MESSAGE.index(b"--y\nContent-Type: application")]
+        self.assertIsNone(mime_attachment_manifest(email.message_from_bytes(truncated), truncated))
+
+
+class TestHeaderDecoding(unittest.TestCase):
+
+    def test_decodes_encoded_words_and_caches_them(self):
+        _decode_header_text.cache_clear()
+
+        self.assertEqual(decode_header_value(b" Faktura 12/2024 "), "Faktura 12/2024")
+        self.assertEqual(decode_header_value("Jan Kowalski"), "Jan Kowalski")
+        self.assertEqual(decode_header_value(None), "")
+        # Plain ASCII values do not touch the cache
+        self.assertEqual(_decode_header_text.cache_info().currsize, 0)
+
+        for _ in range(3):
+            self.assertEqual(decode_header_value(b"=?utf-8?q?Ksi=C4=99gowo=C5=9B=C4=87?= - faktura"),
+                             "Księgowość - faktura")
+        self.assertEqual(decode_header_value("=?utf-8?b?WmFtw7N3aWVuaWU=?="), "Zamówienie")
+        self.assertEqual(decode_header_value("=?x-unknown?q?abc?="), "abc")
+        self.assertEqual(decode_header_value("Zażółć"), "Zażółć")
+
+        info = _decode_header_text.cache_info()
+        self.assertEqual((info.hits, info.misses), (2, 4))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,11 +9,14 @@ import os
 import json
 import tempfile
 import shutil
+from unittest import mock
 
 # Add parent directory to path to import modules
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from gui.mail_search_components.mail_connection import MailConnection
+from gui.mail_search_components.mail_connection import MailConnection, parse_excluded_folders
+from gui.mail_search_components.exchange_folder_tree import ExchangeFolderTree, invalidate_folder_tree
+from gui.mail_search_components.search_engine import EmailSearchEngine
 
 
 class TestMailConnectionFolderDetection(unittest.TestCase):
@@ -308,5 +311,121 @@ class TestMailConnectionFolderDetection(unittest.TestCase):
         self.assertIn("test@example.com", info)
 
 
+class ListingIMAP:
+    """Fake IMAP server answering LIST with shell-style patterns"""
+
+    def __init__(self, folders, delimiter="/"):
+        self.folders = folders  # {name: flags}
+        self.delimiter = delimiter
+        self.patterns = []
+
+    def list_folders(self, directory="", pattern="*"):
+        import fnmatch
+        self.patterns.append(pattern)
+        return [(flags, self.delimiter.encode(), name) for name, flags in self.folders.items()
+                if fnmatch.fnmatchcase(name, pattern)]
+
+
+class TestIMAPFolderSubtree(unittest.TestCase):
+    """IMAP subfolders come from LIST, with excluded folders and their subtrees skipped"""
+
+    def setUp(self):
+        self.conn = MailConnection()
+        self.conn.current_account_config = {"type": "imap_smtp"}
+
+    def test_subtree_with_exclusions(self):
+        imap = ListingIMAP({
+            "INBOX": (b'\\HasChildren',),
+            "INBOX/Faktury": (),
+            "INBOX/Faktury/2025": (),
+            "INBOX/Spam": (b'\\HasChildren',),
+            "INBOX/Spam/Stare": (),
+            "INBOX/Archiwum": (b'\\Noselect',),
+            "INBOX/Archiwum/2024": (),
+            "Sent": (),
+        })
+
+        folders = self.conn.get_folder_with_subfolders(imap, "Skrzynka odbiorcza", "Spam, INBOX/Faktury/2025")
+
+        self.assertEqual(folders, ["INBOX", "INBOX/Archiwum/2024", "INBOX/Faktury"])
+        self.assertEqual(imap.patterns, ["INBOX", "INBOX/*"])
+
+    def test_parse_excluded_folders(self):
+        self.assertEqual(parse_excluded_folders(" Spam,,Kosz , "), {"Spam", "Kosz"})
+        self.assertEqual(parse_excluded_folders(["Spam", ""]), {"Spam"})
+        self.assertEqual(parse_excluded_folders(None), set())
+
+
+class FakeFolderId:
+    def __init__(self, folder_id):
+        self.id = folder_id
+
+
+class FakeExchangeFolder:
+    """Folder as returned by a deep FindFolder (parent known only by its ID)"""
+
+    def __init__(self, folder_id, name, parent_id=None, total_count=0):
+        self.id = folder_id
+        self.name = name
+        self.parent_folder_id = FakeFolderId(parent_id) if parent_id else None
+        self.total_count = total_count
+        self.unread_count = 0
+
+
+class TestExchangeFolderTree(unittest.TestCase):
+    """Exchange subfolders come from one cached deep traversal"""
+
+    def setUp(self):
+        self.conn = MailConnection()
+        self.conn.current_account_config = {"type": "exchange", "exchange_server": "ex.firma.pl",
+                                            "username": "jan", "email": "jan@firma.pl", "password": "x"}
+        inbox = FakeExchangeFolder("in", "Skrzynka odbiorcza")
+        # Children listed before their parent are attached too
+        self.folders = [FakeExchangeFolder("f24", "2024", "fak", 12),
+                        FakeExchangeFolder("fak", "Faktury", "in", 3),
+                        FakeExchangeFolder("spam", "Spam", "in"),
+                        FakeExchangeFolder("old", "Stare", "spam"),
+                        FakeExchangeFolder("s24", "2024", "spam")]
+        self.loads = []
+
+        def load(account):
+            self.loads.append(account)
+            return ExchangeFolderTree(inbox, self.folders)
+
+        patcher = mock.patch.object(ExchangeFolderTree, 'load', side_effect=load)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(invalidate_folder_tree)
+
+    def test_search_and_discovery_share_one_load(self):
+        folders = self.conn.get_folder_with_subfolders(object(), "Skrzynka odbiorcza", "Spam")
+        self.assertEqual([f.id for f in folders], ["in", "fak", "f24"])
+
+        folders = self.conn.get_folder_with_subfolders(object(), "Skrzynka odbiorcza/faktury", "")
+        self.assertEqual([f.id for f in folders], ["fak", "f24"])
+        self.assertEqual(EmailSearchEngine(lambda m: None, lambda r: None)._get_folder_path(folders[1]),
+                         "/Odebrane/Faktury/2024")
+
+        names = self.conn._get_exchange_available_folders(object(), "Skrzynka odbiorcza")
+        self.assertEqual(names[:4], ["Faktury", "Faktury/2024", "Spam", "Spam/Stare"])
+        self.assertEqual(len(self.loads), 1)
+
+        # "Wykryj foldery" reloads the tree
+        self.conn.refresh_folder_tree()
+        self.conn.get_folder_with_subfolders(object(), "Skrzynka odbiorcza", "")
+        self.assertEqual(len(self.loads), 2)
+
+    def test_exclusion_by_relative_path(self):
+        # A nested folder picked from the discovery list excludes only that folder
+        folders = self.conn.get_folder_with_subfolders(object(), "Skrzynka odbiorcza", "Faktury/2024")
+        self.assertEqual([f.id for f in folders], ["in", "fak", "spam", "old", "s24"])
+
+        # Paths are relative to the searched folder
+        folders = self.conn.get_folder_with_subfolders(object(), "Skrzynka odbiorcza/Spam", "Stare")
+        self.assertEqual([f.id for f in folders], ["spam", "s24"])
+        folders = self.conn.get_folder_with_subfolders(object(), "Skrzynka odbiorcza", "Spam/2024, Stare")
+        self.assertEqual([f.id for f in folders], ["in", "fak", "f24", "spam"])
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
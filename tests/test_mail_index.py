@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Tests for the local SQLite FTS5 mail index and its incremental IMAP sync.
+"""
+import unittest
+import sys
+import os
+import tempfile
+import shutil
+import time
+from unittest import mock
+from datetime import datetime, timedelta, timezone
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gui.mail_search_components.mail_index import MailIndex, MailIndexSyncer, get_account_key
+from gui.mail_search_components.search_engine import EmailSearchEngine
+
+from tests.test_search_engine import FakeConnection, FakeFolder, FakeMessage
+
+
+BASE_DATE = datetime(2025, 7, 1, 12, 0, tzinfo=timezone.utc)
+ACCOUNT = "imap_smtp:test@example.com"
+
+
+def record(key, subject, minutes_ago, **extra):
+    data = {
+        'message_key': key,
+        'subject': subject,
+        'sender_name': 'Biuro',
+        'sender_email': 'faktury@example.com',
+        'datetime_received': BASE_DATE - timedelta(minutes=minutes_ago),
+        'is_read': True,
+        'has_attachments': False,
+        'attachment_names': [],
+        'body': ''
+    }
+    data.update(extra)
+    return data
+
+
+class FakeAddress:
+    def __init__(self, name, mailbox, host):
+        self.name = name
+        self.mailbox = mailbox
+        self.host = host
+
+
+class FakeEnvelope:
+    def __init__(self, subject, date):
+        self.subject = subject.encode()
+        self.date = date
+        self.sender = [FakeAddress(b"Biuro", b"faktury", b"example.com")]
+        self.from_ = self.sender
+
+
+class FakeIMAP:
+    def __init__(self, uidvalidity, messages):
+        self.uidvalidity = uidvalidity
+        self.messages = messages  # uid -> (subject, raw bytes)
+        self.fetched = []
+
+    def select_folder(self, folder, readonly=False):
+        return {b'UIDVALIDITY': self.uidvalidity, b'UIDNEXT': max(self.messages, default=0) + 1}
+
+    def search(self, criteria):
+        return sorted(self.messages)
+
+    def fetch(self, uids, data):
+        self.fetched.extend(uids)
+        response = {}
+        for uid in uids:
+            subject, raw = self.messages[uid]
+            response[uid] = {
+                b'ENVELOPE': FakeEnvelope(subject, BASE_DATE - timedelta(minutes=uid)),
+                b'FLAGS': [b'\\Seen'],
+                b'RFC822.SIZE': len(raw),
+                b'BODYSTRUCTURE': None,
+                b'BODY[]': raw
+            }
+        return response
+
+
+class FakeIMAPConnection:
+    def __init__(self, imap):
+        self.imap_connection = imap
+        self.current_account_config = {"name": "Test", "email": "test@example.com", "type": "imap_smtp"}
+
+    def get_main_account(self):
+        return self.imap_connection
+
+    def get_folder_with_subfolders(self, account, folder_path, excluded_folders=None):
+        return ["INBOX"]
+
+
+def raw_message(subject, body, pdf_name=None):
+    message = MIMEMultipart()
+    message['Subject'] = subject
+    message.attach(MIMEText(body, 'plain', 'utf-8'))
+    if pdf_name:
+        attachment = MIMEApplication(b'%PDF-1.4 fake', Name=pdf_name)
+        attachment['Content-Disposition'] = f'attachment; filename="{pdf_name}"'
+        message.attach(attachment)
+    return message.as_bytes()
+
+
+class MailIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        os.chdir(self.test_dir)
+        self.index = MailIndex(os.path.join(self.test_dir, "index.db"))
+
+    def tearDown(self):
+        self.index.close()
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.test_dir)
+
+
+class TestMailIndexSearch(MailIndexTestCase):
+    """Index answers substring queries and flag filters, newest first"""
+
+    def test_substring_and_filters(self):
+        self.index.upsert_message(ACCOUNT, "INBOX", "INBOX", record("1", "Faktura VAT 12/2025", 30))
+        self.index.upsert_message(ACCOUNT, "INBOX", "INBOX", record("2", "FAKTURA korygująca", 10,
+                                  has_attachments=True, attachment_names=["korekta.pdf"]))
+        self.index.upsert_message(ACCOUNT, "INBOX", "INBOX", record("3", "Oferta", 5, is_read=False))
+
+        found = self.index.search(ACCOUNT, ["INBOX"], {'subject_search': 'faktura'})
+        self.assertEqual([m.id for m, _ in found], ["2", "1"])
+
+        found = self.index.search(ACCOUNT, ["INBOX"], {'attachment_extension': 'pdf'})
+        self.assertEqual([m.id for m, _ in found], ["2"])
+        self.assertEqual(found[0][0].attachments[0].name, "korekta.pdf")
+
+        found = self.index.search(ACCOUNT, ["INBOX"], {'unread_only': True})
+        self.assertEqual([m.id for m, _ in found], ["3"])
+
+        found = self.index.search(ACCOUNT, ["INBOX"], {}, start_date=BASE_DATE - timedelta(minutes=20))
+        self.assertEqual([m.id for m, _ in found], ["3", "2"])
+
+    def test_pdf_text_match_info(self):
+        self.index.upsert_message(ACCOUNT, "INBOX", "INBOX", record(
+            "1", "Dokumenty", 1, has_attachments=True, attachment_names=["fv.pdf"],
+            pdf_texts={"fv.pdf": "Numer faktury FV/123/2025 do zapłaty"}))
+
+        found = self.index.search(ACCOUNT, ["INBOX"], {'pdf_search_text': 'fv/123'})
+
+        self.assertEqual(len(found), 1)
+        message, pdf_match = found[0]
+        self.assertTrue(pdf_match['found'])
+        self.assertEqual(pdf_match['attachments'][0]['name'], "fv.pdf")
+        self.assertIn("FV/123/2025", pdf_match['attachments'][0]['matches'][0])
+
+    def test_freshness(self):
+        self.assertIsNone(self.index.get_fresh_folders(ACCOUNT, "INBOX", ""))
+        self.index.set_root(ACCOUNT, "INBOX", "Spam, Kosz", ["INBOX"])
+
+        self.assertEqual(self.index.get_fresh_folders(ACCOUNT, "INBOX", "Kosz,Spam"), ["INBOX"])
+        self.assertIsNone(self.index.get_fresh_folders(ACCOUNT, "INBOX", "Kosz,Spam", needs_pdf_text=True))
+        self.assertIsNone(self.index.get_fresh_folders(ACCOUNT, "INBOX", "Kosz,Spam", max_age=-1))
+
+
+class TestIMAPIncrementalSync(MailIndexTestCase):
+    """IMAP sync fetches only new UIDs and rebuilds on UIDVALIDITY change"""
+
+    def sync(self, imap):
+        engine = EmailSearchEngine(lambda message: None, lambda result: None)
+        syncer = MailIndexSyncer(self.index, FakeIMAPConnection(imap), engine)
+        syncer.sync({'folder_path': 'INBOX'})
+
+    def test_incremental_sync(self):
+        imap = FakeIMAP(7, {1: ("Faktura 1", raw_message("Faktura 1", "kwota 100 zł", "fv1.pdf")),
+                            2: ("Oferta", raw_message("Oferta", "treść oferty"))})
+        self.sync(imap)
+        self.assertEqual(sorted(imap.fetched), [1, 1, 2, 2])
+
+        imap.messages[3] = ("Faktura 3", raw_message("Faktura 3", "kwota 300 zł"))
+        del imap.messages[2]
+        imap.fetched = []
+        self.sync(imap)
+
+        # Only the new UID is downloaded, the removed one disappears from the index
+        self.assertEqual(imap.fetched, [3, 3])
+        folders = self.index.get_fresh_folders(ACCOUNT, "INBOX", "")
+        found = self.index.search(ACCOUNT, folders, {'body_search': 'kwota'})
+        self.assertEqual([m.id for m, _ in found], ["1", "3"])
+        self.assertEqual(found[0][0].attachments[0].name, "fv1.pdf")
+
+    def test_uidvalidity_change_rebuilds_folder(self):
+        imap = FakeIMAP(7, {1: ("Stara", raw_message("Stara", "a"))})
+        self.sync(imap)
+
+        imap = FakeIMAP(8, {1: ("Nowa", raw_message("Nowa", "b"))})
+        self.sync(imap)
+
+        found = self.index.search(ACCOUNT, ["INBOX"], {})
+        self.assertEqual([m.subject for m, _ in found], ["Nowa"])
+
+
+class TestEngineUsesIndex(MailIndexTestCase):
+    """search_emails_threaded answers from a fresh index and falls back to live search when stale"""
+
+    def setUp(self):
+        super().setUp()
+        self.results = []
+        self.engine = EmailSearchEngine(lambda message: None, self.results.append)
+        self.engine.mail_index = self.index
+        self.sync_requests = []
+        self.engine.start_index_sync = self.sync_requests.append
+        self.queries = []
+        self.folders = [FakeFolder("Inbox", [FakeMessage("live", "Faktura live", 1)], on_query=self.queries.append)]
+        self.account = get_account_key(FakeConnection(self.folders).current_account_config)
+
+    def search(self, criteria):
+        self.engine._threaded_search(FakeConnection(self.folders), criteria, 0, 50)
+        return self.results[-1]
+
+    def test_fresh_index_answers_without_server(self):
+        self.index.upsert_message(self.account, "/Odebrane", "/Odebrane", record("idx", "Faktura z indeksu", 3))
+        self.index.set_root(self.account, "Skrzynka odbiorcza", "", ["/Odebrane"])
+
+        result = self.search({'use_index': True, 'subject_search': 'faktura'})
+
+        self.assertEqual(self.queries, [])
+        self.assertEqual([r['message_id'] for r in result['results']], ["idx"])
+        self.assertEqual(result['results'][0]['folder_path'], "/Odebrane")
+
+    def test_stale_index_falls_back_to_live_search(self):
+        result = self.search({'use_index': True, 'subject_search': 'faktura'})
+
+        self.assertEqual(len(self.queries), 1)
+        self.assertEqual([r['message_id'] for r in result['results']], ["live"])
+        self.assertEqual(len(self.sync_requests), 1)
+
+
+
+class TestIndexSyncConnection(MailIndexTestCase):
+    """The background sync releases its mail connection even when the sync fails"""
+
+    def test_connection_closed_after_failed_sync(self):
+        connection = mock.Mock()
+        engine = EmailSearchEngine(lambda message: None, lambda result: None)
+        engine.mail_index = self.index
+
+        with mock.patch('gui.mail_search_components.mail_connection.MailConnection', return_value=connection), \
+                mock.patch.object(MailIndexSyncer, 'sync', side_effect=ConnectionError("Serwer niedostępny")):
+            engine.start_index_sync({})
+            engine.index_sync_thread.join(5)
+
+        connection.close_connections.assert_called_once_with()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Tests for the multi-needle (Aho-Corasick) PDF search.
+"""
+import unittest
+import sys
+import os
+import tempfile
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gui.mail_search_components.needle_search import NeedleMatcher, load_needles_from_csv, build_pdf_search
+from gui.mail_search_components.pdf_processor import PDFProcessor
+
+from tests.test_search_engine import EmailSearchEngineTestCase, FakeAccount, FakeFolder, FakeMessage
+
+
+class FakePDFAttachment:
+    def __init__(self, name, text):
+        self.name = name
+        self.content = text.encode()
+
+
+class TextLayerProcessor(PDFProcessor):
+    """PDF content is its own text layer, OCR is not available"""
+
+    ocr_available = False
+
+    def extract_text(self, pdf_content, attachment_name=""):
+        return pdf_content.decode()
+
+
+class TestNeedleMatcher(unittest.TestCase):
+
+    def test_overlapping_needles_case_insensitive(self):
+        matcher = NeedleMatcher(["he", "she", "HERS", "his", "", "She"])
+
+        found = matcher.find_all("uShers")
+
+        self.assertEqual(matcher.needles, ["he", "she", "HERS", "his"])
+        self.assertEqual(found, {"she": [1], "he": [2], "HERS": [2]})
+
+    def test_invoice_numbers(self):
+        matcher = NeedleMatcher(["FV/1/2025", "FV/12/2025", "KOR/ś/7"])
+
+        found = matcher.find_all("Faktura fv/12/2025 oraz korekta KOR/Ś/7")
+
+        self.assertEqual(sorted(found), ["FV/12/2025", "KOR/ś/7"])
+
+    def test_load_from_csv(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False, encoding="utf-8") as f:
+            f.write("FV/1/2025\n\nFV/2/2025\n")
+        try:
+            self.assertEqual(load_needles_from_csv(f.name), ["FV/1/2025", "FV/2/2025"])
+            matcher = build_pdf_search({'pdf_needles_file': f.name, 'pdf_search_text': 'ignored'})
+            self.assertEqual(matcher.needles, ["FV/1/2025", "FV/2/2025"])
+        finally:
+            os.unlink(f.name)
+        self.assertEqual(build_pdf_search({'pdf_search_text': ' FV/1 '}), "FV/1")
+
+
+class TestEngineNeedleSearch(EmailSearchEngineTestCase):
+    """One search maps every needle to the messages and PDFs that contain it"""
+
+    def test_needle_matches(self):
+        messages = [FakeMessage("m1", "Faktury lipiec", 1), FakeMessage("m2", "Faktura", 2), FakeMessage("m3", "Inne", 3)]
+        for message in messages:
+            message.has_attachments = True
+        account = FakeAccount({
+            "m1": [FakePDFAttachment("a.pdf", "FV/1/2025"), FakePDFAttachment("b.pdf", "FV/2/2025 i FV/1/2025")],
+            "m2": [FakePDFAttachment("c.pdf", "FV/2/2025")],
+            "m3": [FakePDFAttachment("d.pdf", "oferta")]
+        })
+        self.engine.pdf_processor = TextLayerProcessor()
+
+        result = self.run_search([FakeFolder("Inbox", messages)],
+                                 {'pdf_search_needles': ["FV/1/2025", "FV/2/2025", "FV/3/2025"]}, account=account)
+
+        self.assertEqual([r['message_id'] for r in result['results']], ["m1", "m2"])
+        needle_matches = result['needle_matches']
+        self.assertEqual([(m['message_id'], m['attachment']) for m in needle_matches["FV/1/2025"]],
+                         [("m1", "a.pdf"), ("m1", "b.pdf")])
+        self.assertEqual([(m['message_id'], m['attachment']) for m in needle_matches["FV/2/2025"]],
+                         [("m1", "b.pdf"), ("m2", "c.pdf")])
+        self.assertEqual(needle_matches["FV/3/2025"], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Tests for the pipelined PDF content search (download → extract → OCR).
+"""
+import unittest
+import sys
+import os
+import threading
+import time
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gui.mail_search_components.pdf_pipeline import PDFSearchPipeline
+from gui.mail_search_components.pdf_processor import PDFProcessor
+
+
+class FakePDF:
+    def __init__(self, name, text):
+        self.name = name
+        self.content = text.encode()
+
+
+class FakeProcessor:
+    """Text layer is the PDF content, OCR text is looked up by name; slow names sleep"""
+
+    ocr_available = True
+
+    def __init__(self, ocr_texts, delays=None):
+        self.ocr_texts = ocr_texts
+        self.delays = delays or {}
+        self.ocr_calls = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+        self.matcher = PDFProcessor()
+
+    def extract_text(self, content, name):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delays.get(name, 0))
+        with self.lock:
+            self.active -= 1
+        return content.decode()
+
+    def ocr_text(self, content, name):
+        self.ocr_calls.append(name)
+        return self.ocr_texts.get(name, "")
+
+    def match_text(self, text, search_text, method):
+        return self.matcher.match_text(text, search_text, method)
+
+
+class FakeMessage:
+    def __init__(self, id, pdfs):
+        self.id = id
+        self.attachments = pdfs
+
+
+def prepare(message):
+    return [(pdf.name, pdf) for pdf in message.attachments], []
+
+
+class TestPDFSearchPipeline(unittest.TestCase):
+
+    def test_results_in_input_order(self):
+        processor = FakeProcessor({}, delays={"a.pdf": 0.2})
+        messages = [FakeMessage(str(i), [FakePDF(name, "faktura FV/1")]) for i, name in enumerate(["a.pdf", "b.pdf", "c.pdf"])]
+        pipeline = PDFSearchPipeline(processor, "fv/1", prepare, extract_workers=3)
+
+        jobs = list(pipeline.run(messages))
+
+        self.assertEqual([job.message.id for job in jobs], ["0", "1", "2"])
+        self.assertTrue(all(job.searched[0][2]['found'] for job in jobs))
+        # Later messages were extracted while the first one was still busy
+        self.assertGreater(processor.max_active, 1)
+
+    def test_ocr_only_when_text_layer_does_not_match(self):
+        processor = FakeProcessor({"scan.pdf": "Skan faktury FV/2"})
+        messages = [
+            FakeMessage("text", [FakePDF("text.pdf", "FV/2 w warstwie tekstowej")]),
+            FakeMessage("scan", [FakePDF("scan.pdf", "obraz")]),
+            FakeMessage("none", [FakePDF("other.pdf", "inny dokument")])
+        ]
+        pipeline = PDFSearchPipeline(processor, "FV/2", prepare)
+
+        results = {job.message.id: job.searched[0][2] for job in pipeline.run(messages)}
+
+        self.assertEqual(sorted(processor.ocr_calls), ["other.pdf", "scan.pdf"])
+        self.assertEqual(results["text"]['method'], 'text_extraction')
+        self.assertEqual(results["scan"]['method'], 'ocr')
+        self.assertTrue(results["scan"]['found'])
+        self.assertFalse(results["none"]['found'])
+
+    def test_cancellation_stops_pipeline(self):
+        cancelled = threading.Event()
+        processor = FakeProcessor({})
+        messages = [FakeMessage(str(i), [FakePDF(f"{i}.pdf", "x")]) for i in range(50)]
+        pipeline = PDFSearchPipeline(processor, "x", prepare, is_cancelled=cancelled.is_set, max_in_flight=2)
+
+        seen = []
+        for job in pipeline.run(messages):
+            seen.append(job)
+            if len(seen) == 3:
+                cancelled.set()
+
+        self.assertLess(len(seen), 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
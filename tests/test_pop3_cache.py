@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Tests for the UIDL keyed POP3 header/message cache.
+"""
+import unittest
+import sys
+import os
+import poplib
+import shutil
+import tempfile
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gui.mail_search_components.pop3_cache import close_pop3_caches
+from gui.mail_search_components.search_engine import EmailSearchEngine
+
+from tests.test_imap_utils import POP3_MESSAGE
+
+
+class FakePOP3:
+    """Fake POP3 server recording the commands it receives"""
+
+    def __init__(self, messages):
+        self.messages = messages  # [(uidl, raw message)] in message number order
+        self.commands = []
+
+    def uidl(self):
+        self.commands.append("UIDL")
+        return b"+OK", [f"{number} {uidl}".encode() for number, (uidl, _) in enumerate(self.messages, 1)], 0
+
+    def list(self):
+        self.commands.append("LIST")
+        return b"+OK", [f"{number} 100".encode() for number in range(1, len(self.messages) + 1)], 0
+
+    def capa(self):
+        raise poplib.error_proto("-ERR CAPA not supported by server")
+
+    def _putcmd(self, line):
+        # Only TOP is sent through the low-level calls
+        _, number, lines = line.split()
+        self.commands.append(f"TOP {number}")
+        raw = self.messages[int(number) - 1][1]
+        headers, _, body = raw.partition(b"\n\n")
+        self.response = headers.split(b"\n") + [b""] + body.split(b"\n")[:int(lines)]
+
+    def _getlongresp(self):
+        return b"+OK", self.response, 0
+
+    def retr(self, number):
+        self.commands.append(f"RETR {number}")
+        return b"+OK", self.messages[number - 1][1].split(b"\n"), 0
+
+
+class FakeConnection:
+    def __init__(self, pop3, **config):
+        self.pop3_connection = pop3
+        self.current_account_config = dict({"type": "pop3_smtp", "email": "a@b.pl"}, **config)
+
+
+class TestPOP3Cache(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.criteria = {'pop3_cache_path': os.path.join(self.test_dir, "pop3.db"), 'attachment_extension': 'pdf'}
+        self.engine = EmailSearchEngine(lambda message: None, lambda result: None)
+
+    def tearDown(self):
+        close_pop3_caches()
+        shutil.rmtree(self.test_dir)
+
+    def test_repeat_search_sends_only_uidl(self):
+        pop3 = FakePOP3([("u1", POP3_MESSAGE), ("u2", POP3_MESSAGE.replace(b"Faktura", b"Umowa"))])
+
+        first = self.engine._get_pop3_messages(FakeConnection(pop3, pop3_cache_messages=True), self.criteria)
+        self.assertEqual(pop3.commands, ["UIDL", "TOP 1", "TOP 2"])
+
+        # Body and attachments share one RETR
+        self.assertEqual(first[0].body, "Tresc")
+        self.assertEqual(len(first[0].attachments), 1)
+        self.assertEqual(pop3.commands[3:], ["RETR 1"])
+
+        pop3.commands = []
+        second = self.engine._get_pop3_messages(FakeConnection(pop3, pop3_cache_messages=True), self.criteria)
+
+        self.assertEqual([m.subject for m in second], ["Faktura", "Umowa"])
+        self.assertEqual([[p.filename for p in m.attachment_manifest] for m in second], [["faktura ś.pdf"]] * 2)
+        self.assertEqual(second[0].attachments[0].content, b"%PDF-1.4")
+        self.assertEqual(pop3.commands, ["UIDL"])
+
+    def test_raw_messages_are_not_cached_by_default(self):
+        pop3 = FakePOP3([("u1", POP3_MESSAGE)])
+        first = self.engine._get_pop3_messages(FakeConnection(pop3), self.criteria)
+        self.assertEqual(first[0].attachments[0].content, b"%PDF-1.4")
+
+        pop3.commands = []
+        second = self.engine._get_pop3_messages(FakeConnection(pop3), self.criteria)
+
+        # Headers come from the cache, the attachment is downloaded again
+        self.assertEqual(second[0].attachments[0].content, b"%PDF-1.4")
+        self.assertEqual(pop3.commands, ["UIDL", "RETR 1"])
+
+    def test_deleted_messages_are_pruned_and_new_ones_fetched(self):
+        pop3 = FakePOP3([("u1", POP3_MESSAGE), ("u2", POP3_MESSAGE)])
+        self.engine._get_pop3_messages(FakeConnection(pop3), self.criteria)
+
+        # u1 deleted on the server, u3 arrived - message numbers shift
+        pop3.messages = [("u2", POP3_MESSAGE), ("u3", POP3_MESSAGE)]
+        pop3.commands = []
+        messages = self.engine._get_pop3_messages(FakeConnection(pop3), self.criteria)
+
+        self.assertEqual([m.uidl for m in messages], ["u2", "u3"])
+        self.assertEqual(pop3.commands, ["UIDL", "TOP 2"])
+
+
+    def test_pending_messages_are_found_by_uidl_after_reconnect(self):
+        pop3 = FakePOP3([(f"u{i}", POP3_MESSAGE) for i in range(1, 5)])
+        self.engine.search_connection = FakeConnection(pop3)
+
+        first = self.engine._get_pop3_messages(self.engine.search_connection, self.criteria, 4, first_batch=2)
+        load_next = self.engine._pending_batch_loader("INBOX", self.criteria, "pop3_smtp", 2)
+        self.assertEqual(sorted(m.uidl for m in first), ["u3", "u4"])
+
+        # A page change reconnects - u1 was deleted meanwhile, so u2 is message 1 now
+        new_pop3 = FakePOP3([(f"u{i}", POP3_MESSAGE) for i in range(2, 6)])
+        self.engine.search_connection = FakeConnection(new_pop3)
+
+        self.assertEqual([m.uidl for m in load_next()], ["u2"])
+        self.assertEqual(new_pop3.commands, ["UIDL", "TOP 1"])
+        self.assertEqual(load_next(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Tests for POP3 TOP/RETR pipelining against a local stand-in POP3 server.
+"""
+import unittest
+import sys
+import os
+import poplib
+import socketserver
+import threading
+import time
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gui.mail_search_components.pop3_pipeline import fetch_tops, fetch_messages
+
+
+def make_message(number):
+    return (f"From: nadawca{number % 7}@firma.pl\r\nSubject: Faktura {number}\r\n"
+            f"Date: Mon, 1 Jan 2024 10:00:00 +0000\r\n\r\nTresc {number}\r\n.kropka\r\n").encode()
+
+
+class StandInPOP3Handler(socketserver.StreamRequestHandler):
+    """Answers every command received in one read after `latency` seconds (one round trip)"""
+
+    def handle(self):
+        server = self.server
+        self.wfile.write(b"+OK stand-in POP3 ready\r\n")
+        pending = b""
+        while True:
+            data = self.request.recv(65536)
+            if not data:
+                return
+            server.reads += 1
+            pending += data
+            *lines, pending = pending.split(b"\r\n")
+            if server.latency:
+                time.sleep(server.latency)
+            replies = []
+            for line in lines:
+                replies.append(self.reply(line.decode().split()))
+            self.wfile.write(b"".join(replies))
+            if lines and lines[-1].upper() == b"QUIT":
+                return
+
+    def reply(self, args):
+        server = self.server
+        command = args[0].upper()
+        if command == "CAPA":
+            capabilities = ["TOP", "UIDL", "USER"] + (["PIPELINING"] if server.pipelining else [])
+            return b"+OK\r\n" + "".join(f"{name}\r\n" for name in capabilities).encode() + b".\r\n"
+        if command in ("TOP", "RETR"):
+            number = int(args[1])
+            if number not in server.messages:
+                return b"-ERR no such message\r\n"
+            message = server.messages[number]
+            if command == "TOP":
+                headers, _, body = message.partition(b"\r\n\r\n")
+                message = headers + b"\r\n\r\n" + b"".join(line + b"\r\n" for line in body.split(b"\r\n")[:int(args[2])])
+            lines = [b"." + line if line.startswith(b".") else line for line in message.rstrip(b"\r\n").split(b"\r\n")]
+            return b"+OK\r\n" + b"\r\n".join(lines) + b"\r\n.\r\n"
+        if command == "STAT":
+            return f"+OK {len(server.messages)} 0\r\n".encode()
+        return b"+OK\r\n"
+
+
+class StandInPOP3Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, message_count, pipelining=True, latency=0.0):
+        super().__init__(("127.0.0.1", 0), StandInPOP3Handler)
+        self.messages = {number: make_message(number) for number in range(1, message_count + 1)}
+        self.pipelining = pipelining
+        self.latency = latency
+        self.reads = 0
+        threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True).start()
+
+    def connect(self):
+        return poplib.POP3(*self.server_address, timeout=10)
+
+
+class TestPOP3Pipelining(unittest.TestCase):
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_pipelined_tops_are_in_order_with_errors(self):
+        self.server = StandInPOP3Server(120)
+        pop3 = self.server.connect()
+        self.server.reads = 0
+
+        responses = list(fetch_tops(pop3, list(range(1, 121)) + [500], 0, window=50))
+
+        self.assertEqual([number for number, _ in responses], list(range(1, 121)) + [500])
+        self.assertIn(b"Subject: Faktura 120", responses[119][1])
+        self.assertIsNone(responses[-1][1])
+        # CAPA plus a few windows instead of one read per command
+        self.assertLess(self.server.reads, 15)
+
+        number, lines = next(fetch_messages(pop3, [3]))
+        self.assertEqual(lines[-1], b".kropka")
+
+    def test_early_stop_drains_and_sequential_fallback(self):
+        self.server = StandInPOP3Server(60, pipelining=False)
+        pop3 = self.server.connect()
+
+        retrieved = fetch_messages(pop3, range(1, 61), window=20)
+        self.assertEqual(next(retrieved)[0], 1)
+        retrieved.close()
+        self.server.reads = 0
+
+        self.assertEqual(pop3.stat(), (60, 0))
+        self.assertEqual([number for number, _ in fetch_tops(pop3, [5, 6, 7], 0)], [5, 6, 7])
+        # Without PIPELINING every command is its own round trip
+        self.assertEqual(self.server.reads, 4)
+
+        pipelined = StandInPOP3Server(60)
+        try:
+            pop3 = pipelined.connect()
+            tops = fetch_tops(pop3, range(1, 61), 0, window=20)
+            next(tops)
+            tops.close()
+            # Responses already sent for the rest of the window were read - the connection is in sync
+            self.assertEqual(pop3.stat(), (60, 0))
+        finally:
+            pipelined.shutdown()
+            pipelined.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
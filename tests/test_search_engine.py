@@ -0,0 +1,536 @@
+#!/usr/bin/env python3
+"""
+Tests for EmailSearchEngine search flow using fake Exchange folders and messages.
+"""
+import unittest
+import sys
+import os
+import tempfile
+import shutil
+import threading
+from types import SimpleNamespace
+from itertools import islice
+from unittest import mock
+from datetime import datetime, timedelta, timezone
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gui.mail_search_components.search_engine import EmailSearchEngine
+
+
+BASE_DATE = datetime(2025, 7, 1, 12, 0, tzinfo=timezone.utc)
+
+
+class FakeSender:
+    def __init__(self, email_address, name=None):
+        self.email_address = email_address
+        self.name = name
+
+    def __str__(self):
+        return self.name or self.email_address
+
+
+class FakeMessage:
+    def __init__(self, msg_id, subject, minutes_ago, sender="faktury@example.com"):
+        self.id = msg_id
+        self.subject = subject
+        self.sender = FakeSender(sender)
+        self.datetime_received = BASE_DATE - timedelta(minutes=minutes_ago)
+        self.is_read = True
+        self.has_attachments = False
+        self.attachments = []
+
+
+class FakeAttachment:
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeQuerySet:
+    def __init__(self, folder, messages, only_fields=None):
+        self.folder = folder
+        self.messages = messages
+        self.only_fields = only_fields
+
+    def order_by(self, *args):
+        return FakeQuerySet(self.folder, sorted(self.messages, key=lambda m: m.datetime_received, reverse=True),
+                            self.only_fields)
+
+    def only(self, *fields):
+        self.folder.only_fields = fields
+        return FakeQuerySet(self.folder, self.messages, fields)
+
+    def __iter__(self):
+        # Items are listed lazily like exchangelib's paged FindItem
+        self.folder.on_query()
+        for message in self.messages:
+            self.folder.listed += 1
+            yield message
+
+
+class FakeFolder:
+    def __init__(self, name, messages, parent=None, error=None, on_query=None):
+        self.name = name
+        self.messages = messages
+        self.parent = parent
+        self.error = error
+        self._on_query = on_query
+        self.only_fields = None
+        self.listed = 0
+
+    def on_query(self):
+        if self._on_query:
+            self._on_query(self)
+        if self.error:
+            raise self.error
+
+    def filter(self, *args, **kwargs):
+        return FakeQuerySet(self, self.messages)
+
+    def all(self):
+        return FakeQuerySet(self, self.messages)
+
+
+class FakeAccount:
+    primary_smtp_address = "test@example.com"
+
+    def __init__(self, full_attachments=None):
+        self.full_attachments = full_attachments or {}
+        self.fetched_ids = []
+
+    def fetch(self, ids):
+        # Full items carry the attachments that the projected listing leaves out
+        for message in ids:
+            self.fetched_ids.append(message.id)
+            full = FakeMessage(message.id, message.subject, 0)
+            full.datetime_received = message.datetime_received
+            full.has_attachments = message.has_attachments
+            full.attachments = self.full_attachments.get(message.id, [])
+            yield full
+
+
+class FakeConnection:
+    def __init__(self, folders, account=None):
+        self.folders = folders
+        self.account = account or FakeAccount()
+        self.current_account_config = {"name": "Test", "email": "test@example.com", "type": "exchange"}
+        self.closed = False
+
+    def get_main_account(self):
+        return self.account
+
+    def close_connections(self):
+        self.closed = True
+
+    def get_folder_with_subfolders(self, account, folder_path, excluded_folders=None):
+        return self.folders
+
+
+class EmailSearchEngineTestCase(unittest.TestCase):
+    """Base class running the engine synchronously and collecting callbacks"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        os.chdir(self.test_dir)
+
+        self.progress = []
+        self.results = []
+        self.engine = EmailSearchEngine(self.progress.append, self.results.append)
+
+    def tearDown(self):
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.test_dir)
+
+    def run_search(self, folders, criteria=None, page=0, per_page=500, account=None):
+        criteria = criteria or {}
+        self.engine.search_cancelled = False
+        self.engine._threaded_search(FakeConnection(folders, account), criteria, page, per_page)
+        return self.results[-1]
+
+
+class TestParallelFolderSearch(EmailSearchEngineTestCase):
+    """Parallel per-folder search keeps ordering, error isolation and cancellation"""
+
+    def test_results_merged_across_folders_by_date(self):
+        inbox = FakeFolder("Inbox", [FakeMessage("a1", "A1", 10), FakeMessage("a2", "A2", 30)])
+        sub = FakeFolder("Faktury", [FakeMessage("b1", "B1", 20)], parent=inbox)
+
+        result = self.run_search([inbox, sub], {'folder_search_workers': 4})
+
+        self.assertEqual(result['type'], 'search_complete')
+        self.assertEqual([r['message_id'] for r in result['results']], ["a1", "b1", "a2"])
+        self.assertEqual(result['results'][1]['folder_path'], '/Odebrane/Faktury')
+
+    def test_folders_are_queried_concurrently(self):
+        barrier = threading.Barrier(3, timeout=5)
+        folders = [FakeFolder(f"F{i}", [FakeMessage(f"m{i}", f"S{i}", i)], on_query=lambda f: barrier.wait())
+                   for i in range(3)]
+
+        result = self.run_search(folders, {'folder_search_workers': 3})
+
+        # All three queries had to be in flight at the same time to pass the barrier
+        self.assertEqual(result['type'], 'search_complete')
+        self.assertEqual(result['total_count'], 3)
+
+    def test_folder_error_does_not_abort_search(self):
+        good = FakeFolder("Dobry", [FakeMessage("g1", "G1", 5)])
+        bad = FakeFolder("Zly", [FakeMessage("x1", "X1", 1)], error=RuntimeError("EWS timeout"))
+
+        result = self.run_search([bad, good], {'folder_search_workers': 2})
+
+        self.assertEqual(result['type'], 'search_complete')
+        self.assertEqual([r['message_id'] for r in result['results']], ["g1"])
+
+    def test_cancel_during_folder_search(self):
+        def cancel(folder):
+            self.engine.cancel_search()
+        folders = [FakeFolder("F1", [FakeMessage("m1", "S1", 1)], on_query=cancel)]
+
+        result = self.run_search(folders)
+
+        self.assertEqual(result['type'], 'search_cancelled')
+
+
+class TestBoundedMerge(EmailSearchEngineTestCase):
+    """Folder streams are merged lazily by date and only the requested window is consumed"""
+
+    def test_merge_consumes_only_the_window(self):
+        consumed = []
+
+        def stream(prefix, minutes):
+            for minute in minutes:
+                message = FakeMessage(f"{prefix}{minute}", prefix, minute)
+                consumed.append(message.id)
+                yield message, f"/{prefix}"
+
+        merged = list(self.engine._merge_folder_messages(
+            [stream("a", range(0, 1000, 2)), stream("b", range(1, 1000, 2))], 4))
+
+        self.assertEqual([m.id for m, _ in merged], ["a0", "b1", "a2", "b3"])
+        self.assertEqual([path for _, path in merged], ["/a", "/b", "/a", "/b"])
+        # heapq.merge keeps one look-ahead item per stream
+        self.assertLessEqual(len(consumed), 6)
+
+    def test_folder_stream_lists_older_messages_on_demand(self):
+        folder = FakeFolder("Inbox", [FakeMessage(f"m{i}", f"S{i}", i) for i in range(100)])
+
+        messages, _, stream = self.engine._search_single_folder(
+            folder, 0, 1, FakeConnection([folder]), "exchange", None, {}, 50, 10)
+
+        self.assertEqual(len(messages), 10)
+        self.assertEqual(folder.listed, 10)
+        self.assertEqual([m.id for m, _ in islice(stream, 15)], [f"m{i}" for i in range(15)])
+        self.assertEqual(folder.listed, 20)
+        # Never more than the search window per folder
+        self.assertEqual(len(list(stream)), 35)
+        self.assertEqual(folder.listed, 50)
+
+    def test_unordered_folder_is_merged_by_date(self):
+        folder = FakeFolder("Inbox", [FakeMessage("old", "Old", 50), FakeMessage("new", "New", 5)])
+        other = FakeFolder("Archiwum", [FakeMessage("mid", "Mid", 20)])
+
+        result = self.run_search([folder, other])
+
+        self.assertEqual([r['message_id'] for r in result['results']], ["new", "mid", "old"])
+
+    def test_rows_keep_the_path_of_their_own_folder(self):
+        inbox = FakeFolder("Inbox", [FakeMessage("a1", "A1", 10)])
+        invoices = FakeFolder("Faktury", [FakeMessage("b1", "B1", 5), FakeMessage("b2", "B2", 30)], parent=inbox)
+        archive = FakeFolder("Archiwum", [FakeMessage("c1", "C1", 20)], parent=inbox)
+
+        result = self.run_search([inbox, invoices, archive])
+
+        self.assertEqual([(r['message_id'], r['folder_path']) for r in result['results']], [
+            ("b1", "/Odebrane/Faktury"), ("a1", "Skrzynka odbiorcza"),
+            ("c1", "/Odebrane/Archiwum"), ("b2", "/Odebrane/Faktury")])
+
+
+class TestSearchSession(EmailSearchEngineTestCase):
+    """Page changes are served from the cached search session"""
+
+    def setUp(self):
+        super().setUp()
+        self.queries = []
+        self.folders = [FakeFolder("Inbox", [FakeMessage(f"m{i}", f"Faktura {i}", i) for i in range(1200)],
+                                   on_query=self.queries.append)]
+
+    def test_next_page_does_not_query_folders_again(self):
+        first = self.run_search(self.folders, {'subject_search': 'faktura'}, page=0, per_page=100)
+        # Only the first page (and one message showing there is a next one) was listed and filtered
+        self.assertEqual(self.folders[0].listed, 101)
+        self.assertEqual((first['total_count'], first['total_pages'], first['has_more']), (101, 2, True))
+
+        second = self.run_search(self.folders, {'subject_search': 'faktura'}, page=4, per_page=100)
+
+        # The session continues the same folder query up to the requested page
+        self.assertEqual(len(self.queries), 1)
+        self.assertEqual(second['page'], 4)
+        self.assertEqual(second['results'][0]['message_id'], "m400")
+        self.assertEqual((second['total_count'], second['has_more']), (501, True))
+        self.assertLess(self.folders[0].listed, 1000)
+
+    def test_session_reports_the_end_of_the_window(self):
+        self.run_search(self.folders, {'subject_search': 'faktura'}, page=0, per_page=100)
+        last = self.run_search(self.folders, {'subject_search': 'faktura'}, page=9, per_page=100)
+
+        self.assertEqual((last['total_count'], last['total_pages'], last['has_more']), (1000, 10, False))
+        self.assertEqual(last['results'][-1]['message_id'], "m999")
+
+    def test_first_page_change_uses_session_when_config_loads_on_connect(self):
+        # MailConnection only knows its account configuration after get_main_account()
+        connection = FakeConnection(self.folders)
+        config = connection.current_account_config
+        connection.current_account_config = None
+        connection.get_main_account = lambda: setattr(connection, 'current_account_config', config) or connection.account
+
+        self.engine._threaded_search(connection, {'subject_search': 'faktura'}, 0, 100)
+        self.engine._threaded_search(connection, {'subject_search': 'faktura'}, 1, 100)
+        second = self.results[-1]
+
+        self.assertEqual(len(self.queries), 1)
+        self.assertEqual(second['results'][0]['message_id'], "m100")
+
+    def test_changed_criteria_or_reset_runs_new_search(self):
+        self.run_search(self.folders, {'subject_search': 'faktura'}, per_page=100)
+        self.run_search(self.folders, {'subject_search': 'faktura 1'}, per_page=100)
+        self.engine.reset_search_session()
+        self.run_search(self.folders, {'subject_search': 'faktura 1'}, per_page=100)
+
+        self.assertEqual(len(self.queries), 3)
+
+
+class TestExchangeFieldProjection(EmailSearchEngineTestCase):
+    """Listing queries request only list fields, full items are fetched on demand"""
+
+    def test_listing_uses_projection_and_page_rows_are_fetched(self):
+        folder = FakeFolder("Inbox", [FakeMessage("a1", "A1", 10), FakeMessage("a2", "A2", 20)])
+        account = FakeAccount()
+
+        result = self.run_search([folder], account=account)
+
+        self.assertEqual(set(folder.only_fields), {'subject', 'sender', 'datetime_received', 'is_read', 'has_attachments'})
+        self.assertEqual(sorted(account.fetched_ids), ["a1", "a2"])
+        self.assertEqual(len(result['results']), 2)
+
+    def test_only_attachment_candidates_are_fetched(self):
+        with_pdf = FakeMessage("pdf", "Faktura", 5)
+        with_pdf.has_attachments = True
+        without = FakeMessage("plain", "Faktura", 10)
+        other = FakeMessage("other", "Inne", 15)
+        other.has_attachments = True
+        account = FakeAccount({"pdf": [FakeAttachment("faktura.pdf")], "other": [FakeAttachment("x.pdf")]})
+
+        result = self.run_search([FakeFolder("Inbox", [with_pdf, without, other])],
+                                 {'subject_search': 'faktura', 'attachment_extension': 'pdf'}, account=account)
+
+        self.assertEqual(account.fetched_ids, ["pdf"])
+        self.assertEqual([r['message_id'] for r in result['results']], ["pdf"])
+        self.assertEqual(result['results'][0]['attachment_count'], 1)
+
+
+class TestStreamingResults(EmailSearchEngineTestCase):
+    """Partial results are emitted before the final search_complete event"""
+
+    def test_partial_results_precede_completion(self):
+        inbox = FakeFolder("Inbox", [FakeMessage("a1", "Faktura 1", 10), FakeMessage("a2", "Inne", 30)])
+        sub = FakeFolder("Faktury", [FakeMessage("b1", "Faktura 2", 20)], parent=inbox)
+
+        result = self.run_search([inbox, sub], {'stream_results': True, 'subject_search': 'faktura'})
+
+        partials = [r for r in self.results if r['type'] == 'search_partial']
+        self.assertTrue(partials)
+        self.assertLess(self.results.index(partials[-1]), self.results.index(result))
+        streamed_ids = sorted(row['message_id'] for p in partials for row in p['results'])
+        self.assertEqual(streamed_ids, ["a1", "b1"])
+        self.assertEqual(result['type'], 'search_complete')
+        self.assertEqual([r['message_id'] for r in result['results']], ["a1", "b1"])
+
+    def test_streamed_exchange_rows_stay_hydrated_in_final_page(self):
+        message = FakeMessage("a1", "Faktura 1", 10)
+        message.has_attachments = True
+        account = FakeAccount({"a1": [FakeAttachment("faktura.pdf")]})
+
+        result = self.run_search([FakeFolder("Inbox", [message])], {'stream_results': True}, account=account)
+
+        partials = [row for r in self.results if r['type'] == 'search_partial' for row in r['results']]
+        self.assertEqual([row['attachment_count'] for row in partials], [1])
+        # The final page reuses the item fetched for streaming instead of the projected listing
+        self.assertEqual([row['attachment_count'] for row in result['results']], [1])
+        self.assertEqual(account.fetched_ids, ["a1"])
+
+    def test_no_partial_results_when_disabled(self):
+        folders = [FakeFolder("Inbox", [FakeMessage("a1", "A1", 10)])]
+
+        self.run_search(folders)
+
+        self.assertFalse([r for r in self.results if r['type'] == 'search_partial'])
+
+
+class FakeFolderCollection:
+    """Multi-folder FindItem: one query over the messages of all folders, tagged with their parent folder"""
+    queries = []
+
+    def __init__(self, account, folders):
+        self.folders = folders
+        self.only_fields = None
+        self.listed = 0
+
+    def on_query(self):
+        FakeFolderCollection.queries.append([folder.name for folder in self.folders])
+        for folder in self.folders:
+            folder.on_query()
+
+    def _queryset(self):
+        messages = []
+        for folder in self.folders:
+            for message in folder.messages:
+                message.parent_folder_id = SimpleNamespace(id=folder.id)
+                messages.append(message)
+        return FakeQuerySet(self, messages)
+
+    def filter(self, *args, **kwargs):
+        return self._queryset()
+
+    def all(self):
+        return self._queryset()
+
+
+class TestMultiFolderQuery(EmailSearchEngineTestCase):
+    """Exchange subfolders are searched with one FindItem per chunk of folders"""
+
+    def setUp(self):
+        super().setUp()
+        FakeFolderCollection.queries = []
+        patcher = mock.patch('gui.mail_search_components.search_engine.FolderCollection', FakeFolderCollection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_folders(self, count):
+        inbox = FakeFolder("Inbox", [FakeMessage("m0", "S0", 0)])
+        inbox.id = "id-0"
+        folders = [inbox]
+        for i in range(1, count):
+            folder = FakeFolder(f"F{i}", [FakeMessage(f"m{i}", f"S{i}", i)], parent=inbox)
+            folder.id = f"id-{i}"
+            folders.append(folder)
+        return folders
+
+    def test_subfolders_are_queried_in_chunks(self):
+        result = self.run_search(self.make_folders(25), {'folder_search_workers': 2})
+
+        self.assertEqual([len(query) for query in FakeFolderCollection.queries], [10, 10, 5])
+        self.assertEqual(result['total_count'], 25)
+        self.assertEqual([r['message_id'] for r in result['results'][:3]], ["m0", "m1", "m2"])
+        self.assertEqual(result['results'][0]['folder_path'], 'Skrzynka odbiorcza')
+        self.assertEqual(result['results'][2]['folder_path'], '/Odebrane/F2')
+
+    def test_failed_chunk_falls_back_to_single_folders(self):
+        folders = self.make_folders(3)
+        folders[1].error = RuntimeError("ErrorInvalidRequest")
+
+        result = self.run_search(folders, {'exchange_folder_chunk_size': 3})
+
+        # The failing folder breaks the multi-folder query; the others are still searched one by one
+        self.assertEqual(len(FakeFolderCollection.queries), 1)
+        self.assertEqual(result['type'], 'search_complete')
+        self.assertEqual([r['message_id'] for r in result['results']], ["m0", "m2"])
+
+
+class FakeAccountConnection(FakeConnection):
+    """Connection bound to one configured account; the account config list is shared"""
+
+    def __init__(self, configs, folders_by_index, index):
+        super().__init__(folders_by_index.get(index, []))
+        self.configs = configs
+        self.index = index
+        if index is not None:
+            self.current_account_config = configs[index]
+
+    def get_account_configs(self):
+        return self.configs
+
+    def get_main_account(self):
+        if self.current_account_config.get("broken"):
+            raise ConnectionError("Serwer niedostępny")
+        return self.account
+
+
+class TestMultiAccountSearch(EmailSearchEngineTestCase):
+    """Accounts are searched with their own connections and merged by date"""
+
+    def setUp(self):
+        super().setUp()
+        self.connections = []
+        self.queries = []
+
+    def connect(self, configs, folders_by_index, index):
+        connection = FakeAccountConnection(configs, folders_by_index, index)
+        self.connections.append(connection)
+        return connection
+
+    def run_multi_search(self, page=0, per_page=500):
+        configs = [
+            {"name": "Firma", "email": "firma@example.com", "type": "exchange"},
+            {"name": "Prywatne", "email": "prywatne@example.com", "type": "exchange"},
+            {"name": "Stare", "email": "stare@example.com", "type": "exchange", "broken": True}
+        ]
+        folders_by_index = {
+            0: [FakeFolder("Inbox", [FakeMessage("f1", "F1", 10), FakeMessage("f2", "F2", 40)],
+                           on_query=self.queries.append)],
+            1: [FakeFolder("Inbox", [FakeMessage("p1", "P1", 20), FakeMessage("p2", "P2", 30)],
+                           on_query=self.queries.append)]
+        }
+        self.engine._threaded_multi_account_search(
+            {}, page, per_page, None, lambda index: self.connect(configs, folders_by_index, index))
+        return self.results[-1]
+
+    def test_results_merged_by_date_with_account(self):
+        result = self.run_multi_search()
+
+        self.assertEqual(result['type'], 'search_complete')
+        self.assertEqual([r['message_id'] for r in result['results']], ["f1", "p1", "p2", "f2"])
+        self.assertEqual([r['account'] for r in result['results']], ["Firma", "Prywatne", "Prywatne", "Firma"])
+        self.assertEqual(result['total_count'], 4)
+        # The broken account is reported, the others still return their results
+        self.assertEqual(list(result['account_errors']), ["Stare"])
+        # Every account connection is closed, the failed one included
+        self.assertEqual([c.closed for c in self.connections if c.index is not None], [True, True, True])
+
+    def test_pagination_across_accounts(self):
+        result = self.run_multi_search(page=1, per_page=2)
+
+        self.assertEqual([r['message_id'] for r in result['results']], ["p2", "f2"])
+        self.assertEqual(result['total_pages'], 2)
+
+    def test_page_change_uses_account_sessions(self):
+        self.run_multi_search(page=0)
+        result = self.run_multi_search(page=1)
+
+        # The second page comes from the sessions cached by the account engines (the search
+        # window of 500 rows per page must not grow with the page number)
+        self.assertEqual(len(self.queries), 2)
+        self.assertEqual(result['total_count'], 4)
+        self.assertEqual(result['results'], [])
+
+    def test_cancel_reaches_accounts_waiting_for_a_worker(self):
+        def connect_and_cancel(index):
+            if index == 0:
+                self.engine.cancel_search()
+            return self.connect(configs, folders_by_index, index)
+
+        configs = [{"name": "Firma", "email": "firma@example.com", "type": "exchange"},
+                   {"name": "Prywatne", "email": "prywatne@example.com", "type": "exchange"}]
+        folders_by_index = {0: [FakeFolder("Inbox", [FakeMessage("f1", "F1", 10)])],
+                            1: [FakeFolder("Inbox", [FakeMessage("p1", "P1", 20)])]}
+        with mock.patch('gui.mail_search_components.search_engine.MAX_ACCOUNT_SEARCH_WORKERS', 1):
+            self.engine._threaded_multi_account_search({}, 0, 500, None, connect_and_cancel)
+
+        # The second account was still queued when the search was cancelled - it never connects
+        self.assertEqual([c.index for c in self.connections], [None, 0])
+        self.assertEqual(self.results[-1]['type'], 'search_cancelled')
+
+
+if __name__ == '__main__':
+    unittest.main()
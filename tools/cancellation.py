@@ -0,0 +1,69 @@
+"""
+Cooperative cancellation shared by long running operations (mail search, PDF/OCR, IMAP fetches)
+"""
+import threading
+from tools.logger import log
+
+
+# How often blocking waits (OCR futures, worker queues) re-check the token, in seconds
+CANCEL_POLL_INTERVAL = 0.2
+
+
+class OperationCancelled(Exception):
+    """Raised when an operation stops because its CancellationToken was cancelled"""
+
+
+class CancellationToken:
+    """Thread-safe cancellation flag with callbacks run once on cancel
+
+    Callbacks let blocking operations be interrupted from outside, e.g. terminating
+    OCR worker processes or shutting down the socket of an IMAP fetch in progress.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = list(self._callbacks)
+            self._callbacks = []
+        for callback in callbacks:
+            self._run_callback(callback)
+
+    def wait(self, timeout=None):
+        """Block until cancelled or timeout, returns True when cancelled"""
+        return self._event.wait(timeout)
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise OperationCancelled()
+
+    def register(self, callback):
+        """Run callback on cancel (immediately if already cancelled), returns an unregister function"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._unregister(callback)
+        self._run_callback(callback)
+        return lambda: None
+
+    def _unregister(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    @staticmethod
+    def _run_callback(callback):
+        try:
+            callback()
+        except Exception as e:
+            log(f"Błąd obsługi anulowania: {e}")
@@ -2,10 +2,11 @@
 OCR engine abstraction with multiprocessing support
 """
 import multiprocessing
-from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
 import os
 from tools.logger import log
 from tools.ocr_config import ocr_config
+from tools.cancellation import OperationCancelled, CANCEL_POLL_INTERVAL
 
 # Import poppler utilities for automatic path detection
 try:
@@ -123,17 +124,22 @@ class OCREngineManager:
         else:
             raise RuntimeError(f"Nieobsługiwany silnik OCR: {engine}")
     
-    def perform_ocr_batch(self, images, language='pol+eng', progress_callback=None):
+    def perform_ocr_batch(self, images, language='pol+eng', progress_callback=None, cancellation_token=None):
         """Perform OCR on multiple images with optional multiprocessing
         
         Note: On Windows, multiprocessing overhead can exceed benefits for small batches.
         Consider using single-threaded mode for < 10 images or on Windows systems
         where process creation is expensive.
+        
+        When cancellation_token is cancelled, pending pages are dropped, running worker
+        processes are terminated and OperationCancelled is raised.
         """
         if not ocr_config.get_multiprocessing() or len(images) == 1:
             # Single-threaded processing
             results = []
             for i, image in enumerate(images):
+                if cancellation_token:
+                    cancellation_token.raise_if_cancelled()
                 if progress_callback:
                     progress_callback(i, len(images))
                 text = self.perform_ocr_single(image, language)
@@ -154,47 +160,54 @@ class OCREngineManager:
             gpu_mode = "GPU" if use_gpu else "CPU"
             log(f"Uruchamiam multiproces OCR: {max_workers} workerów, silnik: {current_engine}, tryb: {gpu_mode}")
         
+        executor = None
+        cancelled = False
         try:
-            with ProcessPoolExecutor(max_workers=max_workers) as executor:
-                # Submit all jobs
-                futures = []
-                for i, image in enumerate(images):
-                    # Prepare arguments based on engine capabilities
-                    worker_kwargs = {}
-                    
-                    # Only pass use_gpu for engines that support it
-                    if current_engine in ['easyocr', 'paddleocr']:
-                        # Validate use_gpu parameter before passing
-                        if not isinstance(use_gpu, bool):
-                            log(f"Warning: use_gpu parameter should be boolean, got {type(use_gpu)}: {use_gpu}")
-                            worker_kwargs['use_gpu'] = bool(use_gpu)
-                        else:
-                            worker_kwargs['use_gpu'] = use_gpu
-                    elif current_engine == 'tesseract':
-                        # Tesseract doesn't support use_gpu, don't pass any parameters
-                        if use_gpu:
-                            log("Warning: GPU został żądany dla Tesseract, ale nie jest obsługiwany - używam CPU")
-                        # worker_kwargs remains empty for tesseract
-                    
-                    future = executor.submit(_ocr_worker, image, language, current_engine, **worker_kwargs)
-                    futures.append(future)
-                
-                # Collect results
-                results = []
-                for i, future in enumerate(futures):
-                    if progress_callback:
-                        progress_callback(i, len(futures))
-                    text = future.result()
-                    results.append(text)
+            executor = ProcessPoolExecutor(max_workers=max_workers)
+            # Submit all jobs
+            futures = []
+            for i, image in enumerate(images):
+                # Prepare arguments based on engine capabilities
+                worker_kwargs = {}
                 
-                log(f"Multiproces OCR zakończony pomyślnie, przetworzono {len(results)} obrazów")
-                return results
+                # Only pass use_gpu for engines that support it
+                if current_engine in ['easyocr', 'paddleocr']:
+                    # Validate use_gpu parameter before passing
+                    if not isinstance(use_gpu, bool):
+                        log(f"Warning: use_gpu parameter should be boolean, got {type(use_gpu)}: {use_gpu}")
+                        worker_kwargs['use_gpu'] = bool(use_gpu)
+                    else:
+                        worker_kwargs['use_gpu'] = use_gpu
+                elif current_engine == 'tesseract':
+                    # Tesseract doesn't support use_gpu, don't pass any parameters
+                    if use_gpu:
+                        log("Warning: GPU został żądany dla Tesseract, ale nie jest obsługiwany - używam CPU")
+                    # worker_kwargs remains empty for tesseract
                 
+                future = executor.submit(_ocr_worker, image, language, current_engine, **worker_kwargs)
+                futures.append(future)
+            
+            # Collect results
+            results = []
+            for i, future in enumerate(futures):
+                if progress_callback:
+                    progress_callback(i, len(futures))
+                results.append(self._wait_for_page(future, executor, cancellation_token))
+            
+            log(f"Multiproces OCR zakończony pomyślnie, przetworzono {len(results)} obrazów")
+            return results
+            
+        except OperationCancelled:
+            cancelled = True
+            log("OCR anulowany - przerwano przetwarzanie pozostałych stron")
+            raise
         except Exception as e:
             log(f"Błąd wieloprocesowego OCR: {e}, przełączam na tryb pojedynczy")
             # Fallback to single-threaded processing (disable multiprocessing temporarily)
             results = []
             for i, image in enumerate(images):
+                if cancellation_token:
+                    cancellation_token.raise_if_cancelled()
                 if progress_callback:
                     progress_callback(i, len(images))
                 try:
@@ -204,6 +217,34 @@ class OCREngineManager:
                     log(f"Błąd pojedynczego OCR dla obrazu {i}: {single_error}")
                     results.append("")  # Empty result for failed image
             return results
+        finally:
+            if executor:
+                # Cancelled workers were already terminated - do not wait for them
+                executor.shutdown(wait=not cancelled, cancel_futures=True)
+    
+    def _wait_for_page(self, future, executor, cancellation_token):
+        """Wait for one OCR page, re-checking the cancellation token every CANCEL_POLL_INTERVAL"""
+        if not cancellation_token:
+            return future.result()
+        while True:
+            if cancellation_token.cancelled:
+                self._terminate_workers(executor)
+                raise OperationCancelled()
+            try:
+                return future.result(timeout=CANCEL_POLL_INTERVAL)
+            except FutureTimeoutError:
+                continue
+    
+    def _terminate_workers(self, executor):
+        """Drop queued OCR pages and kill worker processes busy with a page"""
+        # ProcessPoolExecutor has no public API to stop running tasks (shutdown() forgets the processes)
+        processes = list((getattr(executor, '_processes', None) or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            try:
+                process.terminate()
+            except Exception as e:
+                log(f"Nie można zatrzymać procesu OCR: {e}")
     
     def _ocr_tesseract(self, image, language):
         """Perform OCR using Tesseract"""